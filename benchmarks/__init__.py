@@ -0,0 +1,6 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Benchmarks, run them from the top directory, for example:
+#     python -m benchmarks.formatters
@@ -0,0 +1,51 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Compare the speed of the display formats, per value (display) and for a
+# whole list at once (display_many). Run with:
+#     python -m benchmarks.formatters
+
+import random
+import timeit
+
+from erpn import stackFormat
+
+formatters = [
+    ('default', stackFormat.OptionalExponent(3)),
+    ('scientific', stackFormat.UseExponent(3)),
+    ('engineering', stackFormat.UseExponent(3, exponent_grouping=3)),
+    ('plain', stackFormat.NoExponent(3)),
+    ('exact', stackFormat.ExactExponent(3)),
+    ('exact-engineering', stackFormat.ExactExponent(3, exponent_grouping=3)),
+]
+
+
+def testValues(count, seed=1):
+    """ Numbers of all sizes, like you would find on a stack """
+    rng = random.Random(seed)
+    return [rng.gauss(0, 1) * 10.0 ** rng.randint(-12, 12) for _ in range(count)]
+
+
+def timeDisplay(formatter, values, repeat=5):
+    """ Best time per value, in microseconds """
+    display = formatter.display
+    best = min(timeit.repeat(lambda: [display(value) for value in values], number=1, repeat=repeat))
+    return best / len(values) * 1e6
+
+
+def timeDisplayMany(formatter, values, repeat=5):
+    best = min(timeit.repeat(lambda: formatter.display_many(values), number=1, repeat=repeat))
+    return best / len(values) * 1e6
+
+
+def main():
+    values = testValues(100000)
+    print("{:<20}{:>16}{:>20}".format("format", "display (us)", "display_many (us)"))
+    for name, formatter in formatters:
+        print("{:<20}{:>16.3f}{:>20.3f}".format(name, timeDisplay(formatter, values),
+                                                timeDisplayMany(formatter, values)))
+
+
+if __name__ == '__main__':
+    main()
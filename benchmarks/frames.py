@@ -0,0 +1,128 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# The time from a key press to the next frame, as the user feels it. Scripted
+# keys are given to Interface.takeKey one at a time, and the interface is
+# rendered to an urwid canvas after each key, like the main loop does, but
+# without a terminal. The time of every key is split in dispatch (handling
+# the key), displayStack and render. Run with:
+#     python -m benchmarks.frames
+#     python -m benchmarks.frames --sizes 80x24 --depths 10,1000000 --save frames.json
+# Use this as the reference for work on the speed of the interface.
+
+import json
+import platform
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+
+from erpn.buttonMappings import loadMappings
+from erpn.urwidInterface import Interface
+
+# Every script leaves the stack as deep as it was, so it can be repeated
+scripts = [
+    ('entry', list("12.5") + ["enter", "x", "_", "3", "e", "4", "enter", "x"]),
+    ('arithmetic', ["enter", "+", "S", "enter", "*", "S", "s", "S"]),
+    ('arrows', ["up", "up", "up", "down", "down", "down"]),
+    ('undo/redo', ["enter", "u", "ctrl r", "u"]),
+    ('display menu', ["D", "+", "-", "e", "d", "D"]),
+    ('palette', [":", "s", "q", "r", "t", "backspace", "esc"]),
+]
+parts = ['dispatch', 'displayStack', 'render']
+
+
+class FrameTimer:
+    """ Drives an interface with a stack of depth values, in a window of
+    size (columns, rows) """
+    def __init__(self, size, depth):
+        self.size = size
+        self.interface = Interface()
+        loadMappings(self.interface)
+        self.interface.calculator.push_many([float(value % 1000 + 1) for value in range(depth)])
+
+        # Measure displayStack where takeKey calls it
+        displayStack = self.interface.displayStack
+        self.displayTime = 0.0
+
+        def timedDisplayStack():
+            start = time.perf_counter()
+            displayStack()
+            self.displayTime += time.perf_counter() - start
+        self.interface.displayStack = timedDisplayStack
+        self.render()
+
+    def render(self):
+        """ Render the interface to a canvas, and get its content like a
+        screen does when it draws it """
+        canvas = self.interface.root.render(self.size, focus=True)
+        for row in canvas.content():
+            pass
+
+    def press(self, key):
+        """ Returns the seconds spent on dispatch, displayStack and render """
+        self.displayTime = 0.0
+        start = time.perf_counter()
+        self.interface.takeKey(key)
+        handled = time.perf_counter()
+        self.render()
+        rendered = time.perf_counter()
+        return (handled - start - self.displayTime, self.displayTime, rendered - handled)
+
+    def run(self, keys, count):
+        """ Press count keys from the script keys, returns the times of every
+        key per part, and the total """
+        times = {part: [] for part in parts + ['total']}
+        for i in range(count):
+            split = self.press(keys[i % len(keys)])
+            for part, seconds in zip(parts, split):
+                times[part].append(seconds)
+            times['total'].append(sum(split))
+        return times
+
+
+def percentiles(values):
+    """ p50 and p99 in microseconds """
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': cuts[49] * 1e6, 'p99': cuts[98] * 1e6}
+
+
+def parseSize(text):
+    columns, rows = text.lower().split('x')
+    return (int(columns), int(rows))
+
+
+def main():
+    parser = ArgumentParser(description="Frame times of the erpn interface")
+    parser.add_argument('--sizes', default='80x24,200x60',
+                        help='terminal sizes, as COLUMNSxROWS separated by commas')
+    parser.add_argument('--depths', default='10,1000,100000,1000000',
+                        help='stack depths, separated by commas')
+    parser.add_argument('--keys', type=int, default=600, help='keys per script')
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    args = parser.parse_args()
+    sizes = [parseSize(size) for size in args.sizes.split(',')]
+    depths = [int(depth) for depth in args.depths.split(',')]
+
+    results = []
+    print("{:<8}{:>9}  {:<14}{:>18}{:>18}{:>18}{:>18}".format(
+        "size", "depth", "keys", "total p50/p99", "dispatch", "displayStack", "render"))
+    for size in sizes:
+        for depth in depths:
+            for name, keys in scripts:
+                times = FrameTimer(size, depth).run(keys, args.keys)
+                result = {part: percentiles(times[part]) for part in ['total'] + parts}
+                results.append({'size': list(size), 'depth': depth, 'keys': name, 'microseconds': result})
+                print("{:<8}{:>9,}  {:<14}".format("{}x{}".format(*size), depth, name) +
+                      "".join("{:>18}".format("{:.0f}/{:.0f}".format(result[part]['p50'], result[part]['p99']))
+                              for part in ['total'] + parts))
+                sys.stdout.flush()
+
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'results': results}, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
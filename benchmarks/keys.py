@@ -0,0 +1,45 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Keys per second the calculator can handle, without the interface. Run with:
+#     python -m benchmarks.keys
+
+import timeit
+
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+
+# Each mix is applied to a stack with a few values on it, and leaves the
+# stack as long as it was
+mixes = [
+    ('arithmetic', ["enter", "+", "S", "enter", "*", "S", "s", "S"]),
+    ('arrows', ["up", "up", "down", "down"]),
+    ('undo/redo', ["enter", "u", "ctrl r", "u", "ctrl r", "x"]),
+    ('display menu', ["D", "+", "-", "e", "d", "D"]),
+    ('errors', ["meta C", "meta S"]),
+]
+
+
+def keysPerSecond(keys, repeat=5, number=2000):
+    calculator = Calculator()
+    loadMappings(calculator)
+    calculator.push_many([3.0, 0.0, 2.0])
+    apply = calculator.apply
+
+    def run():
+        for key in keys:
+            apply(key)
+
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    return len(keys) * number / best
+
+
+def main():
+    print("{:<16}{:>16}".format("keys", "keys/second"))
+    for name, keys in mixes:
+        print("{:<16}{:>16,.0f}".format(name, keysPerSecond(keys)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Operations per second and memory use of the small pieces every key goes
+# through: running each bound function, checking domains, formatting values
+# and applying undo items. Run with:
+#     python -m benchmarks.micro --save before.json
+# and after a change:
+#     python -m benchmarks.micro --compare before.json
+# Use --filter to only run the benchmarks with some text in their name.
+
+import gc
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from erpn import functions, stackFormat
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.domain import Reals, Integers
+from erpn.vectors import numpy
+
+# The functions are run on a copy of this stack. The values are in the domain
+# of every function, and x=1 is a valid n for the stack operations
+functionStack = [3.0, 2.0, 2.0, 1.0]
+
+# The same composite domains as the functions use, StackCountFunction checks
+# n against Integers >= 1 without compiling it
+domains = [
+    ('Reals', Reals),
+    ('Integers', Integers),
+    ('Reals - {0}', Reals - {0}),
+    ('Reals >= 0', Reals >= 0),
+    ('Reals > 0', Reals > 0),
+    ('(Reals <= 1) >= -1', (Reals <= 1) >= -1),
+    ('Integers >= 0', Integers >= 0),
+    ('Integers >= 1', Integers >= 1),
+]
+# Half of them are in most domains
+domainValues = [0.0, 1.0, -1.0, 0.5, 2.5, -3.0, 1e300, 7.0]
+
+magnitudes = [1e-9, 1e-3, 1.0, 1e3, 1e9, 1e200]
+precisions = [0, 3, 10]
+
+
+def noOperation(state):
+    pass
+
+
+class Benchmark:
+    """ Something to measure. make() returns (setup, operation): operation is
+    called on the result of setup(), and only the time of operation counts.
+    make() is called again for every measurement, so state like an undo
+    stack doesn't keep growing """
+    def __init__(self, name, make):
+        self.name = name
+        self.make = make
+
+    def loopTime(self, setup, operation, number):
+        start = time.perf_counter()
+        for _ in range(number):
+            operation(setup())
+        return (time.perf_counter() - start) / number
+
+    def opsPerSecond(self, repeat, batchSeconds=0.02):
+        """ Each measurement runs operation for about batchSeconds, so very
+        fast ones are run often enough to see the difference with setup. The
+        time of setup alone is measured in between, and subtracted """
+        setup, operation = self.make()
+        number = 100
+        number = max(number, int(batchSeconds / self.loopTime(setup, operation, number)))
+        withOperation = withoutOperation = float('inf')
+        for _ in range(repeat):
+            withOperation = min(withOperation, self.loopTime(setup, operation, number))
+            withoutOperation = min(withoutOperation, self.loopTime(setup, noOperation, number))
+        return 1 / max(withOperation - withoutOperation, 1e-9)
+
+    def memory(self, number):
+        """ The bytes still used after each operation (like a new undo item),
+        and the most memory used at once, above what was used before """
+        setup, operation = self.make()
+        operation(setup())
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            for _ in range(number):
+                operation(setup())
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return (after - before) / number, peak - before
+
+    def run(self, number=2000, repeat=7):
+        retained, peak = self.memory(number)
+        return {'opsPerSecond': self.opsPerSecond(repeat),
+                'retainedBytesPerOp': retained,
+                'peakBytes': peak}
+
+
+def functionBenchmarks():
+    """ RPNfunction.run for every key binding, each function only once """
+    calculator = Calculator()
+    loadMappings(calculator)
+    seen = set()
+    for category, bindings in calculator.functions.items():
+        for key, function in bindings.items():
+            # The clipboard of the OS isn't part of erpn
+            if id(function) in seen or key in ('c', 'v'):
+                continue
+            seen.add(id(function))
+
+            def make(function=function):
+                undostack = []
+                return functionStack.copy, lambda stack: function.run(stack, undostack, 0)
+            yield Benchmark("run {} {!r} ({})".format(category, key, function.description), make)
+
+
+def domainBenchmarks():
+    for name, domain in domains:
+        for form, checked in [('', domain), (' compiled', domain.compile())]:
+            def make(checked=checked):
+                return itertools.cycle(domainValues).__next__, lambda value: value in checked
+            yield Benchmark("domain {}{}".format(name, form), make)
+
+
+def formatterBenchmarks():
+    """ display() of every ValueFormatter, without the cache """
+    formatters = stackFormat.ValueFormatter.__subclasses__()
+    for formatter, precision, magnitude in itertools.product(formatters, precisions, magnitudes):
+        # A few different values with the same magnitude, both signs
+        values = [sign * magnitude * factor for sign in (1, -1) for factor in (1.0, 1.234567, 9.87654321)]
+
+        def make(display=formatter(precision).display, values=values):
+            return itertools.cycle(values).__next__, display
+        yield Benchmark("format {} {} {:g}".format(formatter.__name__, precision, magnitude), make)
+
+
+def undoBenchmarks():
+    undoItems = [
+        ('UndoItem', functions.UndoItem(2, [2.0, 1.0], functions.addition)),
+        ('UndoDelete', functions.UndoDelete(2, 5.0)),
+        ('FunctionalUndoItem', functions.FunctionalUndoItem(lambda stack: functions.switchItems(stack, 1),
+                                                            functions.Switch2())),
+    ]
+    for name, item in undoItems:
+        def make(item=item):
+            return functionStack.copy, item.apply
+        yield Benchmark("undo {}.apply".format(name), make)
+
+
+def allBenchmarks():
+    return itertools.chain(functionBenchmarks(), domainBenchmarks(),
+                           formatterBenchmarks(), undoBenchmarks())
+
+
+def main():
+    parser = ArgumentParser(description="Micro-benchmarks of erpn")
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare with results saved earlier')
+    parser.add_argument('--filter', default='', help='only run benchmarks with this in their name')
+    args = parser.parse_args()
+
+    earlier = {}
+    if args.compare is not None:
+        with open(args.compare) as file:
+            earlier = json.load(file)['results']
+
+    results = {}
+    print("{:<56}{:>14}{:>14}{:>12}{:>10}".format("benchmark", "ops/second", "kept B/op", "peak B",
+                                                  "change" if earlier else ""))
+    for benchmark in allBenchmarks():
+        if args.filter not in benchmark.name:
+            continue
+        result = benchmark.run()
+        results[benchmark.name] = result
+        change = ""
+        if benchmark.name in earlier:
+            change = "{:+.0%}".format(result['opsPerSecond'] / earlier[benchmark.name]['opsPerSecond'] - 1)
+        print("{:<56}{:>14,.0f}{:>14.1f}{:>12,}{:>10}".format(benchmark.name, result['opsPerSecond'],
+                                                              result['retainedBytesPerOp'],
+                                                              result['peakBytes'], change))
+        sys.stdout.flush()
+
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(),
+                       'numpy': numpy is not None,
+                       'results': results}, file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
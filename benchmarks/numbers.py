@@ -0,0 +1,55 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Speed of reading numbers: typed in one key at a time, and from text. Run
+# with:
+#     python -m benchmarks.numbers
+
+import random
+import timeit
+
+from erpn.tokenizer import NumberEntry, parseNumbers
+
+
+def numberTexts(count, seed=1):
+    """ Numbers as they would be typed in """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        text = "{:.6g}".format(rng.gauss(0, 1) * 10.0 ** rng.randint(-12, 12)).replace('e+', 'e')
+        if text.startswith('-'):
+            text = '_' + text[1:]
+        texts.append(text)
+    return texts
+
+
+def timeEntry(texts, repeat=5):
+    """ Keys per second """
+    entry = NumberEntry()
+
+    def run():
+        for text in texts:
+            for key in text:
+                entry.feed(key)
+            entry.clear()
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return sum(len(text) for text in texts) / best
+
+
+def timeText(texts, repeat=5):
+    """ Megabytes per second """
+    text = "\n".join(texts)
+    best = min(timeit.repeat(lambda: parseNumbers(text), number=1, repeat=repeat))
+    return len(text) / best / 1e6
+
+
+def main():
+    texts = numberTexts(100000)
+    print("typed in: {:,.0f} keys/second".format(timeEntry(texts)))
+    print("text: {:.1f} MB/second".format(timeText(texts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Time the command palette search while a query is typed, with many functions
+# registered. Run with:
+#     python -m benchmarks.palette
+
+import random
+import timeit
+
+from erpn import functions
+from erpn.palette import FunctionIndex
+
+words = ["sine", "cosine", "matrix", "vector", "sum", "mean", "root", "power",
+         "log", "stack", "rotate", "swap", "round", "inverse", "degrees", "radians"]
+
+
+def manyFunctions(count, seed=1):
+    """ Keybindings with count functions with made up descriptions """
+    rng = random.Random(seed)
+    bindings = {}
+    for n in range(count):
+        description = "{} {} {}".format(rng.choice(words), rng.choice(words), n)
+        bindings["key {}".format(n)] = functions.RPNfunction(1, description, lambda x: x)
+    return {'main': bindings}
+
+
+def timeSearch(index, query, repeat=5, number=100):
+    """ Best time per search, in milliseconds """
+    best = min(timeit.repeat(lambda: index.search(query), number=number, repeat=repeat))
+    return best / number * 1e3
+
+
+def main():
+    print("{:>10}{:>16}{:>20}".format("functions", "build (ms)", "slowest search (ms)"))
+    for count in (100, 1000, 5000):
+        keybindings = manyFunctions(count)
+        build = min(timeit.repeat(lambda: FunctionIndex(keybindings), number=1, repeat=3))
+        index = FunctionIndex(keybindings)
+        # Every prefix, like when the query is typed one key at a time
+        query = "rotate matrx"
+        slowest = max(timeSearch(index, query[:n]) for n in range(1, len(query) + 1))
+        print("{:>10}{:>16.3f}{:>20.3f}".format(count, build * 1e3, slowest))
+
+
+if __name__ == '__main__':
+    main()
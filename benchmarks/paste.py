@@ -0,0 +1,54 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Time pasting a long sequence of keys in the interface, handled one key at a
+# time (redrawing after each key) and as a single batch. Run with:
+#     python -m benchmarks.paste
+
+import time
+
+from erpn.buttonMappings import loadMappings
+from erpn.urwidInterface import Interface
+
+size = (100, 50)
+
+
+def pasteKeys(count):
+    """ A sequence of count keys that enters numbers and calculates with them """
+    pattern = list("12.5 3e_2*4.5 _1+2 ") + ["enter", "tab", "up", "s", "x"]
+    return (pattern * (count // len(pattern) + 1))[:count]
+
+
+def newInterface():
+    interface = Interface()
+    loadMappings(interface)
+    interface.root.render(size)
+    return interface
+
+
+def timeOneByOne(keys):
+    interface = newInterface()
+    start = time.perf_counter()
+    for key in keys:
+        interface.takeKey(key)
+        interface.root.render(size)
+    return time.perf_counter() - start
+
+
+def timeBatch(keys):
+    interface = newInterface()
+    start = time.perf_counter()
+    interface.filterInput(keys, [])
+    interface.root.render(size)
+    return time.perf_counter() - start
+
+
+def main():
+    keys = pasteKeys(10000)
+    print("{} keys, one by one: {:.1f}ms, as a batch: {:.1f}ms".format(
+        len(keys), timeOneByOne(keys) * 1e3, timeBatch(keys) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# The cost of saving the session: keys per second with and without it, and
+# how long a restart takes with a large stack and a long history. Run with:
+#     python -m benchmarks.session
+
+import tempfile
+import time
+import timeit
+
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.session import Session
+
+keys = ["enter", "+", "S", "enter", "*", "S", "s", "S", "enter", "u", "ctrl r", "x"]
+
+
+def keysPerSecond(directory, repeat=5, number=2000):
+    """ Keys per second, with a session in directory if it isn't None """
+    calculator = Calculator()
+    loadMappings(calculator)
+    session = None
+    if directory is not None:
+        session = Session(directory)
+        session.attach(calculator)
+    calculator.push_many([3.0, 0.0, 2.0])
+    apply = calculator.apply
+
+    def run():
+        for key in keys:
+            apply(key)
+
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    if session is not None:
+        session.close()
+    return len(keys) * number / best
+
+
+def restoreTime(directory, stackSize, actions):
+    """ Seconds to restore a session with stackSize values and actions pushes
+    after the last snapshot (which are in the history and the log) """
+    calculator = Calculator()
+    loadMappings(calculator)
+    session = Session(directory, snapshotBytes=2**40)
+    session.attach(calculator)
+    calculator.push_many(range(stackSize))
+    session.snapshot()
+    for value in range(actions):
+        calculator.push(float(value))
+    session.close()
+
+    start = time.perf_counter()
+    restored = Calculator()
+    session = Session(directory)
+    session.attach(restored)
+    seconds = time.perf_counter() - start
+    assert len(restored.stack) == stackSize + actions
+    session.close()
+    return seconds
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        print("{:<24}{:>16}".format("keys", "keys/second"))
+        print("{:<24}{:>16,.0f}".format("without session", keysPerSecond(None)))
+        print("{:<24}{:>16,.0f}".format("with session", keysPerSecond(directory)))
+    print()
+    print("{:<12}{:>12}{:>16}".format("stack", "log", "restore (ms)"))
+    for stackSize, actions in [(10**6, 10**4), (5 * 10**6, 10**4), (10**6, 10**5)]:
+        with tempfile.TemporaryDirectory() as directory:
+            print("{:<12,}{:>12,}{:>16.1f}".format(stackSize, actions,
+                                                   1000 * restoreTime(directory, stackSize, actions)))
+
+
+if __name__ == '__main__':
+    main()
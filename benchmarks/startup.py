@@ -0,0 +1,89 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# How long erpn takes to start, as wall-clock time of a new process and as
+# the import time python reports with -X importtime. Run with:
+#     python -m benchmarks.startup
+# With --check it exits with an error if a mode takes longer than its budget
+# (on top of starting python itself), or imports a module it shouldn't need.
+
+import statistics
+import subprocess
+import sys
+import time
+
+startErpn = 'from erpn.main import main; main()'
+# Everything the interface does before its main loop starts
+startInterface = '; '.join([
+    'import urwid',
+    'from erpn.buttonMappings import loadMappings',
+    'from erpn.calculator import Calculator',
+    'from erpn.urwidInterface import Interface',
+    'interface = Interface(Calculator())',
+    'loadMappings(interface)',
+    'interface.displayHelp()',
+])
+
+# name, arguments, input, budget in ms on top of python, modules it shouldn't import
+cases = [
+    ('--version', ['-c', startErpn, '--version'], "", 15, {'argparse', 'urwid', 'numpy', 'pyperclip'}),
+    ('--help', ['-c', startErpn, '--help'], "", 50, {'urwid', 'numpy', 'pyperclip'}),
+    ('--eval', ['-c', startErpn, '--eval'], "2 S 3 *\n", 80, {'urwid', 'numpy', 'pyperclip', 'multiprocessing'}),
+    ('interface', ['-c', startInterface], "", 400, {'numpy', 'pyperclip'}),
+]
+
+
+def run(arguments, input="", importTime=False):
+    """ Start python with arguments, returns the wall-clock seconds and its
+    stderr """
+    options = ['-X', 'importtime'] if importTime else []
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + options + arguments, input=input,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def wallClock(arguments, input="", repeat=15):
+    """ The median wall-clock time in seconds """
+    return statistics.median(run(arguments, input)[0] for _ in range(repeat))
+
+
+def importTimes(arguments, input=""):
+    """ The total import time in seconds, and the names of the imported
+    modules """
+    total = 0
+    modules = set()
+    for line in run(arguments, input, importTime=True)[1].splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self, _, name = line[len('import time:'):].split('|')
+        total += int(self)
+        modules.add(name.strip())
+    return total / 10**6, modules
+
+
+def main():
+    check = '--check' in sys.argv[1:]
+    python = wallClock(['-c', 'pass'])
+    failures = []
+    print("{:<12}{:>12}{:>14}{:>14}".format("mode", "wall (ms)", "above python", "imports (ms)"))
+    print("{:<12}{:>12.1f}".format("python", 1000 * python))
+    for name, arguments, input, budget, forbidden in cases:
+        seconds = wallClock(arguments, input)
+        imports, modules = importTimes(arguments, input)
+        print("{:<12}{:>12.1f}{:>14.1f}{:>14.1f}".format(name, 1000 * seconds, 1000 * (seconds - python),
+                                                         1000 * imports))
+        if 1000 * (seconds - python) > budget:
+            failures.append("{} takes {:.1f} ms, the budget is {} ms".format(name, 1000 * (seconds - python),
+                                                                             budget))
+        if modules & forbidden:
+            failures.append("{} imports {}".format(name, ", ".join(sorted(modules & forbidden))))
+    for failure in failures:
+        print(failure)
+    if check and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Memory used by the undo history, per action. The undo tree is measured on a
+# small stack and on one of 100000 items. Then the time undo and redo take
+# with the undo tree, which only change the top of a deep stack. Run with:
+#     python -m benchmarks.undo
+
+import gc
+import time
+import tracemalloc
+
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+
+count = 20000
+
+# Each mix leaves the stack as long as it was, so it can be repeated
+mixes = [
+    ('push', [1.5, "x"]),
+    ('arithmetic', ["enter", "+", "enter", "*", "enter", "-"]),
+    ('swap', ["tab", "up", "tab"]),
+    ('delete', ["enter", "x"]),
+    ('roll', ["up", "up", "r", "2", "r"]),
+]
+
+
+def bytesPerAction(keys, useUndoTree=False, stackSize=4):
+    """ Bytes the undo history uses for each action in keys. The stack
+    doesn't grow, so all of the memory is used by the history """
+    calculator = Calculator(useUndoTree=useUndoTree)
+    loadMappings(calculator)
+    calculator.push_many([float(value) for value in range(1, stackSize + 1)])
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(count):
+        for key in keys:
+            if isinstance(key, float):
+                calculator.push(key)
+            elif key.isdigit():
+                calculator.push(float(key))
+            else:
+                calculator.apply(key)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if useUndoTree:
+        return used / len(calculator.undoTree)
+    return used / len(calculator.undostack)
+
+
+def undoTime(stackSize, steps=1000):
+    """ Microseconds for an undo or redo with the undo tree """
+    calculator = Calculator(useUndoTree=True)
+    loadMappings(calculator)
+    calculator.push_many([float(value) for value in range(stackSize)])
+    for _ in range(steps):
+        calculator.apply("enter")
+    start = time.perf_counter()
+    for key in ["u", "ctrl r"]:
+        for _ in range(steps):
+            calculator.apply(key)
+    return (time.perf_counter() - start) / (2 * steps) * 1e6
+
+
+def main():
+    print("{:<16}{:>12}{:>12}{:>18}".format("actions", "journal", "undo tree", "tree, 100000"))
+    for name, keys in mixes:
+        print("{:<16}{:>12.1f}{:>12.1f}{:>18.1f}".format(
+            name, bytesPerAction(keys), bytesPerAction(keys, True), bytesPerAction(keys, True, 100000)))
+    print()
+    print("{:<16}{:>12}".format("stack", "undo (us)"))
+    for stackSize in [10, 10**4, 10**6]:
+        print("{:<16,}{:>12.1f}".format(stackSize, undoTime(stackSize)))
+
+
+if __name__ == '__main__':
+    main()
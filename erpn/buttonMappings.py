@@ -8,7 +8,8 @@ from . import stackFormat
 
 
 def loadMappings(interface):
-    """ Load all the mappings """
+    """ Load all the mappings. interface can be anything with an add method,
+    like an Interface or a Calculator """
     # See utils folder for script that helps figure out what each key does
     interface.add('x', functions.Delete())
     interface.add('tab', functions.Switch2())
@@ -31,6 +32,12 @@ def loadMappings(interface):
     interface.add('`', functions.floor)
     interface.add('~', functions.ceil)
 
+    interface.add('r', functions.Roll())
+    interface.add('P', functions.Pick())
+    interface.add('X', functions.DropN())
+    interface.add('d', functions.DupN())
+    interface.add('V', functions.ToVector())
+
     interface.add('meta e', functions.AddItem(math.e, description="Push e=2.718.."))
     interface.add('meta p', functions.AddItem(math.pi, description="Push pi=3.14.."))
 
@@ -45,6 +52,8 @@ def loadMappings(interface):
     interface.add('enter', functions.CopyCurrent())
     interface.add('u', functions.undo)
     interface.add('ctrl r', functions.redo)
+    interface.add('ctrl b', functions.next_branch)
+    interface.add('ctrl g', functions.JumpToState())
     interface.add('Q', functions.quit)
     interface.add('c', functions.copy_to_OS)
     interface.add('v', functions.PasteFromOS())
@@ -55,6 +64,8 @@ def loadMappings(interface):
     interface.add('j', functions.arrow_down)
 
     interface.add('D', functions.menu_display)
+    interface.add(':', functions.open_palette)
+    interface.add('ctrl t', functions.show_statistics)
 
     # Buttons for display menu
     interface.add('c', functions.copy_to_OS, 'display')
@@ -86,4 +97,12 @@ def loadMappings(interface):
                                                   description='No Exponent'),
                   'display')
 
-    interface.displayHelp()
+    interface.add('x',
+                  functions.ChangeDisplayFunction(stackFormat.ExactExponent(),
+                                                  description='Exact Format'),
+                  'display')
+
+    interface.add('X',
+                  functions.ChangeDisplayFunction(stackFormat.ExactExponent(exponent_grouping=3),
+                                                  description='Exact Engineering'),
+                  'display')
@@ -0,0 +1,304 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import copy
+
+from . import functions
+from . import history
+from . import stackFormat
+from . import undoTree
+from .persistent import commonLength
+from .stack import Stack
+
+
+class Calculator:
+    """ The state of a single calculator: the stack, the undo and redo
+    history, the keybindings and the display format. It doesn't know anything
+    about the interface, so many calculators can be used at the same time """
+
+    def __init__(self, keybindings=None, displayFormat=None,
+                 undoDepth=history.defaultDepth, undoBytes=history.defaultBytes, useUndoTree=False):
+        """ keybindings is a dict like {'main': {...}, 'display': {...}}. If
+        it is given (for example the .functions of another calculator) it is
+        shared, so it only has to be loaded once. Otherwise use add() or
+        loadMappings()
+        Only the last undoDepth actions can be undone, and older ones are
+        forgotten if the undo history uses more than about undoBytes.
+        If useUndoTree is True every state of the stack is kept in an
+        UndoTree instead, so redo doesn't stop working after a new action and
+        any state can be returned to. The depth and byte limits are not used
+        then """
+        if keybindings is None:
+            # We support having multiple different menus with different
+            # items, so they all need to be stored seperataly. 'main' is the
+            # one loaded at startup.
+            keybindings = {'main': {}, 'display': {}}
+        self.functions = keybindings
+
+        if displayFormat is None:
+            displayFormat = stackFormat.OptionalExponent(3)  # default display mode
+        self.displayFormat = displayFormat
+        self.undoDepth = undoDepth
+        self.undoBytes = undoBytes
+        self.useUndoTree = useUndoTree
+        self.session = None  # The Session that saves the stack, if any
+        self.counters = None  # The Counters that keep statistics, if any
+
+        self.reset()
+
+    def reset(self):
+        """ Start again with an empty stack and no history """
+        self.stack = Stack()  # The stack as displayed to the user
+        self.undostack = history.UndoHistory(self.undoDepth, self.undoBytes)  # The stack of undo actions
+        self.redostack = []
+        self.undoTree = undoTree.UndoTree() if self.useUndoTree else None
+
+        # To make it easy to keep track of the current menu, we keep the
+        # latest set of button mappings in functions_stack[-1]. If we go back,
+        # we can just pop the top part.
+        self.functions_stack = [self.functions['main']]
+
+        self.arrowLocation = 0  # The location of the arrow selector
+        self.error = None  # The error caused by the last action, if any
+
+    def add(self, key, function, category='main'):
+        """ Add a entry to link a keyboard shortcut to a function """
+        if key in self.functions[category]:
+            # You probably don't want to overwrite everything
+            raise Exception("Already defined key {} for category {}".format(key, category))
+        self.functions[category][key] = function
+
+    def currentFunctions(self):
+        """ The keybindings of the menu we are currently in """
+        return self.functions_stack[-1]
+
+    def push(self, value):
+        """ Push a value (a number, or a string that can be decoded to one) on
+        the stack """
+        try:
+            function = functions.AddItem(value)
+        except ValueError:
+            self.error = "Could not decode value"
+            return
+        self.apply(function, 'number')
+
+    def push_many(self, values):
+        """ Push a list of values on the stack, as a single undo step """
+        try:
+            function = functions.AddItems(values)
+        except (ValueError, TypeError):
+            self.error = "Could not decode value"
+            return
+        self.apply(function, 'numbers')
+
+    def apply(self, function, key=None):
+        """ Apply a function to the stack. function can also be the name of a
+        key in the current menu, a KeyError is raised if it isn't bound.
+        Errors are not raised, but stored in self.error.
+        If the function returns a Command the calculator can't handle itself
+        (like 'quit' or 'palette'), that Command is returned for the interface
+        to handle, otherwise None is returned.
+        key is the key the function was bound to, it is only used for the
+        statistics """
+        if isinstance(function, str):
+            key = function
+            function = self.functions_stack[-1][function]
+        if self.counters is not None:
+            return self.counters.call(self.applyFunction, function, key, self)
+        return self.applyFunction(function)
+
+    def applyFunction(self, function):
+        """ apply(), without keeping statistics """
+        # The undo items the function makes, they are added to the history
+        # afterwards
+        steps = []
+        try:
+            self.checkArrowLocation()
+            command = function.run(self.stack, steps, self.arrowLocation)
+
+        except functions.StackToSmallError as e:
+            return self.fail(e, "Stack too small")
+
+        except functions.DomainError as e:
+            return self.fail(e, str(e))
+
+        except OverflowError as e:
+            return self.fail(e, "Value too large")
+
+        finally:
+            if len(steps) > 0:
+                self.addSteps(steps, function.description)
+                if self.session is not None:
+                    self.session.logSteps(steps, self.stack)
+
+        if command is None:
+            # If the function applied and no new errors appeared we can clear the error
+            self.arrowLocation = 0
+            self.error = None
+            self.redostack = []
+            return None
+
+        handler = self.commands.get(command.name)
+        if handler is None:
+            return command
+        handler(self, *command.arguments)
+        return None
+
+    def fail(self, error, message):
+        """ Show message for the error that stopped a function """
+        self.error = message
+        if self.counters is not None:
+            self.counters.countError(error)
+        return None
+
+    def addSteps(self, steps, description):
+        """ Add the undo items an action made to the history. With the undo
+        tree they are only used to find out what changed, the tree keeps the
+        states """
+        if self.undoTree is None:
+            for step in steps:
+                self.undostack.append(step)
+        else:
+            state = undoTree.nextState(self.undoTree.current.state, steps, self.stack)
+            self.undoTree.add(state, description)
+
+    def undo(self):
+        """ Take the top action from the undostack and apply it to the stack """
+        if self.undoTree is not None:
+            self.moveInTree(self.undoTree.undo, "Nothing to undo")
+        elif len(self.undostack) > 0:
+            undo = self.undostack.pop()
+            if self.session is not None:
+                self.session.applyUndo(undo, self.stack)
+            else:
+                undo.apply(self.stack)
+            self.redostack.append(undo.redo)
+            self.error = None
+        else:
+            self.error = "Nothing to undo"
+
+    def redo(self):
+        """ Redo the last action that was undone """
+        if self.undoTree is not None:
+            self.moveInTree(self.undoTree.redo, "Nothing to Redo")
+        elif len(self.redostack) > 0:
+            redo = self.redostack.pop()
+            steps = []
+            try:
+                redo.run(self.stack, steps, 0)
+
+            except functions.StackToSmallError as e:
+                # Nothing changed, so it can still be redone
+                self.redostack.append(redo)
+                return self.fail(e, "Stack too small")
+
+            except functions.DomainError as e:
+                self.redostack.append(redo)
+                return self.fail(e, str(e))
+
+            except OverflowError as e:
+                self.redostack.append(redo)
+                return self.fail(e, "Value too large")
+
+            finally:
+                if len(steps) > 0:
+                    self.addSteps(steps, redo.description)
+                    if self.session is not None:
+                        self.session.logSteps(steps, self.stack, redo=True)
+            self.error = None
+        else:
+            self.error = "Nothing to Redo"
+
+    def moveInTree(self, move, error, *arguments):
+        """ Move to another state of the undo tree with move (a method of
+        UndoTree) and make that the stack. If move returns None, set error
+        instead """
+        old = self.undoTree.current.state
+        node = move(*arguments)
+        if node is None:
+            self.error = error
+            return
+        # Only change the part of the stack the states don't share, the rest
+        # of a deep stack stays where it is
+        common = commonLength(old, node.state)
+        if len(old) > common:
+            self.stack.pop_many(len(old) - common)
+        self.stack.push_many(node.state.top(len(node.state) - common))
+        self.error = None
+        if self.session is not None:
+            self.session.logState(old, node.state)
+
+    def jump(self, number):
+        """ Go back (or forward) to a state in the undo tree, by its number """
+        if self.undoTree is None:
+            self.error = "Needs the undo tree"
+        elif number >= len(self.undoTree.nodes):
+            self.error = "No undo state {}".format(number)
+        else:
+            self.moveInTree(self.undoTree.jump, None, number)
+
+    def nextBranch(self):
+        """ Make redo use the next branch of the undo tree """
+        if self.undoTree is None:
+            self.error = "Needs the undo tree"
+        elif self.undoTree.nextBranch() is None:
+            self.error = "No branch to redo"
+        else:
+            self.error = None
+
+    def changeDisplayFormat(self, adj_format):
+        """ adj_format can be '+' or '-' to change the precision, or a
+        ValueFormatter to use from now on.
+        The formatter is copied before it is changed, because the one we have
+        might be shared with the keybindings or other calculators """
+        if adj_format == '+':
+            self.displayFormat = copy.copy(self.displayFormat)
+            self.displayFormat.add_precision()
+        elif adj_format == '-':
+            self.displayFormat = copy.copy(self.displayFormat)
+            self.displayFormat.remove_precision()
+        elif isinstance(adj_format, stackFormat.ValueFormatter):
+            # We want to use the given format, but we want to keep the
+            # precision the user has already set.
+            digits_after_decimal = self.displayFormat.digits_after_decimal
+            self.displayFormat = copy.copy(adj_format)
+            self.displayFormat.digits_after_decimal = digits_after_decimal
+        else:
+            self.error = "Unparsable format"
+
+    def moveArrow(self, direction):
+        """ direction can be "up" or "down" """
+        if direction == "up":
+            self.arrowLocation += 1
+        else:
+            self.arrowLocation -= 1
+        self.checkArrowLocation()
+
+    def enterMenu(self, category):
+        """ Use the keybindings of category, like 'display' """
+        self.functions_stack.append(self.functions[category])
+
+    def back(self):
+        """ Go back to the previous menu """
+        if len(self.functions_stack) > 1:
+            self.functions_stack.pop()
+        else:
+            self.error = "No menu to go back to"
+
+    def checkArrowLocation(self):
+        """ Ensure that the arrow is actually pointing at the stack """
+        if self.arrowLocation < 0 or self.arrowLocation >= len(self.stack):
+            self.arrowLocation = 0
+
+    # The method that handles each Command, by its name
+    commands = {
+        'undo': undo,
+        'redo': redo,
+        'branch': nextBranch,
+        'jump': jump,
+        'arrow': moveArrow,
+        'menu': enterMenu,
+        'back': back,
+        'display': changeDisplayFormat,
+    }
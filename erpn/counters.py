@@ -0,0 +1,145 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Statistics about what the calculator does: how often every key and
+# function is used and how long it takes, the errors, and how large the stack
+# and the undo history get. They are only kept if a Calculator has Counters,
+# otherwise applying a function only checks that it hasn't.
+
+import json
+from time import perf_counter_ns
+
+# Pushing values doesn't use a key of the menu, so the calculator uses these
+# as the key. The descriptions contain the value, so these names are used
+# instead to count them together
+valueKeys = {'number': 'push', 'numbers': 'push many'}
+
+
+def formatTime(nanoseconds):
+    if nanoseconds < 10**6:
+        return "{:.0f}us".format(nanoseconds / 10**3)
+    if nanoseconds < 10**9:
+        return "{:.1f}ms".format(nanoseconds / 10**6)
+    return "{:.1f}s".format(nanoseconds / 10**9)
+
+
+class Histogram:
+    """ Counts latencies in buckets of powers of two: bucket n has the
+    latencies of n bits, from 2**(n-1) up to 2**n nanoseconds. Adding one is
+    cheap and the size doesn't grow """
+    __slots__ = ('buckets', 'count', 'total')
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0  # nanoseconds
+
+    def add(self, nanoseconds):
+        self.buckets[min(nanoseconds.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += nanoseconds
+
+    def percentile(self, fraction):
+        """ The upper bound in nanoseconds of the bucket where fraction of
+        the latencies are at most that long """
+        if self.count == 0:
+            return 0
+        seen = 0
+        for n, count in enumerate(self.buckets):
+            seen += count
+            if seen >= fraction * self.count:
+                return 2**n
+
+    def toDict(self):
+        return {
+            'count': self.count,
+            'meanMicroseconds': self.total / self.count / 1000 if self.count > 0 else 0,
+            'p50Microseconds': self.percentile(0.5) / 1000,
+            'p99Microseconds': self.percentile(0.99) / 1000,
+            # The upper bound of each bucket in nanoseconds: the number of
+            # latencies in it. Empty buckets are left out
+            'buckets': {str(2**n): count for n, count in enumerate(self.buckets) if count > 0},
+        }
+
+
+class Counters:
+    """ The statistics of a calculator, see Calculator.apply """
+    def __init__(self):
+        self.keys = {}  # key: Histogram
+        self.functions = {}  # description: Histogram
+        self.frames = Histogram()  # Handling keys and updating the display
+        self.errors = {}  # Name of the exception class: count
+        self.stackDepth = 0
+        self.maxStackDepth = 0
+        self.undoSize = 0
+        self.maxUndoSize = 0
+
+    def call(self, apply, function, key, calculator):
+        """ Apply function with apply, and count it for key (None if it
+        wasn't a key) """
+        start = perf_counter_ns()
+        try:
+            return apply(function)
+        finally:
+            self.add(key, function.description, perf_counter_ns() - start)
+            self.stackDepth = len(calculator.stack)
+            self.maxStackDepth = max(self.maxStackDepth, self.stackDepth)
+            if calculator.undoTree is not None:
+                self.undoSize = len(calculator.undoTree)
+            else:
+                self.undoSize = len(calculator.undostack)
+            self.maxUndoSize = max(self.maxUndoSize, self.undoSize)
+
+    def add(self, key, description, nanoseconds):
+        if key is not None:
+            description = valueKeys.get(key, description)
+            histogram = self.keys.get(key)
+            if histogram is None:
+                histogram = self.keys[key] = Histogram()
+            histogram.add(nanoseconds)
+        histogram = self.functions.get(description)
+        if histogram is None:
+            histogram = self.functions[description] = Histogram()
+        histogram.add(nanoseconds)
+
+    def countError(self, error):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, count=15):
+        """ A short text for the statistics panel, with the count functions
+        that took the most time """
+        lines = ["frames: {}, p50 {}, p99 {}".format(self.frames.count,
+                                                     formatTime(self.frames.percentile(0.5)),
+                                                     formatTime(self.frames.percentile(0.99))),
+                 "stack: {} (max {})".format(self.stackDepth, self.maxStackDepth),
+                 "undo: {} (max {})".format(self.undoSize, self.maxUndoSize)]
+        if self.errors:
+            lines.append("errors: " + ", ".join("{} {}".format(name, errorCount)
+                                                for name, errorCount in sorted(self.errors.items())))
+        lines.append("")
+        lines.append("{:<18}{:>6}{:>7}{:>7}".format("function", "calls", "p50", "p99"))
+        functions = sorted(self.functions.items(), key=lambda item: item[1].total, reverse=True)
+        for description, histogram in functions[:count]:
+            lines.append("{:<18.18}{:>6}{:>7}{:>7}".format(description, histogram.count,
+                                                           formatTime(histogram.percentile(0.5)),
+                                                           formatTime(histogram.percentile(0.99))))
+        return "\n".join(lines)
+
+    def toDict(self):
+        return {
+            'keys': {key: histogram.toDict() for key, histogram in self.keys.items()},
+            'functions': {description: histogram.toDict() for description, histogram in self.functions.items()},
+            'frames': self.frames.toDict(),
+            'errors': dict(self.errors),
+            'stackDepth': self.stackDepth,
+            'maxStackDepth': self.maxStackDepth,
+            'undoSize': self.undoSize,
+            'maxUndoSize': self.maxUndoSize,
+        }
+
+    def dump(self, path):
+        """ Save the statistics as JSON """
+        with open(path, 'w') as file:
+            json.dump(self.toDict(), file, indent=1, sort_keys=True)
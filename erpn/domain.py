@@ -2,20 +2,73 @@
 # Copyright (C) 2016 Bart de Waal
 # This program is licenced under the GPL version three, see Licence file for details
 
+from bisect import bisect_right
 from numbers import Real
-from math import isfinite
+from math import isfinite, isnan, floor, ceil, nextafter, inf
+
+from .vectors import isVector, numpy
+
+
+class NotCompilable(Exception):
+    """ The domain can't be written as an IntervalSet """
+    pass
 
 
 class Domain:
     """ A class for domains, allowing you to check if a variable is in a domain.
-    The default, non-subclassed version is all real numbers """
+    The default, non-subclassed version is all real numbers.
+    A vector is in the domain if all its elements are. Subclasses implement
+    contains for single numbers and mask for vectors """
     def __init__(self):
         pass
 
     def __contains__(self, item):
+        if isVector(item):
+            return bool(self.mask(item).all())
+        return self.contains(item)
+
+    def contains(self, item):
         # Include all real numbers, but not floating point numbers like NaN
         return (isinstance(item, Real) and isfinite(item))
 
+    def mask(self, values):
+        """ Check all elements of a vector at once, returns an array of
+        booleans """
+        return numpy.isfinite(values)
+
+    def contains_many(self, values):
+        """ Check a sequence of values, returns an array of booleans (a list
+        if numpy is not installed) """
+        if numpy is None:
+            return [value in self for value in values]
+        return self.mask(numpy.asarray(values, dtype=float))
+
+    def boundaries(self):
+        """ The values where membership can change, used by compile().
+        Raises NotCompilable if this isn't known """
+        if type(self) is Domain:
+            return []
+        raise NotCompilable()
+
+    def compile(self):
+        """ Return the same domain as an IntervalSet, which is faster to check.
+        If the domain can't be written as one, the domain itself is returned.
+        The result is remembered, domains don't change """
+        try:
+            return self.compiled
+        except AttributeError:
+            pass
+        try:
+            self.compiled = IntervalSet.fromDomain(self)
+        except NotCompilable:
+            self.compiled = self
+        return self.compiled
+
+    def simplify(self):
+        """ The canonical form of this domain, so domains that contain the same
+        values compare and print the same """
+        return self.compile()
+
     def __add__(self, item):
         return Union(self, item)
 
@@ -52,6 +105,9 @@ class DomainCombination(Domain):
         self.left = left
         self.right = right
 
+    def boundaries(self):
+        return list(self.left.boundaries()) + list(self.right.boundaries())
+
     def __repr__(self):
         return "{}({}, {})".format(self.__class__.__name__,
                                    repr(self.left),
@@ -59,19 +115,28 @@ class DomainCombination(Domain):
 
 
 class Union(DomainCombination):
-    def __contains__(self, item):
+    def contains(self, item):
         return (item in self.left or item in self.right)
 
+    def mask(self, values):
+        return self.left.mask(values) | self.right.mask(values)
+
 
 class Intersect(DomainCombination):
-    def __contains__(self, item):
+    def contains(self, item):
         return (item in self.left and item in self.right)
 
+    def mask(self, values):
+        return self.left.mask(values) & self.right.mask(values)
+
 
 class Minus(DomainCombination):
-    def __contains__(self, item):
+    def contains(self, item):
         return ((item in self.left) and not (item in self.right))
 
+    def mask(self, values):
+        return self.left.mask(values) & ~self.right.mask(values)
+
 
 class Comparison(Domain):
     def __init__(self, operator, value):
@@ -79,10 +144,17 @@ class Comparison(Domain):
         self.value = value
         self.operator = operator
 
-    def __contains__(self, item):
+    def contains(self, item):
         # Call the comparison operator on the item, and use it on value
         return (getattr(item, self.operator)(self.value))
 
+    def mask(self, values):
+        # numpy arrays have the same operators, comparing every element
+        return getattr(values, self.operator)(self.value)
+
+    def boundaries(self):
+        return [self.value]
+
     def __repr__(self):
         return "Comparison({}, {})".format(self.operator, self.value)
 
@@ -91,9 +163,15 @@ class SetDomain(Domain):
     def __init__(self, values):
         self.set = set(values)
 
-    def __contains__(self, item):
+    def contains(self, item):
         return item in self.set
 
+    def mask(self, values):
+        return numpy.isin(values, list(self.set))
+
+    def boundaries(self):
+        return self.set
+
     def __add__(self, other):
         if isinstance(other, SetDomain):
             return SetDomain(self.set.union(other.set))
@@ -112,12 +190,224 @@ def SingleValue(value):
 
 
 class IntegersDomain(Domain):
-    def __contains__(self, value):
+    def contains(self, value):
         return (isinstance(value, int) or value.is_integer())
 
+    def mask(self, values):
+        return numpy.isfinite(values) & (values == numpy.floor(values))
+
+    def boundaries(self):
+        return []
+
     def __repr__(self):
         return "IntegersDomain()"
 
 
+def integerBetween(low, high):
+    """ An integer float with low < x < high, or None """
+    if low == -inf:
+        candidate = 0.0 if high == inf else ceil(high) - 1.0
+        if not candidate < high:
+            candidate = nextafter(high, -inf)
+    else:
+        candidate = floor(low) + 1.0
+        if not candidate > low:
+            candidate = nextafter(low, inf)
+    if low < candidate < high and candidate.is_integer():
+        return candidate
+    return None
+
+
+def nonIntegerBetween(low, high):
+    """ A float that isn't an integer with low < x < high, or None """
+    if low == -inf:
+        low = min(high, 0.0) - 1.0
+    if high == inf:
+        high = max(low, 0.0) + 1.0
+    middle = low + (high - low) / 2
+    for candidate in (middle, low + (middle - low) / 2, middle + (high - middle) / 2,
+                      nextafter(low, inf), nextafter(high, -inf)):
+        if low < candidate < high and not candidate.is_integer():
+            return candidate
+    return None
+
+
+class IntervalSet(Domain):
+    """ A domain in its canonical form: sorted, non-overlapping intervals.
+    Every interval is (low, high, lowClosed, highClosed, integer), if integer
+    is True it only contains the integers in the interval. A single value is
+    the interval [value, value]. Infinity and NaN are only included if
+    their flags are set, they are never part of an interval.
+
+    Make one with compile() on any domain. Checking a value takes O(log k)
+    for k intervals """
+    def __init__(self, intervals, negInf=False, posInf=False, nan=False):
+        self.intervals = intervals
+        self.negInf = negInf
+        self.posInf = posInf
+        self.nan = nan
+        self.lows = [interval[0] for interval in intervals]
+        # Shortcut for the most common domain, all real numbers
+        self.allFinite = (len(intervals) == 1 and intervals[0] == (-inf, inf, False, False, False))
+        self.arrays = None
+
+    @classmethod
+    def fromDomain(cls, domain):
+        """ Find the intervals of any domain built from Reals, Integers,
+        comparisons, sets and their combinations. The real line is split at
+        every value where membership can change. Membership is the same
+        everywhere between two of those values (but can be different for
+        integers and other numbers), so one value of each kind is checked
+        with the original domain """
+        points = set()
+        for value in domain.boundaries():
+            if isinstance(value, Real) and isfinite(value):
+                points.add(float(value))
+        points = sorted(points)
+
+        pieces = []
+        edges = [-inf] + points + [inf]
+        for i in range(len(edges) - 1):
+            low, high = edges[i], edges[i + 1]
+            if i > 0 and low in domain:
+                pieces.append((low, low, True, True, None))
+
+            integer = integerBetween(low, high)
+            nonInteger = nonIntegerBetween(low, high)
+            integerIn = integer is not None and integer in domain
+            nonIntegerIn = nonInteger is not None and nonInteger in domain
+            if nonIntegerIn and integer is not None and not integerIn:
+                # Like Reals - Integers, that would need infinitely many intervals
+                raise NotCompilable()
+            if nonIntegerIn:
+                pieces.append((low, high, False, False, False))
+            elif integerIn:
+                pieces.append((low, high, False, False, True))
+
+        return cls(cls.merge(pieces), -inf in domain, inf in domain, float('nan') in domain)
+
+    @staticmethod
+    def merge(pieces):
+        """ Join pieces that touch into intervals. The integer flag of a single
+        value is None, it can join both kinds of interval if it is an integer """
+        intervals = []
+        for piece in pieces:
+            if len(intervals) > 0:
+                low, high, lowClosed, highClosed, integer = intervals[-1]
+                touching = (high == piece[0] and
+                            (highClosed or piece[2] or
+                             (integer and piece[4] and not high.is_integer())))
+                if touching:
+                    if integer is None and piece[4] is None:
+                        kinds = None
+                    elif integer is None or piece[4] is None:
+                        point = low if integer is None else piece[0]
+                        kinds = integer if piece[4] is None else piece[4]
+                        touching = point.is_integer() or not kinds
+                    else:
+                        kinds = integer
+                        touching = integer == piece[4]
+                if touching:
+                    intervals[-1] = (low, piece[1], lowClosed, piece[3], kinds)
+                    continue
+            intervals.append(piece)
+        return [(low, high, lowClosed, highClosed, bool(integer))
+                for low, high, lowClosed, highClosed, integer in intervals]
+
+    def compile(self):
+        return self
+
+    def boundaries(self):
+        return [value for interval in self.intervals for value in interval[:2]]
+
+    def inInterval(self, index, value):
+        low, high, lowClosed, highClosed, integer = self.intervals[index]
+        return ((low < value or (lowClosed and low == value)) and
+                (value < high or (highClosed and value == high)) and
+                (not integer or value.is_integer()))
+
+    def __contains__(self, item):
+        # Stack values are floats, check those without the other tests
+        if type(item) is float:
+            return self.containsFloat(item)
+        return Domain.__contains__(self, item)
+
+    def contains(self, item):
+        if not isinstance(item, Real):
+            return False
+        try:
+            value = float(item)
+        except OverflowError:
+            # An int too large for a float, it can't be used on the stack anyway
+            value = inf if item > 0 else -inf
+        return self.containsFloat(value)
+
+    def containsFloat(self, value):
+        if not isfinite(value):
+            if isnan(value):
+                return self.nan
+            return self.posInf if value > 0 else self.negInf
+        if self.allFinite:
+            return True
+        index = bisect_right(self.lows, value) - 1
+        if index < 0:
+            return False
+        # A single value can start at the same place as the next interval
+        return self.inInterval(index, value) or (index > 0 and self.inInterval(index - 1, value))
+
+    def mask(self, values):
+        if self.allFinite and not (self.nan or self.posInf or self.negInf):
+            return numpy.isfinite(values)
+        if self.arrays is None:
+            columns = list(zip(*self.intervals)) or [[]] * 5
+            self.arrays = [numpy.array(column, dtype=dtype)
+                           for column, dtype in zip(columns, (float, float, bool, bool, bool))]
+        lows, highs, lowClosed, highClosed, integer = self.arrays
+
+        result = numpy.zeros(numpy.shape(values), dtype=bool)
+        if len(lows) > 0:
+            isInteger = values == numpy.floor(values)
+            index = numpy.searchsorted(lows, values, side='right') - 1
+            for candidate in (index, index - 1):
+                valid = candidate >= 0
+                candidate = numpy.maximum(candidate, 0)
+                low, high = lows[candidate], highs[candidate]
+                result |= (valid &
+                           ((values > low) | (lowClosed[candidate] & (values == low))) &
+                           ((values < high) | (highClosed[candidate] & (values == high))) &
+                           (~integer[candidate] | isInteger))
+        if self.nan:
+            result |= numpy.isnan(values)
+        if self.posInf:
+            result |= values == inf
+        if self.negInf:
+            result |= values == -inf
+        return result
+
+    def __eq__(self, other):
+        return (isinstance(other, IntervalSet) and
+                (self.intervals, self.negInf, self.posInf, self.nan) ==
+                (other.intervals, other.negInf, other.posInf, other.nan))
+
+    def __hash__(self):
+        return hash((tuple(self.intervals), self.negInf, self.posInf, self.nan))
+
+    def __repr__(self):
+        parts = []
+        for low, high, lowClosed, highClosed, integer in self.intervals:
+            if low == high:
+                text = "{{{}}}".format(low)
+            else:
+                text = "{}{}, {}{}".format('[' if lowClosed else '(', low,
+                                           high, ']' if highClosed else ')')
+            if integer:
+                text = "Integers" + text
+            parts.append(text)
+        for flag, value in ((self.negInf, -inf), (self.posInf, inf), (self.nan, float('nan'))):
+            if flag:
+                parts.append("{{{}}}".format(value))
+        return "IntervalSet({})".format(' + '.join(parts))
+
+
 Reals = Domain()
 Integers = IntegersDomain()
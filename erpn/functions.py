@@ -3,9 +3,17 @@
 # This program is licenced under the GPL version three, see Licence file for details
 
 import math
+from array import array
 
 from .domain import Reals, Integers
-from pyperclip import copy, paste
+from .tokenizer import parseNumbers
+from .vectors import LazyModule, numpy, isVector, hasVector, asVector
+
+# Only imported when the clipboard is used
+pyperclip = LazyModule('pyperclip')
+# If this isn't None it is called instead of pyperclip.paste, so a recording
+# can save what was pasted and a replay can paste it again
+readClipboard = None
 
 
 class StackToSmallError(Exception):
@@ -13,6 +21,10 @@ class StackToSmallError(Exception):
     pass
 
 
+# Every result is checked against this, so use the compiled form
+finiteReals = Reals.compile()
+
+
 class DomainError(Exception):
     """ An argument is not defined on an argument """
     pass
@@ -35,7 +47,8 @@ class RPNfunction:
         self.args = args
         self.description = description
         self.checkStackSize = checkStackSize
-        self.functionDomain = functionDomain
+        # The compiled domains contain the same values, but are faster to check
+        self.functionDomain = [domain.compile() for domain in functionDomain]
         self.undo = undo
         self.display = display
 
@@ -51,7 +64,10 @@ class RPNfunction:
             functionArguments = stack[-self.args:]
         self.checkDomain(functionArguments)
 
-        toAdd = self.function(functionArguments)
+        if hasVector(functionArguments):
+            toAdd = self.applyToVectors(functionArguments)
+        else:
+            toAdd = self.function(functionArguments)
         self.checkToAdd(toAdd, "Result is not a valid value")
 
         if(self.undo):
@@ -65,16 +81,31 @@ class RPNfunction:
 
     def checkToAdd(self, toAdd, failMessage):
         for item in toAdd:
-            if item not in Reals:
+            if item not in finiteReals:
                 raise DomainError(failMessage)
 
+    def applyToVectors(self, arguments):
+        """ Apply the function if some of the arguments are vectors. numpy
+        doesn't raise errors but warns and returns inf or nan, checkToAdd
+        will find those so we don't need the warnings """
+        try:
+            with numpy.errstate(all='ignore'):
+                return self.function(arguments)
+        except ValueError:
+            # numpy can't combine vectors of different lengths
+            raise DomainError("'{}' needs vectors of the same length".format(self.description))
+
     def checkDomain(self, arguments):
         if self.checkStackSize:
             # functions that don't check the stack size will need to do their own domain checking
             for i in range(self.args):
-                if arguments[-1-i] not in self.functionDomain[i]:
+                argument = arguments[-1-i]
+                if argument not in self.functionDomain[i]:
+                    if isVector(argument):
+                        # Show the first element that is not in the domain
+                        argument = argument[~self.functionDomain[i].mask(argument)][0]
                     raise DomainError("'{}' is not defined at {}".format(self.description,
-                                                                         arguments[-1-i]))
+                                                                         argument))
 
     def handleArrow(self, stack, undostack, arrowLocation):
         if arrowLocation != 0:
@@ -86,6 +117,8 @@ class RPNfunction:
 
 
 class UndoItem:
+    __slots__ = ('remove', 'add', 'redo')
+
     def __init__(self, remove, add, redo):
         """ An action to undo something
         remove: how many items this will remove
@@ -106,6 +139,8 @@ class UndoItem:
 
 
 class FunctionalUndoItem:
+    __slots__ = ('text', 'function', 'redo')
+
     def __init__(self, undofunction, redo, undoText="using a function"):
         """ An action to undo something
         function: the function that, if given the stack as argument, will undo the action
@@ -128,10 +163,40 @@ def multiply_function(items):
     return [items[0]*items[1]]
 
 
+def elementwise(scalarFunction, vectorFunction):
+    """ Make a function of x for an RPNfunction, that uses scalarFunction if x
+    is a number and the numpy function called vectorFunction if it is a
+    vector """
+    def function(x):
+        if isVector(x[0]):
+            return [getattr(numpy, vectorFunction)(x[0])]
+        return [scalarFunction(x[0])]
+    return function
+
+
+def factorial_function(x):
+    if isVector(x[0]):
+        return [numpy.array([math.factorial(round(value)) for value in x[0]], dtype=float)]
+    return [math.factorial(round(x[0]))]
+
+
+def gcd_function(x):
+    if hasVector(x):
+        integers = [numpy.rint(value).astype(numpy.int64) for value in x]
+        return [numpy.gcd(integers[0], integers[1]).astype(float)]
+    return [math.gcd(round(x[0]), round(x[1]))]
+
+
 def check_exponent_domain(args):
     """ check the domain for y^x """
     x = args[-1]
     y = args[-2]
+    if hasVector(args):
+        if numpy.any((y < 0) & ~Integers.mask(x)):
+            raise DomainError("Cannot raise negative numbers to a non-integer power")
+        if numpy.any((y == 0.0) & (x < 0.0)):
+            raise DomainError("Cannot raise 0 to a negative power")
+        return
     if y < 0:
         if x not in Integers:
             raise DomainError("Cannot raise negative numbers to a non-integer power")
@@ -144,6 +209,10 @@ def check_tan_domain(args):
     """ Check the domain for tan(x)
     This cosists of the real numbers line, excluding pi/2 + k*pi"""
     x = args[-1]
+    if isVector(x):
+        if numpy.any(numpy.isclose(numpy.fmod(x, math.pi), math.pi/2, rtol=1e-09, atol=0.0)):
+            raise DomainError("tan(x) is not defined at pi/2 radians")
+        return
     if math.isclose(math.pi/2,
                     math.fmod(x, math.pi)):
         raise DomainError("tan(x) is not defined at pi/2 radians")
@@ -152,7 +221,11 @@ def check_tan_domain(args):
 def copy_function(args):
     """ Copy x to the clipboard without changing anything """
     x = args[-1]
-    copy(str(x))
+    if isVector(x):
+        # One value per line, so it can be pasted back as a vector
+        pyperclip.copy('\n'.join(str(value) for value in x.tolist()))
+    else:
+        pyperclip.copy(str(x))
     return [x]
 
 
@@ -167,77 +240,101 @@ divide = RPNfunction(2, "y/x", lambda x: [x[0]/x[1]], [Reals - {0}, Reals])
 exponent = RPNfunction(2, "y^x", lambda x: [x[0]**x[1]])
 exponent.checkDomain = check_exponent_domain
 square = RPNfunction(1, "x^2", lambda x: [x[0]*x[0]])
-sqrt = RPNfunction(1, "sqrt x", lambda x: [math.sqrt(x[0])], [Reals >= 0])
-power_e = RPNfunction(1, "e^x", lambda x: [math.exp(x[0])])
+sqrt = RPNfunction(1, "sqrt x", elementwise(math.sqrt, 'sqrt'), [Reals >= 0])
+power_e = RPNfunction(1, "e^x", elementwise(math.exp, 'exp'))
 power_10 = RPNfunction(1, "10^x", lambda x: [10**x[0]])
-log10 = RPNfunction(1, "log10", lambda x: [math.log10(x[0])], [Reals > 0])
-ln = RPNfunction(1, "ln", lambda x: [math.log(x[0])], [Reals > 0])
+log10 = RPNfunction(1, "log10", elementwise(math.log10, 'log10'), [Reals > 0])
+ln = RPNfunction(1, "ln", elementwise(math.log, 'log'), [Reals > 0])
 
 mult_inverse = RPNfunction(1, "1/x", lambda x: [1/x[0]], [Reals - {0}])
 add_inverse = RPNfunction(1, "-x", lambda x: [-x[0]])
 
 modulo = RPNfunction(2, "y mod x", lambda x: [x[0] % x[1]], [Reals - {0}, Reals])
 
-sin = RPNfunction(1, "sin x (rad)", lambda x: [math.sin(x[0])])
-cos = RPNfunction(1, "cos x (rad)", lambda x: [math.cos(x[0])])
-tan = RPNfunction(1, "tan x (rad)", lambda x: [math.tan(x[0])])
+sin = RPNfunction(1, "sin x (rad)", elementwise(math.sin, 'sin'))
+cos = RPNfunction(1, "cos x (rad)", elementwise(math.cos, 'cos'))
+tan = RPNfunction(1, "tan x (rad)", elementwise(math.tan, 'tan'))
 tan.checkDomain = check_tan_domain
 
-arcsin = RPNfunction(1, "arcsin x (rad)", lambda x: [math.asin(x[0])],
+arcsin = RPNfunction(1, "arcsin x (rad)", elementwise(math.asin, 'arcsin'),
                      [(Reals <= 1) >= -1])
-arccos = RPNfunction(1, "arccos x (rad)", lambda x: [math.acos(x[0])],
+arccos = RPNfunction(1, "arccos x (rad)", elementwise(math.acos, 'arccos'),
                      [(Reals <= 1) >= -1])
-arctan = RPNfunction(1, "arctan x (rad)", lambda x: [math.atan(x[0])])
-
-floor = RPNfunction(1, "floor", lambda x: [math.floor(x[0])])
-ceil = RPNfunction(1, "ceil", lambda x: [math.ceil(x[0])])
-factorial = RPNfunction(1, "factorial",
-                        lambda x: [math.factorial(round(x[0]))],
-                        [Integers >= 0])
-gcd = RPNfunction(2, "GCD", lambda x: [math.gcd(round(x[0]), round(x[1]))],
-                  [Integers, Integers])
+arctan = RPNfunction(1, "arctan x (rad)", elementwise(math.atan, 'arctan'))
 
-
-def raise_(ex):
-    """I like to use exceptions as flow control, and I like to define functions
-    using lambda So this is a helper function to let me raise exceptions in
-    lambda"""
-    raise ex
+floor = RPNfunction(1, "floor", elementwise(math.floor, 'floor'))
+ceil = RPNfunction(1, "ceil", elementwise(math.ceil, 'ceil'))
+factorial = RPNfunction(1, "factorial", factorial_function, [Integers >= 0])
+gcd = RPNfunction(2, "GCD", gcd_function, [Integers, Integers])
 
 
 def Pass(*args, **namedArgs):
     pass
 
 
-class IsBack(Exception): pass  # noqa
-class IsUndo(Exception): pass  # noqa
-class IsRedo(Exception): pass  # noqa
-class IsQuit(Exception): pass  # noqa
-class IsCopyFromStack(Exception): pass  # noqa
-class EnterDisplayMenu(Exception): pass  # noqa
+class Command:
+    """ What a function asks the calculator to do, if it does something else
+    than changing the stack (undo, moving the arrow, changing menus...).
+    RPNfunction.run returns None for functions that change the stack """
+    def __init__(self, name, *arguments):
+        self.name = name
+        self.arguments = arguments
+
+    def __eq__(self, other):
+        return (isinstance(other, Command) and
+                (self.name, self.arguments) == (other.name, other.arguments))
+
+    def __hash__(self):
+        return hash((self.name, self.arguments))
+
+    def __repr__(self):
+        return "Command({})".format(", ".join(repr(item) for item in (self.name,) + self.arguments))
+
 
+class CommandFunction(RPNfunction):
+    """ A function that doesn't change the stack, but returns a Command """
+    def __init__(self, description, name, *arguments, display=True):
+        super().__init__(0, description, None, [], undo=False, display=display)
+        self.command = Command(name, *arguments)
 
-class IsArrow(Exception):
-    def __init__(self, direction, message="Arrow button pressed", *args):
-        """ Direction should be "up" or "down" """
-        self.message = message
-        self.direction = direction
-        super().__init__(message)
+    def run(self, stack, undostack, arrowLocation):
+        self.handleArrow(stack, undostack, arrowLocation)
+        return self.command
 
 
-undo = RPNfunction(0, "undo", lambda x: raise_(IsUndo()))
-redo = RPNfunction(0, "redo", lambda x: raise_(IsRedo()))
-quit = RPNfunction(0, "quit", lambda x: raise_(IsQuit()))
-back = RPNfunction(0, "go back", lambda x: raise_(IsBack()))
-quit = RPNfunction(0, "quit", lambda x: raise_(IsQuit()))
-copy_from_stack = RPNfunction(1, "Copy from Stack", lambda x: raise_(IsCopyFromStack()))
+undo = CommandFunction("undo", 'undo')
+redo = CommandFunction("redo", 'redo')
+next_branch = CommandFunction("Next redo branch", 'branch')
+quit = CommandFunction("quit", 'quit')
+back = CommandFunction("go back", 'back')
+copy_from_stack = CommandFunction("Copy from Stack", 'copy from stack')
 copy_to_OS = RPNfunction(1, "Copy", copy_function, undo=False)
-menu_display = RPNfunction(0, "Change Display", lambda x: raise_(EnterDisplayMenu()))
+menu_display = CommandFunction("Change Display", 'menu', 'display')
 
-arrow_up = RPNfunction(0, "Arrow up", lambda x: raise_(IsArrow("up")), display=False, undo=False)
+arrow_up = CommandFunction("Arrow up", 'arrow', 'up', display=False)
 arrow_up.handleArrow = Pass
-arrow_down = RPNfunction(0, "Arrow down", lambda x: raise_(IsArrow("down")), display=False, undo=False)
+arrow_down = CommandFunction("Arrow down", 'arrow', 'down', display=False)
 arrow_down.handleArrow = Pass
+# The palette runs the chosen function with the arrow, so leave it where it is
+open_palette = CommandFunction("Command palette", 'palette')
+open_palette.handleArrow = Pass
+show_statistics = CommandFunction("Statistics", 'statistics')
+show_statistics.handleArrow = Pass
+
+
+class JumpToState(CommandFunction):
+    """ Go to the state of the undo tree with number x. x stays on the
+    stack, as part of the state that is left behind """
+    def __init__(self):
+        super().__init__("Go to undo state x", 'jump')
+
+    def run(self, stack, undostack, arrowLocation):
+        if len(stack) < 1:
+            raise StackToSmallError()
+        number = stack[-1]
+        if isVector(number) or number not in (Integers >= 0):
+            raise DomainError("'{}' is not defined at {}".format(self.description, number))
+        return Command('jump', round(number))
 
 
 class PasteFromOS(RPNfunction):
@@ -249,8 +346,14 @@ class PasteFromOS(RPNfunction):
 
     def run(self, stack, undostack, arrowLocation):
         try:
-            toAdd = float(paste())
-        except:
+            text = pyperclip.paste() if readClipboard is None else readClipboard()
+            values = parseNumbers(text)
+            if len(values) == 1:
+                toAdd = values[0]
+            else:
+                # Several numbers are pasted as a vector
+                toAdd = asVector(values)
+        except ValueError:
             raise DomainError("Unable to use clipboard value")
 
         self.checkToAdd([toAdd], "Unable to use clipboard value")
@@ -275,13 +378,18 @@ class CopyCurrent(RPNfunction):
 
 
 class UndoDelete(UndoItem):
+    __slots__ = ('position', 'value')
+
     def __init__(self, position, value):
         """ Undo a deletion action
         When this undo is applied, value will be at position
         position should be a non-negative integer, just like ArrowLocation"""
         self.position = position
         self.value = value
-        self.redo = Delete(deleteLocation=position)
+
+    @property
+    def redo(self):
+        return Delete(deleteLocation=self.position)
 
     def apply(self, stack):
         """ Apply the remembered undo action to indicated stack """
@@ -316,10 +424,14 @@ class Delete(RPNfunction):
 
 class AddItem(RPNfunction):
     """ RPN function to add an item to the stack.
-    The __init__ function will check that the value is a float we can use """
+    The __init__ function will check that the value is a float (or a vector)
+    we can use """
     def __init__(self, value, display=True, description=None):
-        value = float(value)
-        if value not in Reals:
+        if isVector(value):
+            value = asVector(value)
+        else:
+            value = float(value)
+        if value not in finiteReals:
             raise ValueError
         self.valueToAdd = value
         if description is None:
@@ -327,6 +439,9 @@ class AddItem(RPNfunction):
         else:
             self.description = description
         self.display = display
+        # A push of a value that was entered, which is the same as any other
+        # AddItem of the value. UndoHistory only keeps the value of those
+        self.plain = description is None and display
 
     def run(self, stack, undostack, arrowLocation):
         self.checkToAdd([self.valueToAdd], "Unable to add value")
@@ -334,17 +449,47 @@ class AddItem(RPNfunction):
         undostack.append(UndoItem(1, [], self))
 
 
-class ChangeDisplayFormat(Exception):
-    """ An exception to signal we want to change the display settings. It
-    carries the display settings it wants with it """
-    def __init__(self, adj_format, message="Change Display Format", *args):
-        """ adj_format can be + or - to change the precision, or a ValueFormatter """
-        self.adj_format = adj_format
-        super().__init__(message)
+class AddItems(RPNfunction):
+    """ RPN function to add a list of items to the stack, undone in one step """
+    def __init__(self, values, display=True, description=None):
+        # Keep the values as an array, so a Stack can add them in one go
+        values = array('d', map(float, values))
+        if not all(map(math.isfinite, values)):
+            raise ValueError
+        self.valuesToAdd = values
+        if description is None:
+            self.description = "push {} values".format(len(values))
+        else:
+            self.description = description
+        self.display = display
+        self.plain = description is None and display  # See AddItem
+
+    def run(self, stack, undostack, arrowLocation):
+        stack.extend(self.valuesToAdd)
+        undostack.append(UndoItem(len(self.valuesToAdd), [], self))
+
+
+class ReplaceTop(RPNfunction):
+    """ RPN function to replace the top count items by values. The actions of
+    an earlier session are redone with this, because only what they changed
+    is saved """
+    def __init__(self, count, values, display=True, description="redo"):
+        self.count = count
+        self.values = values
+        self.description = description
+        self.display = display
+
+    def run(self, stack, undostack, arrowLocation):
+        if len(stack) < self.count:
+            raise StackToSmallError()
+        removed = stack[len(stack) - self.count:]
+        del stack[len(stack) - self.count:]
+        stack.extend(self.values)
+        undostack.append(UndoItem(len(self.values), removed, self))
 
 
 class ChangeDisplayFunction(RPNfunction):
-    """ Raise an ChangeDisplayFormat exception to set the correct display value """
+    """ Ask the calculator to change the display settings """
     def __init__(self, adj_format, display=True, description=None):
         """ adj_format can be '+' or '-' to change the precision, or a ValueFormatter """
         self.adj_format = adj_format
@@ -352,7 +497,7 @@ class ChangeDisplayFunction(RPNfunction):
         self.display = display
 
     def run(self, *args, **kwargs):
-        raise ChangeDisplayFormat(self.adj_format)
+        return Command('display', self.adj_format)
 
 
 class Switch2(RPNfunction):
@@ -371,18 +516,176 @@ class Switch2(RPNfunction):
         elif arrowLocation == 0:
             arrowLocation = 1
 
-        def switch2(stack):
-            x = stack.pop(-arrowLocation-1)
-            y = stack.pop()
+        switchItems(stack, arrowLocation)
+        undostack.append(UndoSwitch(arrowLocation))
+
+
+def switchItems(stack, position):
+    """ Swap x and the item at position """
+    x = stack.pop(-position-1)
+    y = stack.pop()
+
+    stack.append(x)
+    stack.insert(-position, y)
+
+
+class UndoSwitch(UndoItem):
+    """ Undo a swap, by swapping the same items again """
+    __slots__ = ('position',)
+
+    def __init__(self, position):
+        self.position = position
+
+    @property
+    def redo(self):
+        return Switch2(description="Swap with location {}".format(self.position),
+                       arrowLocation=self.position)
+
+    def apply(self, stack):
+        switchItems(stack, self.position)
+
+    def __str__(self):
+        return "Undo: swap with location {}".format(self.position)
+
+
+class StackCountFunction(RPNfunction):
+    """ Parent class for the HP style stack functions (roll, pick, drop n, dup
+    n). They work on the top n items, where n is taken from x. If the arrow
+    is used, n is the level of the item it points at (x is level 1) and x
+    is not taken from the stack """
+    minimumCount = 1
+
+    def __init__(self, display=True, count=None, dropCount=False):
+        """ If count is not None it is used as n, without taking it from the
+        stack. This is used to redo an action. If n was taken from x, redo
+        uses dropCount to drop x again, whatever its value is now """
+        self.display = display
+        self.count = count
+        self.dropCount = dropCount
+
+    def takeCount(self, stack, arrowLocation):
+        """ Find out n, and check the stack is large enough. Returns n and the
+        value that should be removed from the stack (None if nothing should) """
+        if self.count is not None:
+            countValue = None
+            if self.dropCount:
+                if len(stack) < 1:
+                    raise StackToSmallError()
+                countValue = stack[-1]
+            count = self.count
+        elif arrowLocation != 0:
+            count, countValue = arrowLocation + 1, None
+        else:
+            if len(stack) < 1:
+                raise StackToSmallError()
+            countValue = stack[-1]
+            if isVector(countValue):
+                raise DomainError("'{}' needs a number, not a vector".format(self.description))
+            if countValue not in (Integers >= self.minimumCount):
+                raise DomainError("'{}' is not defined at {}".format(self.description, countValue))
+            count = round(countValue)
+
+        available = len(stack) if countValue is None else len(stack) - 1
+        if count > available:
+            raise StackToSmallError()
+        return count, countValue
 
-            stack.append(x)
-            stack.insert(-arrowLocation, y)
 
-        switch2(stack)
+class UndoRoll(UndoItem):
+    __slots__ = ('count', 'countValue')
 
-        redoItem = Switch2(description="Swap with location {}".format(arrowLocation),
-                           arrowLocation=arrowLocation)
+    def __init__(self, count, countValue):
+        """ Undo a roll: move x back to level count, and put countValue back
+        on the stack if it isn't None """
+        self.count = count
+        self.countValue = countValue
 
-        undoItem = FunctionalUndoItem(switch2, redoItem)
+    @property
+    def redo(self):
+        return Roll(count=self.count, dropCount=self.countValue is not None)
 
-        undostack.append(undoItem)
+    def apply(self, stack):
+        value = stack.pop()
+        stack.insert(len(stack) - self.count + 1, value)
+        if self.countValue is not None:
+            stack.append(self.countValue)
+
+    def __str__(self):
+        return "Undo: roll {}".format(self.count)
+
+
+class Roll(StackCountFunction):
+    """ Move the item at level n to the top of the stack """
+    description = "roll n"
+
+    def run(self, stack, undostack, arrowLocation):
+        count, countValue = self.takeCount(stack, arrowLocation)
+        if countValue is not None:
+            stack.pop()
+        stack.append(stack.pop(-count))
+        undostack.append(UndoRoll(count, countValue))
+
+
+class Pick(StackCountFunction):
+    """ Copy the item at level n to the top of the stack """
+    description = "pick n"
+
+    def run(self, stack, undostack, arrowLocation):
+        count, countValue = self.takeCount(stack, arrowLocation)
+        if countValue is not None:
+            stack.pop()
+        stack.append(stack[-count])
+        redo = Pick(count=count, dropCount=countValue is not None)
+        undostack.append(UndoItem(1, [] if countValue is None else [countValue], redo))
+
+
+class DropN(StackCountFunction):
+    """ Remove the top n items """
+    description = "drop n"
+    minimumCount = 0
+
+    def run(self, stack, undostack, arrowLocation):
+        count, countValue = self.takeCount(stack, arrowLocation)
+        if countValue is not None:
+            stack.pop()
+        removed = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        redo = DropN(count=count, dropCount=countValue is not None)
+        if countValue is not None:
+            removed.append(countValue)
+        undostack.append(UndoItem(0, removed, redo))
+
+
+class DupN(StackCountFunction):
+    """ Copy the top n items """
+    description = "dup n"
+    minimumCount = 0
+
+    def run(self, stack, undostack, arrowLocation):
+        count, countValue = self.takeCount(stack, arrowLocation)
+        if countValue is not None:
+            stack.pop()
+        stack.extend(stack[len(stack) - count:])
+        redo = DupN(count=count, dropCount=countValue is not None)
+        undostack.append(UndoItem(count, [] if countValue is None else [countValue], redo))
+
+
+class ToVector(StackCountFunction):
+    """ Combine the top n items into one vector, vectors among them are joined """
+    description = "n items to vector"
+
+    def run(self, stack, undostack, arrowLocation):
+        if numpy is None:
+            raise DomainError("Vectors need numpy to be installed")
+        count, countValue = self.takeCount(stack, arrowLocation)
+        if countValue is not None:
+            stack.pop()
+        items = stack[len(stack) - count:]
+        vector = numpy.concatenate([numpy.atleast_1d(item) for item in items])
+        del stack[len(stack) - count:]
+        stack.append(vector)
+
+        redo = ToVector(count=count, dropCount=countValue is not None)
+        if countValue is not None:
+            items.append(countValue)
+        undostack.append(UndoItem(1, items, redo))
@@ -0,0 +1,154 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import collections
+import fileinput
+import itertools
+import sys
+
+from .buttonMappings import loadMappings
+from .calculator import Calculator
+from .tokenizer import numberStart, parseNumber
+
+# Key names like 'meta e' contain a space, so on the command line they are
+# written as two tokens. These are the words that start such a key name.
+keyPrefixes = ('meta', 'ctrl', 'shift')
+
+
+class RecordError(Exception):
+    """ A token in a record could not be evaluated """
+    pass
+
+
+def tokenize(line):
+    """ Split a line into key names and numbers, joining 'meta e' back into a
+    single key """
+    tokens = []
+    for word in line.split():
+        if len(tokens) > 0 and tokens[-1] in keyPrefixes:
+            tokens[-1] += ' ' + word
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def applyTokens(calculator, tokens):
+    """ Apply the tokens to the calculator one by one.
+    Raises RecordError if one of them fails, the tokens before it stay
+    applied. Returns False if one of the tokens asked to quit """
+    for position, token in enumerate(tokens):
+        try:
+            command = None
+            if token[0] in numberStart:
+                calculator.push(parseNumber(token))
+            else:
+                command = calculator.apply(token)
+        except ValueError:
+            raise RecordError(errorText("Could not decode value", position, token))
+        except KeyError:
+            raise RecordError(errorText("Unknown key", position, token))
+
+        if command is not None:
+            if command.name == 'quit':
+                return False
+            raise RecordError(errorText("Only available in the interface", position, token))
+
+        if calculator.error is not None:
+            raise RecordError(errorText(calculator.error, position, token))
+    return True
+
+
+def errorText(message, position, token):
+    return "{} (token {}: '{}')".format(message, position + 1, token)
+
+
+class Evaluator:
+    """ Evaluate records of tokens, each on a fresh stack """
+    def __init__(self, calculator=None, displayFormat=None):
+        if calculator is None:
+            calculator = Calculator()
+            loadMappings(calculator)
+        if displayFormat is None:
+            displayFormat = calculator.displayFormat
+        self.calculator = calculator
+        self.displayFormat = displayFormat
+
+    def evaluate(self, tokens):
+        """ Run the tokens on an empty stack and return the resulting stack and
+        the formatter to display it with.
+        Raises RecordError if one of the tokens fails """
+        calculator = self.calculator
+        calculator.reset()
+        calculator.displayFormat = self.displayFormat
+        applyTokens(calculator, tokens)
+        return calculator.stack, calculator.displayFormat
+
+    def evaluateLine(self, line):
+        """ Evaluate one line of input and return the line of output """
+        try:
+            stack, displayFormat = self.evaluate(tokenize(line))
+        except RecordError as e:
+            return "error: {}".format(e)
+        return ' '.join(displayFormat.display_many(stack))
+
+
+def evaluateLines(lines, evaluator=None):
+    """ Generator that evaluates every line as a separate record and yields
+    the output for it. Only one line is held in memory at a time """
+    if evaluator is None:
+        evaluator = Evaluator()
+    for line in lines:
+        yield evaluator.evaluateLine(line)
+
+
+# Every worker process evaluates its chunks with its own evaluator
+workerEvaluator = None
+
+
+def initWorker(displayFormat):
+    global workerEvaluator
+    workerEvaluator = Evaluator(displayFormat=displayFormat)
+
+
+def evaluateChunk(lines):
+    """ Evaluate a list of lines in a worker, return the output as one string """
+    return ''.join(workerEvaluator.evaluateLine(line) + '\n' for line in lines)
+
+
+def evaluateParallel(lines, jobs, displayFormat=None, chunksize=1000):
+    """ Generator like evaluateLines, but the lines are split in chunks of
+    chunksize lines that are evaluated by a pool of jobs worker processes.
+    The output of every chunk is yielded as a single string, in input order.
+    Only a few chunks per worker are read ahead, so memory stays bounded """
+    import multiprocessing
+
+    lines = iter(lines)
+    with multiprocessing.Pool(jobs, initWorker, (displayFormat,)) as pool:
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(lines, chunksize))
+            if len(chunk) > 0:
+                pending.append(pool.apply_async(evaluateChunk, (chunk,)))
+            # Wait for the oldest chunk when enough work is queued, or when the
+            # input is done
+            while len(pending) > 0 and (len(chunk) == 0 or len(pending) > 2 * jobs):
+                yield pending.popleft().get()
+            if len(chunk) == 0:
+                return
+
+
+def run(files, displayFormat=None, output=None, jobs=1, chunksize=1000):
+    """ Evaluate all lines in files (or stdin if there are none) and write
+    the results to output (stdout by default).
+    If jobs is more than 1, the work is shared by that many processes """
+    if output is None:
+        output = sys.stdout
+    with fileinput.input(files or ('-',)) as lines:
+        if jobs > 1:
+            for result in evaluateParallel(lines, jobs, displayFormat, chunksize):
+                output.write(result)
+        else:
+            evaluator = Evaluator(displayFormat=displayFormat)
+            for result in evaluateLines(lines, evaluator):
+                output.write(result + '\n')
@@ -0,0 +1,253 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# The undo history of a calculator, with a limit on how much it remembers.
+#
+# The history is kept as a journal instead of as UndoItems: each record is an
+# opcode, a number (a count or a position), the number of values that belong
+# to it and a reference into a table of functions, each in a typed array. The
+# values are kept in one array of doubles. The UndoItem is only made again
+# when the step is undone. Things the journal can't store (like vectors) are
+# kept as an object in the table.
+
+from array import array
+
+from .functions import AddItem, AddItems, UndoItem, UndoDelete, UndoRoll, UndoSwitch
+from .vectors import isVector
+
+defaultDepth = 100000  # Undo steps
+defaultBytes = 64 * 2**20
+
+# The kinds of records
+PUSHES = 0  # A run of pushes of numbers, each is a step
+PUSH_MANY = 1  # A single push of the values
+UNDO = 2  # An UndoItem that removes number items and adds the values back
+DELETE = 3  # An UndoDelete at position number
+ROLL = 4  # An UndoRoll of number items, with the count value if it was used
+SWAP = 5  # An UndoSwitch at position number
+OBJECT = 6  # The undo item in the table
+
+# Approximate sizes in bytes, measured with tracemalloc on CPython 3.11
+recordSize = 1 + 4 + 4 + 4  # The opcode, number, length and reference
+numberSize = 8  # A value in the array of values
+functionSize = 100  # A function in the table, with its table entry
+
+# The sizes of undo items that are kept as objects
+itemSize = 150  # An UndoItem, without the values in it
+addItemSize = 200  # An AddItem to redo a push
+scalarSize = 32  # A float in a list
+vectorSize = 112  # A numpy array, without the values
+
+
+def valueSize(value):
+    if isVector(value):
+        return vectorSize + value.nbytes
+    return scalarSize
+
+
+def undoSize(item):
+    """ About how much memory item uses as an object. Most undo items keep
+    the values they add back in .add, UndoDelete keeps a single .value """
+    size = itemSize
+    for value in getattr(item, 'add', ()):
+        size += valueSize(value)
+    if hasattr(item, 'value'):
+        size += valueSize(item.value)
+    if isinstance(item.redo, AddItem):
+        size += addItemSize + valueSize(item.redo.valueToAdd)
+    return size
+
+
+def isNumber(value):
+    return type(value) is float
+
+
+class UndoHistory:
+    """ The undo actions of a calculator, the most recent last. It can be used
+    like a list of UndoItems: functions append to it, and undo pops from it.
+    Only the newest maxDepth steps are remembered, and older ones are
+    forgotten when the history uses more than about maxBytes. A run of pushes
+    of numbers is stored as a single record, other pushes (like pi, with its
+    own description) keep their function.
+
+    The records are kept in a ring buffer, so the oldest one can be forgotten
+    without moving the others """
+    def __init__(self, maxDepth=defaultDepth, maxBytes=defaultBytes):
+        self.maxDepth = maxDepth
+        self.maxBytes = maxBytes
+        self.clear()
+
+    def clear(self):
+        # The ring buffer, with the fields of each record in the same position
+        self.opcodes = array('B')
+        self.numbers = array('i')
+        self.lengths = array('I')  # How many values the record has
+        self.references = array('i')  # Position in self.table, or -1
+        self.start = 0  # The position of the oldest record
+        self.count = 0  # The number of records
+
+        # The values of all records, from oldest to newest. The ones before
+        # self.firstValue belong to forgotten records.
+        self.values = array('d')
+        self.firstValue = 0
+
+        # The functions and objects the records refer to. The same function
+        # is only in the table once, with the number of records using it.
+        self.table = []
+        self.uses = []
+        self.sizes = []
+        self.tablePositions = {}  # id(function): position in self.table
+        self.freePositions = []
+
+        self.depth = 0  # The number of undo steps in all records
+        self.bytes = 0  # About how much memory the records use
+
+    def __len__(self):
+        return self.depth
+
+    def newestPosition(self):
+        return (self.start + self.count - 1) % len(self.opcodes)
+
+    def addRecord(self, opcode, number=0, values=(), reference=-1):
+        if self.count == len(self.opcodes):
+            # Full, put the oldest record first again and make it larger
+            extra = max(min(self.count, self.maxDepth - self.count), 1)
+            for name in ('opcodes', 'numbers', 'lengths', 'references'):
+                old = getattr(self, name)
+                new = old[self.start:] + old[:self.start]
+                new.extend(array(new.typecode, bytes(new.itemsize * extra)))
+                setattr(self, name, new)
+            self.start = 0
+        position = (self.start + self.count) % len(self.opcodes)
+        self.opcodes[position] = opcode
+        self.numbers[position] = number
+        self.lengths[position] = len(values)
+        self.references[position] = reference
+        self.values.extend(values)
+        self.count += 1
+        self.bytes += recordSize + numberSize * len(values)
+
+    def intern(self, function, size=functionSize):
+        """ The position of function in the table, it is added if needed """
+        position = self.tablePositions.get(id(function))
+        if position is None:
+            if len(self.freePositions) > 0:
+                position = self.freePositions.pop()
+                self.table[position] = function
+                self.uses[position] = 0
+                self.sizes[position] = size
+            else:
+                position = len(self.table)
+                self.table.append(function)
+                self.uses.append(0)
+                self.sizes.append(size)
+            self.tablePositions[id(function)] = position
+            self.bytes += size
+        self.uses[position] += 1
+        return position
+
+    def release(self, position):
+        """ A record no longer uses the table entry at position """
+        self.uses[position] -= 1
+        if self.uses[position] == 0:
+            del self.tablePositions[id(self.table[position])]
+            self.table[position] = None
+            self.freePositions.append(position)
+            self.bytes -= self.sizes[position]
+
+    def append(self, item):
+        """ Remember item as the newest undo step """
+        kind = type(item)
+        if kind is UndoItem and type(item.redo) is AddItem and item.redo.plain and \
+                isNumber(item.redo.valueToAdd) and item.remove == 1 and len(item.add) == 0:
+            if self.count > 0 and self.opcodes[self.newestPosition()] == PUSHES:
+                self.values.append(item.redo.valueToAdd)
+                self.lengths[self.newestPosition()] += 1
+                self.bytes += numberSize
+            else:
+                self.addRecord(PUSHES, values=(item.redo.valueToAdd,))
+        elif kind is UndoItem and type(item.redo) is AddItems and item.redo.plain and len(item.add) == 0:
+            self.addRecord(PUSH_MANY, item.remove, item.redo.valuesToAdd)
+        elif kind is UndoItem and all(map(isNumber, item.add)):
+            self.addRecord(UNDO, item.remove, item.add, self.intern(item.redo))
+        elif kind is UndoDelete and isNumber(item.value):
+            self.addRecord(DELETE, item.position, (item.value,))
+        elif kind is UndoRoll and (item.countValue is None or isNumber(item.countValue)):
+            self.addRecord(ROLL, item.count, () if item.countValue is None else (item.countValue,))
+        elif kind is UndoSwitch:
+            self.addRecord(SWAP, item.position)
+        else:
+            self.addRecord(OBJECT, reference=self.intern(item, undoSize(item)))
+        self.depth += 1
+
+        while self.depth > self.maxDepth or (self.bytes > self.maxBytes and self.depth > 1):
+            self.forgetOldest()
+
+    def pop(self):
+        """ Remove the newest undo step and return it """
+        if self.depth == 0:
+            raise IndexError("pop from empty undo history")
+        position = self.newestPosition()
+        opcode = self.opcodes[position]
+        number = self.numbers[position]
+        length = self.lengths[position]
+        reference = self.references[position]
+        self.depth -= 1
+
+        if opcode == PUSHES and length > 1:
+            # Only undo the newest push of the run
+            self.lengths[position] -= 1
+            self.bytes -= numberSize
+            return UndoItem(1, [], AddItem(self.values.pop()))
+
+        values = self.values[len(self.values) - length:]
+        del self.values[len(self.values) - length:]
+        self.count -= 1
+        self.bytes -= recordSize + numberSize * length
+        if self.count == 0:
+            # Forget the values of forgotten records too
+            self.values = array('d')
+            self.firstValue = 0
+
+        if opcode == PUSHES:
+            return UndoItem(1, [], AddItem(values[0]))
+
+        if opcode == PUSH_MANY:
+            return UndoItem(number, [], AddItems(values))
+        if opcode == DELETE:
+            return UndoDelete(number, values[0])
+        if opcode == ROLL:
+            return UndoRoll(number, values[0] if length > 0 else None)
+        if opcode == SWAP:
+            return UndoSwitch(number)
+        function = self.table[reference]
+        self.release(reference)
+        if opcode == UNDO:
+            return UndoItem(number, values.tolist(), function)
+        return function
+
+    def forgetOldest(self):
+        """ Forget the oldest undo step """
+        position = self.start
+        length = self.lengths[position]
+        self.depth -= 1
+        if self.opcodes[position] == PUSHES and length > 1:
+            # Only forget the oldest push
+            self.lengths[position] -= 1
+            self.forgetValues(1)
+            return
+        self.forgetValues(length)
+        if self.references[position] >= 0:
+            self.release(self.references[position])
+        self.start = (self.start + 1) % len(self.opcodes)
+        self.count -= 1
+        self.bytes -= recordSize
+
+    def forgetValues(self, count):
+        """ Forget the oldest count values """
+        self.firstValue += count
+        self.bytes -= numberSize * count
+        if self.firstValue * 2 > len(self.values):
+            del self.values[:self.firstValue]
+            self.firstValue = 0
@@ -3,20 +3,91 @@
 # Copyright (C) 2017 Bart de Waal
 # This program is licenced under the GPL version 3, see Licence file for details
 
-import urwid
-from argparse import ArgumentParser
-
-from .buttonMappings import loadMappings
-from .urwidInterface import Interface
+import os
+import sys
 
 version = '1.0'
 website = 'https://github.com/BartDeWaal/ERPN'
 
-interface = Interface()
-loadMappings(interface)
+# Formatters that can be selected for non-interactive output
+displayFormats = {
+    'default': ('OptionalExponent', {}),
+    'scientific': ('UseExponent', {}),
+    'engineering': ('UseExponent', {'exponent_grouping': 3}),
+    'plain': ('NoExponent', {}),
+    'exact': ('ExactExponent', {}),
+    'exact-engineering': ('ExactExponent', {'exponent_grouping': 3}),
+}
+
+
+def runInterface(undoDepth, undoBytes, useUndoTree, sessionDirectory, statistics=False,
+                 statisticsFile=None, recordingFile=None):
+    """ Start the interactive calculator. urwid is only imported here, so the
+    non-interactive modes don't need it.
+    The stack and history are saved in sessionDirectory, and restored from
+    it, unless it is None.
+    If statistics is True, statistics are kept (ctrl t shows them), and
+    saved as JSON in statisticsFile when erpn quits if that isn't None.
+    If recordingFile isn't None, the keys are recorded in it, see --replay """
+    import urwid
+
+    from .buttonMappings import loadMappings
+    from .calculator import Calculator
+    from .urwidInterface import Interface
+
+    calculator = Calculator(undoDepth=undoDepth, undoBytes=undoBytes, useUndoTree=useUndoTree)
+    session = None
+    if sessionDirectory is not None:
+        from .session import Session
+
+        session = Session(sessionDirectory)
+        try:
+            session.attach(calculator)
+        except OSError as e:
+            print("The session can't be saved in {}: {}".format(sessionDirectory, e))
+            session = None
+    if statistics:
+        from .counters import Counters
+
+        calculator.counters = Counters()
+
+    interface = Interface(calculator)
+    loadMappings(interface)
+    interface.displayHelp()
+    if recordingFile is not None:
+        from .recording import Recorder
+
+        interface.recorder = Recorder(recordingFile, calculator)
+
+    palette = [('arrow', 'yellow', 'default'),
+               ('lineLabel', 'dark cyan', 'default'),
+               ('error', 'light red', 'default')]
+    # The input filter gets all keys that are waiting at once, so a paste is
+    # handled as a whole before the screen is drawn again
+    loop = urwid.MainLoop(interface.root, palette,
+                          input_filter=interface.filterInput,
+                          handle_mouse=False)
+    try:
+        loop.run()
+    finally:
+        if interface.recorder is not None:
+            interface.recorder.close()
+        if statisticsFile is not None:
+            calculator.counters.dump(statisticsFile)
+        if session is not None:
+            session.close()
+            if session.failure is not None:
+                print("The session could not be saved: {}".format(session.failure))
 
 
 def main():
+    if sys.argv[1:] == ['--version']:
+        # Answer before importing argparse, this should be instant
+        print("erpn {}\n{}".format(version, website))
+        return
+
+    from argparse import ArgumentParser
+
     parser = ArgumentParser(
         prog="erpn",
         description='An RPN calculator',
@@ -24,15 +95,93 @@ def main():
     parser.add_argument('--version', dest='version',
                         action='store_const', const=True,
                         help='show the version number and exit')
+    parser.add_argument('--eval', dest='eval',
+                        action='store_true',
+                        help='evaluate the lines of FILE (or stdin) without the interface, '
+                             'each line is a separate calculation')
+    parser.add_argument('--display', dest='display',
+                        choices=sorted(displayFormats), default='default',
+                        help='display format for --eval and --serve output')
+    parser.add_argument('--precision', dest='precision', type=int, default=3,
+                        help='digits after the decimal point for --eval and --serve output')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=1,
+                        help='number of processes for --eval, 0 uses all cores')
+    parser.add_argument('--serve', dest='serve', metavar='SOCKET',
+                        help='answer JSON-RPC requests on a Unix socket instead of starting the interface')
+    parser.add_argument('--max-sessions', dest='maxSessions', type=int, default=64,
+                        help='number of connections --serve handles at the same time')
+    parser.add_argument('--undo-depth', dest='undoDepth', type=int, default=100000,
+                        help='number of actions that can be undone in the interface')
+    parser.add_argument('--undo-memory', dest='undoMemory', type=float, default=64,
+                        help='megabytes the undo history of the interface can use, '
+                             'older actions are forgotten first')
+    parser.add_argument('--undo-tree', dest='undoTree', action='store_true',
+                        help='keep every state of the stack, so redo keeps working after a new '
+                             'action (ctrl b picks which one)')
+    parser.add_argument('--session', dest='session', metavar='DIRECTORY',
+                        help='where the stack and undo history of the interface are saved, so they '
+                             'are back after a restart (default: $XDG_STATE_HOME/erpn)')
+    parser.add_argument('--no-session', dest='noSession', action='store_true',
+                        help="don't save or restore the stack and undo history")
+    parser.add_argument('--stats', dest='stats', action='store_true',
+                        help='keep statistics about the speed of every key and function, ctrl t '
+                             'shows them')
+    parser.add_argument('--stats-file', dest='statsFile', metavar='FILE',
+                        help='keep statistics and save them in FILE as JSON when erpn quits')
+    parser.add_argument('--profile', dest='profile', metavar='LOG',
+                        help='record every key in LOG, with the time, so it can be replayed with '
+                             '--replay')
+    parser.add_argument('--replay', dest='replay', metavar='LOG',
+                        help='replay the keys recorded with --profile without the interface, and '
+                             'show how long it took and the state it ended in')
+    parser.add_argument('--pstats', dest='pstats', metavar='FILE',
+                        help='profile --replay with cProfile, and save the statistics in FILE')
+    parser.add_argument('--allocations', dest='allocations', type=int, default=0, metavar='N',
+                        help='show the N places where --replay allocated the most memory')
+    parser.add_argument('files', metavar='FILE', nargs='*',
+                        help='input files for --eval, use - for stdin')
     args = parser.parse_args()
     if args.version is True:
         print("erpn {}\n{}".format(version, website))
         return
 
-    palette = [('arrow', 'yellow', 'default'),
-               ('lineLabel', 'dark cyan', 'default'),
-               ('error', 'light red', 'default')]
-    loop = urwid.MainLoop(interface.root, palette,
-                          unhandled_input=interface.takeKey,
-                          handle_mouse=False)
-    loop.run()
+    if args.eval or args.serve is not None:
+        from . import stackFormat
+
+        className, options = displayFormats[args.display]
+        displayFormat = getattr(stackFormat, className)(args.precision, **options)
+
+    if args.serve is not None:
+        from . import server
+        server.serve(args.serve, args.maxSessions, displayFormat)
+        return
+
+    if args.replay is not None:
+        from .recording import replay
+
+        replay(args.replay, args.pstats, args.allocations)
+        return
+
+    if args.eval:
+        from . import headless
+
+        jobs = args.jobs
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        headless.run(args.files, displayFormat, jobs=jobs)
+        return
+
+    if len(args.files) > 0:
+        parser.error("FILE can only be used with --eval")
+    if args.undoDepth < 0:
+        parser.error("--undo-depth can't be negative")
+    if args.undoMemory <= 0:
+        parser.error("--undo-memory must be more than 0")
+
+    sessionDirectory = None
+    if not args.noSession:
+        from .session import defaultDirectory
+
+        sessionDirectory = args.session if args.session is not None else defaultDirectory()
+    runInterface(args.undoDepth, int(args.undoMemory * 2**20), args.undoTree, sessionDirectory,
+                 args.stats or args.statsFile is not None, args.statsFile, args.profile)
@@ -0,0 +1,81 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Searching the functions by their description, for the command palette.
+# The search is fuzzy: a function matches if its description contains most of
+# the short pieces (n-grams) of the query, so a typo still finds it.
+
+from collections import Counter, defaultdict
+from itertools import chain, groupby
+from operator import itemgetter
+
+
+def grams(text, size):
+    """ All pieces of size letters in text """
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class FunctionIndex:
+    """ All functions of a set of keybindings, indexed by the n-grams (pieces
+    of 1 to gramSize letters) of their description. A search only looks at
+    the functions that share a piece with the query, not at every function """
+    gramSize = 3
+    limit = 10  # Number of results to return
+
+    def __init__(self, keybindings):
+        """ keybindings is a dict like {'main': {...}, 'display': {...}}, like
+        Calculator.functions """
+        # Every function once, with all keys it is bound to
+        keys = {}
+        for category, bindings in keybindings.items():
+            for key, function in bindings.items():
+                keys.setdefault(function, []).append(key)
+
+        # entries are (description, keys, function). They are numbered from
+        # the shortest to the longest description, the order in which equally
+        # good matches are shown
+        entries = [(function.description, sorted(set(functionKeys)), function)
+                   for function, functionKeys in keys.items()]
+        self.entries = sorted(entries, key=lambda entry: (len(entry[0]), entry[0].lower(), entry[1]))
+        self.sortedEntries = sorted(entries, key=lambda entry: (entry[0].lower(), entry[1]))
+        self.descriptions = [entry[0].lower() for entry in self.entries]
+
+        # The numbers of the entries that contain a piece, in order
+        self.index = defaultdict(list)
+        for number, description in enumerate(self.descriptions):
+            pieces = set()
+            for size in range(1, self.gramSize + 1):
+                pieces |= grams(description, size)
+            for gram in pieces:
+                self.index[gram].append(number)
+
+    def search(self, query):
+        """ The entries that match query best, at most self.limit. The best
+        matches have the most pieces in common with query, and then the ones
+        that contain the whole query come first """
+        query = query.lower()
+        if query == "":
+            return self.sortedEntries[:self.limit]
+        if len(query) <= self.gramSize:
+            # The entries that contain the whole query are in the index, and
+            # no other entry can match better
+            numbers = self.index.get(query, [])
+            if len(numbers) >= self.limit:
+                return [self.entries[number] for number in numbers[:self.limit]]
+
+        # Short queries have few pieces of 3, so a single typo would leave
+        # nothing to match on. Use smaller pieces for those.
+        size = self.gramSize if len(query) > 5 else min(2, len(query))
+        queryGrams = grams(query, size)
+        scores = Counter(chain.from_iterable(self.index.get(gram, ()) for gram in queryGrams))
+
+        # Allow for some typos, but at least half of the query should match
+        needed = max(1, len(queryGrams) // 2)
+        results = []
+        for score, tier in groupby(scores.most_common(), key=itemgetter(1)):
+            if score < needed or len(results) >= self.limit:
+                break
+            tier = sorted((query not in self.descriptions[number], number) for number, score in tier)
+            results += [self.entries[number] for notExact, number in tier]
+        return results[:self.limit]
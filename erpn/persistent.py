@@ -0,0 +1,201 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# An immutable stack that shares its values with the stacks it was made from,
+# so every state of the calculator can be kept without copying the stack.
+
+from array import array
+from itertools import chain, islice
+
+from .stack import Stack
+from .vectors import isVector, valuesEqual
+
+
+def newChunk(values):
+    """ A chunk for values, an array of doubles unless there is a vector """
+    values = list(values)
+    if any(map(isVector, values)):
+        return values
+    return array('d', values)
+
+
+def commonLength(first, second):
+    """ The number of items at the bottom two PersistentStacks share. Values
+    are not compared, only the chunks they are kept in, so this is fast but
+    can be a few values less than the real number. Nodes that use the same
+    chunk have the same stack below them, so only the nodes above the first
+    chunk they share are visited """
+    while first is not None and second is not None and first.count > 0 and second.count > 0:
+        if first.chunk is second.chunk:
+            return first.length - first.count + min(first.count, second.count)
+        # The number of items below each node, going down the one that
+        # starts higher (or both) can't skip a chunk the other one uses
+        firstBelow = first.length - first.count
+        secondBelow = second.length - second.count
+        if firstBelow >= secondBelow:
+            first = first.below
+        if secondBelow >= firstBelow:
+            second = second.below
+    return 0
+
+
+class PersistentStack:
+    """ A stack that never changes: push, pushMany and drop return a new
+    stack. The new stack shares almost all of its values with the old one, so
+    both can be kept at little cost.
+
+    The stack is a linked list of nodes, the top of the stack first. Each node
+    has a chunk of values (an array of doubles, or a list if it holds vectors)
+    of which it uses the first count. A chunk is only ever appended to, by the
+    newest node that uses all of it, so the values the other nodes use never
+    change. Taking values off the stack makes a node that uses fewer values
+    of the same chunk.
+
+    Create an empty stack with PersistentStack(), or one with values with
+    PersistentStack(values) """
+    __slots__ = ('chunk', 'count', 'below', 'length')
+
+    chunkSize = 1024  # The most values in a chunk
+    copyLimit = 16  # Pushing on a node that uses part of a chunk copies at most this many values
+
+    def __init__(self, values=()):
+        self.chunk = None
+        self.count = 0
+        self.below = None
+        self.length = 0
+        stack = self.pushMany(values)
+        self.chunk, self.count, self.below, self.length = \
+            stack.chunk, stack.count, stack.below, stack.length
+
+    @classmethod
+    def node(cls, chunk, count, below):
+        """ A stack of the first count values of chunk, on top of below. below
+        is None or a stack that isn't empty """
+        stack = cls.__new__(cls)
+        stack.chunk = chunk
+        stack.count = count
+        stack.below = below
+        stack.length = count if below is None else count + below.length
+        return stack
+
+    @classmethod
+    def fromStack(cls, stack):
+        """ The values of a Stack, copied one block at a time """
+        result = cls()
+        for block in stack.blocks:
+            result = result.pushMany(block)
+        return result.pushMany(stack.tail)
+
+    def __len__(self):
+        return self.length
+
+    def ownsChunk(self):
+        """ Can values be appended to the chunk in place? """
+        return self.count == len(self.chunk) and self.count < self.chunkSize
+
+    def push(self, value):
+        """ The stack with value on top """
+        if self.count == 0:
+            return self.node(newChunk([value]), 1, None)
+        if self.ownsChunk() and (isinstance(self.chunk, list) or not isVector(value)):
+            self.chunk.append(value)
+            return self.node(self.chunk, self.count + 1, self.below)
+        if self.count <= self.copyLimit:
+            return self.node(newChunk(chain(self.chunk[:self.count], [value])), self.count + 1, self.below)
+        return self.node(newChunk([value]), 1, self)
+
+    def pushMany(self, values):
+        """ The stack with values on top, the last one on top """
+        if not isinstance(values, array):
+            values = list(values)
+        if len(values) == 0:
+            return self
+        stack = self
+        start = 0
+        if stack.count > 0 and stack.ownsChunk() and \
+                (isinstance(stack.chunk, list) or isinstance(values, array) or
+                 not any(map(isVector, values))):
+            # Fill up the chunk first
+            start = min(len(values), self.chunkSize - stack.count)
+            stack.chunk.extend(values[:start])
+            stack = self.node(stack.chunk, stack.count + start, stack.below)
+        elif 0 < stack.count <= self.copyLimit:
+            start = min(len(values), self.chunkSize - stack.count)
+            chunk = newChunk(chain(stack.chunk[:stack.count], values[:start]))
+            stack = self.node(chunk, len(chunk), stack.below)
+        for first in range(start, len(values), self.chunkSize):
+            part = values[first:first + self.chunkSize]
+            chunk = part if isinstance(part, array) else newChunk(part)
+            stack = self.node(chunk, len(chunk), stack if stack.count > 0 else None)
+        return stack
+
+    def drop(self, n):
+        """ The stack without the top n values """
+        if n > self.length or n < 0:
+            raise IndexError("drop of {} values from a stack of {}".format(n, self.length))
+        stack = self
+        while n > 0 and n >= stack.count:
+            n -= stack.count
+            stack = stack.below
+            if stack is None:
+                return PersistentStack()
+        if n == 0:
+            return stack
+        return self.node(stack.chunk, stack.count - n, stack.below)
+
+    def nodes(self):
+        """ The nodes of the stack, the top first """
+        stack = self
+        while stack is not None and stack.count > 0:
+            yield stack
+            stack = stack.below
+
+    def chunks(self):
+        """ The values of each node, the bottom of the stack first. A chunk
+        that is used completely is not copied, so don't change them """
+        for stack in reversed(list(self.nodes())):
+            if stack.count == len(stack.chunk):
+                yield stack.chunk
+            else:
+                yield stack.chunk[:stack.count]
+
+    def top(self, n):
+        """ The top n values as a list, the top last """
+        parts = []
+        needed = n
+        for stack in self.nodes():
+            if needed <= 0:
+                break
+            parts.append(stack.chunk[max(stack.count - needed, 0):stack.count])
+            needed -= stack.count
+        return [value for part in reversed(parts) for value in part]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError("stack index out of range")
+        for stack in self.nodes():
+            below = stack.length - stack.count
+            if index >= below:
+                return stack.chunk[index - below]
+
+    def __iter__(self):
+        for stack in reversed(list(self.nodes())):
+            yield from islice(stack.chunk, stack.count)
+
+    def __eq__(self, other):
+        if isinstance(other, (PersistentStack, Stack, list)):
+            return len(self) == len(other) and all(valuesEqual(x, y) for x, y in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return "PersistentStack({})".format(list(self))
+
+    def toStack(self):
+        """ A Stack with the same values, copied one chunk at a time """
+        stack = Stack()
+        for chunk in self.chunks():
+            stack.push_many(chunk)
+        return stack
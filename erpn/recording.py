@@ -0,0 +1,226 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Recording the keys of the interface, and replaying them without a terminal
+# to find out why something is slow.
+#
+# The log is a text file with one JSON value per line. The first line is an
+# object with the settings, the stack the recording started with and its undo
+# history, as the records of the session it was restored from. Then
+# every batch of keys the interface got is a list: the milliseconds since the
+# batch before, followed by the keys. A string is the text read from the
+# clipboard by the paste function, so a replay pastes the same. When the
+# recording is closed, the last line is an object with the digest of the
+# state it ended in.
+
+import base64
+import hashlib
+import json
+import time
+
+from . import functions
+from .buttonMappings import loadMappings
+from .calculator import Calculator
+from .persistent import PersistentStack
+from .session import encodeValues, decodeValues, restoreHistory
+from .undoTree import UndoTree
+
+formatVersion = 1
+
+
+def historySizes(calculator):
+    """ The number of actions that can be undone and redone """
+    history = calculator.undoTree if calculator.undoTree is not None else calculator.undostack
+    return len(history), len(calculator.redostack)
+
+
+def savedHistory(calculator):
+    """ The records of the session of calculator that are its undo and redo
+    history, or empty lists if there is no session, or its history can't be
+    made from them (like an undo tree) """
+    session = calculator.session
+    if session is None or calculator.undoTree is not None:
+        return [], []
+    undoSize = len(calculator.undostack)
+    if len(session.done) < undoSize or len(session.undone) != len(calculator.redostack):
+        return [], []
+    return list(session.done)[len(session.done) - undoSize:], list(session.undone)
+
+
+def stateDigest(calculator, errors, start=(0, 0)):
+    """ A hash of the stack, the size of the history and the errors that
+    were shown, two replays that end in the same state have the same digest.
+    History that isn't in the recording isn't replayed, so the size is counted
+    from start, the sizes of that history """
+    flags, data = encodeValues(list(calculator.stack))
+    digest = hashlib.sha256(data)
+    sizes = [size - startSize for size, startSize in zip(historySizes(calculator), start)]
+    digest.update(json.dumps([flags, sizes, errors]).encode())
+    return digest.hexdigest()
+
+
+class Recorder:
+    """ Writes the keys an Interface gets to a log. Set it as the recorder of
+    the interface """
+    def __init__(self, path, calculator):
+        self.calculator = calculator
+        self.errors = []
+        done, undone = savedHistory(calculator)
+        undoSize, redoSize = historySizes(calculator)
+        # The history that can't be recorded is only counted
+        self.start = (undoSize - len(done), redoSize - len(undone))
+        # Every batch is written at once, so it is saved if erpn is killed
+        self.log = open(path, 'w', buffering=1)
+        flags, data = encodeValues(list(calculator.stack))
+        self.write({'erpn': formatVersion,
+                    'undoDepth': calculator.undoDepth,
+                    'undoBytes': calculator.undoBytes,
+                    'undoTree': calculator.useUndoTree,
+                    'count': len(calculator.stack),
+                    'flags': flags,
+                    'stack': base64.b64encode(data).decode(),
+                    'done': [base64.b64encode(record).decode() for record in done],
+                    'undone': [base64.b64encode(record).decode() for record in undone],
+                    'undo': self.start[0],
+                    'redo': self.start[1]})
+        self.last = time.monotonic()
+        functions.readClipboard = self.readClipboard
+
+    def write(self, value):
+        self.log.write(json.dumps(value, separators=(',', ':')) + '\n')
+
+    def readClipboard(self):
+        text = functions.pyperclip.paste()
+        self.write(text)
+        return text
+
+    def add(self, keys):
+        """ Called by the interface after it handled keys """
+        now = time.monotonic()
+        self.write([round(1000 * (now - self.last))] + list(keys))
+        self.last = now
+        if self.calculator.error is not None:
+            self.errors.append(self.calculator.error)
+
+    def close(self):
+        functions.readClipboard = None
+        self.write({'digest': stateDigest(self.calculator, self.errors, self.start)})
+        self.log.close()
+
+
+class Replay:
+    """ Replays a log. Every key goes through Interface.takeKeys like when it
+    was recorded, except drawing the screen """
+    def __init__(self, path):
+        with open(path) as log:
+            lines = [json.loads(line) for line in log]
+        header = lines[0]
+        if not isinstance(header, dict) or header.get('erpn') != formatVersion:
+            raise ValueError("{} is not a recording of erpn".format(path))
+        self.header = header
+        self.events = lines[1:]
+        self.recordedDigest = None
+        if len(self.events) > 0 and isinstance(self.events[-1], dict):
+            self.recordedDigest = self.events.pop()['digest']
+        self.keyCount = sum(len(event) - 1 for event in self.events if isinstance(event, list))
+        self.clipboard = [event for event in self.events if isinstance(event, str)]
+        # The number of actions that could be undone and redone when the
+        # recording started, but aren't in it
+        self.unrecorded = (header.get('undo', 0), header.get('redo', 0))
+
+    def newInterface(self):
+        """ An interface in the state the recording started in """
+        from .urwidInterface import Interface
+
+        header = self.header
+        calculator = Calculator(undoDepth=header['undoDepth'], undoBytes=header['undoBytes'],
+                                useUndoTree=header['undoTree'])
+        values, _ = decodeValues(base64.b64decode(header['stack']), 0, header['count'], header['flags'])
+        calculator.stack.push_many(values)
+        restoreHistory(calculator, [base64.b64decode(record) for record in header.get('done', [])],
+                       [base64.b64decode(record) for record in header.get('undone', [])])
+        if calculator.undoTree is not None:
+            calculator.undoTree = UndoTree(PersistentStack.fromStack(calculator.stack))
+        interface = Interface(calculator)
+        loadMappings(interface)
+        return interface
+
+    def run(self, interface):
+        """ Give the keys to interface, returns the errors that were shown """
+        import urwid
+
+        errors = []
+        clipboard = iter(self.clipboard)
+        functions.readClipboard = lambda: next(clipboard, "")
+        try:
+            for event in self.events:
+                if not isinstance(event, list):
+                    continue
+                try:
+                    interface.takeKeys(event[1:])
+                except urwid.ExitMainLoop:
+                    break
+                finally:
+                    if interface.calculator.error is not None:
+                        errors.append(interface.calculator.error)
+        finally:
+            functions.readClipboard = None
+        return errors
+
+
+def replay(path, pstatsPath=None, allocations=0):
+    """ Replay the log at path and print how long it took and the state it
+    ended in. With pstatsPath the replay is profiled, and the statistics are
+    saved there. If allocations is more than 0, that many places where the
+    most memory was allocated are printed """
+    recording = Replay(path)
+    if recording.unrecorded != (0, 0):
+        print("The recording started with {} actions to undo and {} to redo that aren't in it, undoing or "
+              "redoing them doesn't work like it did".format(*recording.unrecorded))
+    interface = recording.newInterface()
+
+    profiler = None
+    if pstatsPath is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if allocations > 0:
+        import tracemalloc
+
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    errors = recording.run(interface)
+    if profiler is not None:
+        profiler.disable()
+    seconds = time.perf_counter() - start
+
+    if allocations > 0:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    calculator = interface.calculator
+    print("replayed {} keys in {:.3f} s".format(recording.keyCount, seconds))
+    print("stack: {} values, undo: {}, redo: {}, errors shown: {}".format(
+        len(calculator.stack), *historySizes(calculator), len(errors)))
+    digest = stateDigest(calculator, errors)
+    if recording.recordedDigest is None:
+        print("digest: {} (the recording wasn't closed)".format(digest))
+    elif digest == recording.recordedDigest:
+        print("digest: {} (the same as the recording)".format(digest))
+    else:
+        print("digest: {} (the recording ended with {})".format(digest, recording.recordedDigest))
+
+    if profiler is not None:
+        import pstats
+
+        profiler.dump_stats(pstatsPath)
+        print()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    if allocations > 0:
+        print("Most memory allocated:")
+        for statistic in snapshot.statistics('lineno')[:allocations]:
+            print(statistic)
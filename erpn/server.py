@@ -0,0 +1,239 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# A JSON-RPC 2.0 server on a Unix socket, so other programs can use a running
+# erpn instead of starting a new one for every calculation.
+#
+# Every message is one line of JSON, either a single request or a list of
+# requests (a batch). Every connection has its own calculator, which is kept
+# until the connection is closed. The methods are:
+#
+# eval   params: a list of tokens, or {"tokens": [...]}. The tokens are
+#        applied like in --eval mode. Returns the stack.
+# stack  Returns the stack.
+# reset  Clears the stack and the history. Returns the (empty) stack.
+#
+# The stack is returned as {"stack": [formatted values], "values": [numbers],
+# "error": null or the error message}. Vectors are returned as lists.
+
+import asyncio
+import errno
+import json
+import os
+import socket
+import stat
+
+from . import headless
+from .buttonMappings import loadMappings
+from .calculator import Calculator
+from .vectors import isVector
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+# Longest message (a single line) that is accepted from a client
+maxMessageSize = 1024 * 1024
+
+
+class InvalidParams(Exception):
+    pass
+
+
+def isStaleSocket(path):
+    """ Is there a socket at path that no server is listening on? """
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return False
+    except FileNotFoundError:
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except ConnectionRefusedError:
+            return True
+        except OSError as e:
+            return e.errno == errno.ECONNREFUSED
+    return False
+
+
+class Server:
+    """ Keeps the keybindings and the session limit shared by all connections """
+    def __init__(self, maxSessions=64, displayFormat=None):
+        calculator = Calculator(displayFormat=displayFormat)
+        loadMappings(calculator)
+        self.keybindings = calculator.functions
+        self.displayFormat = calculator.displayFormat
+        self.maxSessions = maxSessions
+        self.sessions = None
+        self.socketPath = None  # The socket this server made
+        self.socketFile = None  # The (device, inode) of that socket
+
+        self.methods = {'eval': self.methodEval,
+                        'stack': self.methodStack,
+                        'reset': self.methodReset}
+
+    async def start(self, path):
+        """ Start listening on the socket at path, returns the asyncio server """
+        # Only allow this many connections to have a session at the same time.
+        # Other connections wait until a session is closed.
+        self.sessions = asyncio.Semaphore(self.maxSessions)
+
+        if isStaleSocket(path):
+            # left over from an earlier server
+            os.remove(path)
+        # Bind the socket ourselves, asyncio would remove any socket that is
+        # in the way, also one a running server uses. Anything else at path
+        # gives an OSError
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(path)
+        except OSError:
+            listener.close()
+            raise
+        fileStatus = os.stat(path)
+        self.socketPath = path
+        self.socketFile = (fileStatus.st_dev, fileStatus.st_ino)
+        return await asyncio.start_unix_server(self.handleConnection, sock=listener,
+                                               limit=maxMessageSize)
+
+    def removeSocket(self):
+        """ Remove the socket made by start(), if it is still there """
+        if self.socketPath is None:
+            return
+        try:
+            fileStatus = os.stat(self.socketPath)
+        except FileNotFoundError:
+            return
+        if (fileStatus.st_dev, fileStatus.st_ino) == self.socketFile:
+            os.remove(self.socketPath)
+        self.socketPath = None
+
+    async def handleConnection(self, reader, writer):
+        """ Answer the messages from one client, one at a time """
+        try:
+            async with self.sessions:
+                calculator = Calculator(self.keybindings, self.displayFormat)
+                while True:
+                    try:
+                        line = await reader.readline()
+                    except ValueError:
+                        # The message is longer than maxMessageSize, we can't
+                        # find the start of the next one so give up
+                        writer.write(self.encode(self.errorResponse(None, INVALID_REQUEST,
+                                                                    "Message too long")))
+                        break
+                    if len(line) == 0:
+                        break
+                    if line.strip() == b"":
+                        continue
+
+                    response = self.handleMessage(calculator, line)
+                    if response is not None:
+                        writer.write(self.encode(response))
+                        # Don't read the next message before the client has
+                        # read enough of the answers
+                        await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def encode(self, response):
+        return json.dumps(response).encode() + b"\n"
+
+    def handleMessage(self, calculator, line):
+        """ Handle one line, return the response or None if nothing should be
+        sent back """
+        try:
+            message = json.loads(line.decode())
+        except ValueError:
+            return self.errorResponse(None, PARSE_ERROR, "Parse error")
+
+        if isinstance(message, list):
+            if len(message) == 0:
+                return self.errorResponse(None, INVALID_REQUEST, "Empty batch")
+            responses = [self.handleRequest(calculator, request) for request in message]
+            responses = [response for response in responses if response is not None]
+            if len(responses) == 0:
+                return None
+            return responses
+
+        return self.handleRequest(calculator, message)
+
+    def handleRequest(self, calculator, request):
+        """ Handle a single request. Returns None for notifications (requests
+        without an id) """
+        if (not isinstance(request, dict) or
+                request.get('jsonrpc') != "2.0" or
+                not isinstance(request.get('method'), str)):
+            return self.errorResponse(None, INVALID_REQUEST, "Invalid Request")
+
+        requestId = request.get('id')
+        method = self.methods.get(request['method'])
+        if method is None:
+            response = self.errorResponse(requestId, METHOD_NOT_FOUND, "Method not found")
+        else:
+            try:
+                result = method(calculator, request.get('params'))
+            except InvalidParams as e:
+                response = self.errorResponse(requestId, INVALID_PARAMS, str(e))
+            else:
+                response = {'jsonrpc': "2.0", 'result': result, 'id': requestId}
+
+        if 'id' not in request:
+            return None
+        return response
+
+    def errorResponse(self, requestId, code, message):
+        return {'jsonrpc': "2.0",
+                'error': {'code': code, 'message': message},
+                'id': requestId}
+
+    def methodEval(self, calculator, params):
+        if isinstance(params, dict):
+            params = params.get('tokens')
+        if (not isinstance(params, list) or
+                not all(isinstance(token, str) and token != "" for token in params)):
+            raise InvalidParams("eval needs a list of tokens")
+
+        error = None
+        try:
+            headless.applyTokens(calculator, params)
+        except headless.RecordError as e:
+            error = str(e)
+        return self.stackResult(calculator, error)
+
+    def methodStack(self, calculator, params):
+        return self.stackResult(calculator, None)
+
+    def methodReset(self, calculator, params):
+        calculator.reset()
+        return self.stackResult(calculator, None)
+
+    def stackResult(self, calculator, error):
+        displayFormat = calculator.displayFormat
+        return {'stack': displayFormat.display_many(calculator.stack),
+                'values': [value.tolist() if isVector(value) else value
+                           for value in calculator.stack],
+                'error': error}
+
+
+def serve(path, maxSessions=64, displayFormat=None):
+    """ Run the server until it is interrupted """
+    server = Server(maxSessions, displayFormat)
+
+    async def run():
+        unixServer = await server.start(path)
+        async with unixServer:
+            await unixServer.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.removeSocket()
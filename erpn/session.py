@@ -0,0 +1,482 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Saving the stack and undo history of the interface, so they survive a crash.
+#
+# Every change to the stack is appended to a log file. A change is saved as
+# the items it took off the top of the stack and the items it put there, so
+# it can be undone after a restart too. Now and then the whole stack and
+# history are written to a snapshot file, and the log starts again. Writing
+# happens in a separate thread, so the interface doesn't wait for the disk.
+#
+# Both files are binary: a header, then the values as doubles. The stack in a
+# snapshot can be read with mmap without decoding anything. Each record in the
+# log ends with a checksum, so a record that was only half written when erpn
+# was killed is ignored.
+
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import zlib
+from array import array
+from collections import deque
+from itertools import chain
+
+from .functions import AddItem, ReplaceTop, UndoItem
+from .persistent import PersistentStack, commonLength
+from .undoTree import UndoTree, changedItems, changedRegion
+from .vectors import asVector, isVector
+
+try:
+    import fcntl
+except ImportError:  # On Windows, the session is not locked there
+    fcntl = None
+
+defaultSnapshotBytes = 8 * 2**20  # Size of the log after which a snapshot is made
+
+# The kinds of records
+ACTION = 0  # A change made by an action
+UNDO = 1  # A change made by undo
+REDO = 2  # A change made by redo
+STATE = 3  # A change to another state of the undo tree, the history is lost
+
+# Flags of a record
+VECTORS = 1  # The values are preceded by their lengths, -1 for a number
+
+logMagic = b'erpnlog\0'
+snapshotMagic = b'erpnsnap'
+version = 1
+logHeader = struct.Struct('<8sIQ')  # magic, version, generation
+snapshotHeader = struct.Struct('<8sIQBQQQ')  # magic, version, generation, flags, stack, history and redo items
+recordHeader = struct.Struct('<BBII')  # kind, flags, number of removed and added items
+checksum = struct.Struct('<I')
+
+
+def defaultDirectory():
+    """ Where the session is saved if no directory is given """
+    stateHome = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(stateHome, 'erpn')
+
+
+def sameValue(x, y):
+    """ Are x and y the same item? -0.0 is not the same as 0.0 here, since
+    the stack should come back exactly """
+    if isVector(x) or isVector(y):
+        return x is y
+    return x == y and math.copysign(1.0, x) == math.copysign(1.0, y)
+
+
+def encodeValues(values):
+    """ The flags and bytes for values, which can contain vectors """
+    if not any(map(isVector, values)):
+        return 0, array('d', values).tobytes()
+    lengths = array('i', [len(value) if isVector(value) else -1 for value in values])
+    numbers = array('d')
+    for value in values:
+        if isVector(value):
+            numbers.extend(value.tolist())
+        else:
+            numbers.append(value)
+    return VECTORS, lengths.tobytes() + numbers.tobytes()
+
+
+def decodeValues(buffer, offset, count, flags):
+    """ Read count values from buffer at offset. Returns the values (an array
+    of doubles if there are no vectors) and the offset after them """
+    if not flags & VECTORS:
+        values = array('d')
+        values.frombytes(buffer[offset:offset + 8 * count])
+        return values, offset + 8 * count
+    lengths = array('i')
+    lengths.frombytes(buffer[offset:offset + 4 * count])
+    offset += 4 * count
+    size = sum(max(length, 1) for length in lengths)
+    numbers = array('d')
+    numbers.frombytes(buffer[offset:offset + 8 * size])
+    values = []
+    position = 0
+    for length in lengths:
+        if length < 0:
+            values.append(numbers[position])
+            position += 1
+        else:
+            values.append(asVector(numbers[position:position + length]))
+            position += length
+    return values, offset + 8 * size
+
+
+def encodeRecord(kind, removed, added):
+    """ A record of a change that took removed off the top of the stack and
+    put added there """
+    flags, data = encodeValues(list(chain(removed, added)))
+    record = recordHeader.pack(kind, flags, len(removed), len(added)) + data
+    return record + checksum.pack(zlib.crc32(record))
+
+
+def decodeRecord(buffer, offset):
+    """ Read a record from buffer at offset. Returns (kind, removed, added,
+    offset after it), or None if there is no complete record """
+    if offset + recordHeader.size > len(buffer):
+        return None
+    kind, flags, removedCount, addedCount = recordHeader.unpack_from(buffer, offset)
+    start = offset + recordHeader.size
+    if flags & VECTORS:
+        try:
+            values, end = decodeValues(buffer, start, removedCount + addedCount, flags)
+        except (ValueError, IndexError):
+            return None
+        if len(values) != removedCount + addedCount:
+            return None
+    else:
+        end = start + 8 * (removedCount + addedCount)
+        values = None
+    if end + checksum.size > len(buffer):
+        return None
+    if checksum.unpack_from(buffer, end)[0] != zlib.crc32(buffer[offset:end]):
+        return None
+    if values is None:
+        values = array('d')
+        values.frombytes(buffer[start:end])
+    return kind, values[:removedCount], values[removedCount:], end + checksum.size
+
+
+def redoFunction(removed, added):
+    """ The function that redoes a change from a record. A push is stored
+    more compactly in the undo history as an AddItem """
+    if len(removed) == 0 and len(added) == 1:
+        return AddItem(added[0])
+    return ReplaceTop(len(removed), added)
+
+
+def restoreHistory(calculator, done, undone):
+    """ Make the undo and redo history of calculator the changes in the
+    records done and undone """
+    calculator.undostack.clear()
+    for record in done:
+        kind, removed, added, end = decodeRecord(record, 0)
+        calculator.undostack.append(UndoItem(len(added), list(removed), redoFunction(removed, added)))
+    calculator.redostack = [redoFunction(removed, added) for kind, removed, added, end in
+                            (decodeRecord(record, 0) for record in undone)]
+
+
+def changedPart(before, after):
+    """ The items to take off and put on to go from the list before to the
+    list after, without the part they start with """
+    common = 0
+    for x, y in zip(before, after):
+        if not sameValue(x, y):
+            break
+        common += 1
+    return before[common:], after[common:]
+
+
+def track(kind, record, done, undone):
+    """ Keep the records in done (a deque) and undone (a list) like the undo
+    and redo history of the calculator """
+    if kind == ACTION:
+        done.append(record)
+        undone.clear()
+    elif kind == UNDO:
+        if len(done) > 0:
+            undone.append(done.pop())
+    elif kind == REDO:
+        if len(undone) > 0:
+            done.append(undone.pop())
+    else:
+        done.clear()
+        undone.clear()
+
+
+def fsyncDirectory(directory):
+    """ Make sure a rename in directory is on the disk, where that's possible """
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class Writer(threading.Thread):
+    """ Writes the log and snapshots. Everything the interface wants written
+    is put in a queue, and written (and fsynced) in batches """
+    def __init__(self, session, logFile):
+        super().__init__(name="erpn session writer", daemon=True)
+        self.session = session
+        self.logFile = logFile
+        self.queue = queue.SimpleQueue()
+        self.failure = None  # The OSError that stopped the writing, if any
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, bytes):
+                    records.append(item)
+                else:
+                    self.write(records)
+                    records = []
+                    self.writeSnapshot(*item)
+            self.write(records)
+        self.logFile.close()
+
+    def write(self, records):
+        if len(records) == 0 or self.failure is not None:
+            return
+        try:
+            self.logFile.write(b''.join(records))
+            self.logFile.flush()
+            os.fsync(self.logFile.fileno())
+        except OSError as e:
+            self.failure = e
+
+    def writeSnapshot(self, generation, blocks, done, undone):
+        """ Write the stack (a list of arrays or lists) and the records of
+        the history to a new snapshot, and start a new log """
+        if self.failure is not None:
+            return
+        session = self.session
+        values = list(chain.from_iterable(blocks)) if any(isinstance(block, list) for block in blocks) else None
+        try:
+            with open(session.snapshotPath + '.tmp', 'wb') as snapshot:
+                if values is None:
+                    flags = 0
+                    count = sum(len(block) for block in blocks)
+                else:
+                    flags, data = encodeValues(values)
+                    count = len(values)
+                snapshot.write(snapshotHeader.pack(snapshotMagic, version, generation, flags,
+                                                   count, len(done), len(undone)))
+                if values is None:
+                    for block in blocks:
+                        snapshot.write(block.tobytes())
+                else:
+                    snapshot.write(data)
+                snapshot.write(b''.join(chain(done, undone)))
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(session.snapshotPath + '.tmp', session.snapshotPath)
+            fsyncDirectory(session.directory)
+            self.logFile.close()
+            self.logFile = open(session.logPath, 'wb')
+            self.logFile.write(logHeader.pack(logMagic, version, generation))
+            self.logFile.flush()
+            os.fsync(self.logFile.fileno())
+        except OSError as e:
+            self.failure = e
+
+
+class Session:
+    """ Saves what happens to a calculator in a directory, and brings it back
+    when erpn is started again. Use attach() to restore a calculator and start
+    saving, and close() when done """
+    def __init__(self, directory=None, snapshotBytes=defaultSnapshotBytes):
+        if directory is None:
+            directory = defaultDirectory()
+        self.directory = directory
+        self.snapshotPath = os.path.join(directory, 'snapshot')
+        self.logPath = os.path.join(directory, 'log')
+        self.snapshotBytes = snapshotBytes
+        self.calculator = None
+        self.writer = None
+        self.lock = None
+
+    @property
+    def failure(self):
+        """ The error that stopped the session from being saved, or None """
+        return None if self.writer is None else self.writer.failure
+
+    def attach(self, calculator):
+        """ Make the stack and history of calculator those of the saved
+        session (if there is one), and save everything that happens to it
+        from now on """
+        os.makedirs(self.directory, exist_ok=True)
+        # Only one erpn can use the directory, raises BlockingIOError (an
+        # OSError) if another one does
+        self.lock = open(os.path.join(self.directory, 'lock'), 'wb')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.lock.close()
+                raise
+        self.calculator = calculator
+        self.done = deque(maxlen=calculator.undoDepth)
+        self.undone = []
+        self.generation = 0
+        stack = calculator.stack
+        stack.clear()
+        self.readSnapshot(stack)
+        logEnd = self.readLog(stack)
+
+        restoreHistory(calculator, self.done, self.undone)
+        if calculator.undoTree is not None:
+            calculator.undoTree = UndoTree(PersistentStack.fromStack(stack))
+        calculator.session = self
+
+        if logEnd is None:
+            logFile = open(self.logPath, 'wb')
+            logFile.write(logHeader.pack(logMagic, version, self.generation))
+            logEnd = logHeader.size
+        else:
+            logFile = open(self.logPath, 'r+b')
+            logFile.truncate(logEnd)  # Remove a record that was half written
+            logFile.seek(logEnd)
+        self.logBytes = logEnd
+        self.writer = Writer(self, logFile)
+        self.writer.start()
+
+    def readSnapshot(self, stack):
+        """ Put the values of the snapshot on stack, and keep its history """
+        try:
+            snapshot = open(self.snapshotPath, 'rb')
+        except FileNotFoundError:
+            return
+        with snapshot:
+            if os.fstat(snapshot.fileno()).st_size < snapshotHeader.size:
+                return
+            with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                magic, fileVersion, generation, flags, count, doneCount, undoneCount = \
+                    snapshotHeader.unpack_from(buffer)
+                if magic != snapshotMagic or fileVersion != version:
+                    return
+                self.generation = generation
+                offset = snapshotHeader.size
+                if flags & VECTORS:
+                    values, offset = decodeValues(buffer, offset, count, flags)
+                    stack.push_many(values)
+                else:
+                    # Copied straight from the file, without a float per value
+                    with memoryview(buffer) as view:
+                        values = view[offset:offset + 8 * count].cast('d')
+                        stack.push_many(values)
+                        values.release()
+                    offset += 8 * count
+                for number in range(doneCount + undoneCount):
+                    kind, removed, added, end = decodeRecord(buffer, offset)
+                    record = bytes(buffer[offset:end])
+                    (self.done if number < doneCount else self.undone).append(record)
+                    offset = end
+
+    def readLog(self, stack):
+        """ Apply the changes in the log to stack. Returns the position after
+        the last complete record, or None if the log can't be used """
+        try:
+            log = open(self.logPath, 'rb')
+        except FileNotFoundError:
+            return None
+        with log:
+            size = os.fstat(log.fileno()).st_size
+            if size < logHeader.size:
+                return None
+            with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                magic, fileVersion, generation = logHeader.unpack_from(buffer)
+                if magic != logMagic or fileVersion != version or generation != self.generation:
+                    # Left over from before the last snapshot
+                    return None
+                offset = logHeader.size
+                while True:
+                    record = decodeRecord(buffer, offset)
+                    if record is None:
+                        return offset
+                    kind, removed, added, end = record
+                    if len(removed) > len(stack):
+                        return offset
+                    if len(removed) > 0:
+                        stack.pop_many(len(removed))
+                    if len(added) == 1:
+                        stack.append(added[0])
+                    else:
+                        stack.push_many(added)
+                    track(kind, bytes(buffer[offset:end]), self.done, self.undone)
+                    offset = end
+
+    def log(self, kind, before, after):
+        """ Save the change from the top items before to after """
+        removed, added = changedPart(before, after)
+        record = encodeRecord(kind, removed, added)
+        track(kind, record, self.done, self.undone)
+        if self.failure is not None:
+            return
+        self.writer.queue.put(record)
+        self.logBytes += len(record)
+
+    def checkLogSize(self):
+        """ Start a new log after a snapshot if the log is getting large. This
+        is only done after all records of an action, a snapshot in between
+        would already contain the changes of the records after it """
+        if self.failure is None and self.logBytes > self.snapshotBytes:
+            self.snapshot()
+
+    def logSteps(self, steps, stack, redo=False):
+        """ Save the changes made by the undo items steps, stack is the stack
+        after them. Each step is saved separately, so they can be undone one
+        at a time like in the calculator """
+        region = changedRegion(steps)
+        changed = len(stack) if region is None else region[1]
+        # The top of the stack after each step, found by undoing them on a copy
+        tops = [stack[len(stack) - changed:]]
+        for step in reversed(steps):
+            top = list(tops[-1])
+            step.apply(top)
+            tops.append(top)
+        tops.reverse()
+        for before, after in zip(tops, tops[1:]):
+            self.log(REDO if redo else ACTION, before, after)
+        self.checkLogSize()
+
+    def applyUndo(self, item, stack):
+        """ Apply an undo item to stack, and save what it changed """
+        items = changedItems(item)
+        if items is None:
+            taken, added = len(stack), len(stack)
+        else:
+            taken, added = items
+        before = stack[len(stack) - added:]
+        item.apply(stack)
+        after = stack[len(stack) - taken:] if items is not None else stack[:]
+        self.log(UNDO, before, after)
+        self.checkLogSize()
+
+    def logState(self, old, new):
+        """ Save a move in the undo tree, from the PersistentStack old to new """
+        common = commonLength(old, new)
+        self.log(STATE, old.top(len(old) - common), new.top(len(new) - common))
+        self.checkLogSize()
+
+    def snapshot(self):
+        """ Write the whole stack and history, so the log can start again.
+        The blocks of the stack are copied here, because the calculator keeps
+        changing them while the writer saves the copy. Copying is a memcpy of
+        8 bytes per value (about 1 ms for 10^6 values), which is accepted to
+        keep the writer from sharing anything with the calculator """
+        stack = self.calculator.stack
+        blocks = [block[:] for block in chain(stack.blocks, [stack.tail])]
+        self.generation += 1
+        self.writer.queue.put((self.generation, blocks, list(self.done), list(self.undone)))
+        self.logBytes = logHeader.size
+
+    def close(self):
+        """ Write everything that is still waiting, and stop """
+        if self.writer is not None:
+            self.writer.queue.put(None)
+            self.writer.join()
+            self.calculator.session = None
+            self.lock.close()
@@ -0,0 +1,388 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+from array import array
+from itertools import chain, islice
+
+from .vectors import numpy, isVector, hasVector, valuesEqual
+
+
+def toList(block):
+    if isinstance(block, array):
+        return block.tolist()
+    return list(block)
+
+
+def packBlock(block):
+    """ Store a block as an array of doubles if it doesn't contain vectors """
+    if isinstance(block, list) and not hasVector(block):
+        return array('d', block)
+    return block
+
+
+class Stack:
+    """ The stack of values, stored in arrays of doubles instead of a list of
+    float objects. It supports the list operations the RPN functions use, so
+    it can be used wherever they expect a list. Reading a slice gives a list,
+    so function arguments and undo items stay plain lists.
+
+    The values are split in blocks of about blockSize values. Everything
+    happens at the top of the stack most of the time, so the top values are
+    kept in a separate block (the tail) that can be used like a normal array.
+    The lengths of the other blocks are kept in a Fenwick tree, so finding,
+    inserting or removing a value deep in the stack takes O(log n) steps plus
+    moving at most a block of values, instead of moving everything above it.
+
+    Stack items can also be vectors (numpy arrays). A block that holds a
+    vector is a list instead of an array """
+    __slots__ = ('blocks', 'tree', 'bodyLength', 'tail')
+
+    blockSize = 1024
+
+    def __init__(self, values=()):
+        self.blocks = []  # Full blocks, the bottom of the stack first
+        self.tree = [0]  # Fenwick tree of the block lengths, tree[0] is unused
+        self.bodyLength = 0  # The number of values in self.blocks
+        self.tail = array('d')  # The top of the stack
+        self.push_many(values)
+
+    # Fenwick tree helpers, block k (counting from 0) is tree index k+1
+
+    def treePrefix(self, count):
+        """ The number of values in the first count blocks """
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count &= count - 1
+        return total
+
+    def treeAdd(self, block, delta):
+        i = block + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def rebuildTree(self):
+        """ Rebuild the tree after a block was added or removed in the middle """
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def appendBlock(self, block):
+        """ Add a block on top of self.blocks """
+        self.blocks.append(block)
+        i = len(self.blocks)
+        self.tree.append(len(block) + self.treePrefix(i - 1) - self.treePrefix(i - (i & -i)))
+        self.bodyLength += len(block)
+
+    def popBlock(self):
+        """ Remove the top block from self.blocks and return it """
+        block = self.blocks.pop()
+        del self.tree[-1]
+        self.bodyLength -= len(block)
+        return block
+
+    def locate(self, index):
+        """ Find a value, index counts from the bottom and should be valid.
+        Returns (block, position in block), block is None for the tail """
+        if index >= self.bodyLength:
+            return None, index - self.bodyLength
+        position = 0
+        step = 1 << (len(self.tree).bit_length() - 1)
+        while step > 0:
+            if position + step < len(self.tree) and self.tree[position + step] <= index:
+                position += step
+                index -= self.tree[position]
+            step >>= 1
+        return position, index
+
+    def normalize(self, index):
+        """ Turn a (possibly negative) index into an index from the bottom """
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError("stack index out of range")
+        return index
+
+    def splitTail(self):
+        """ Move all but the last part of a large tail to full blocks """
+        tail = self.tail
+        cut = len(tail) - len(tail) % self.blockSize
+        if cut == len(tail):
+            cut -= self.blockSize
+        for start in range(0, cut, self.blockSize):
+            self.appendBlock(packBlock(tail[start:start + self.blockSize]))
+        self.tail = packBlock(tail[cut:])
+
+    def splitBlock(self, block):
+        """ Split a block that has grown too large in two """
+        values = self.blocks[block]
+        half = len(values) // 2
+        self.blocks[block:block + 1] = [values[:half], values[half:]]
+        self.rebuildTree()
+
+    def makeObjectBlock(self, block):
+        """ Turn a block (None for the tail) into a list, so it can hold vectors """
+        if block is None:
+            if isinstance(self.tail, array):
+                self.tail = self.tail.tolist()
+        elif isinstance(self.blocks[block], array):
+            self.blocks[block] = self.blocks[block].tolist()
+
+    # List operations
+
+    def __len__(self):
+        return self.bodyLength + len(self.tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.tolist()[index]
+            if start >= stop:
+                return []
+            if start >= self.bodyLength:
+                return toList(self.tail[start - self.bodyLength:stop - self.bodyLength])
+            return list(islice(self.iterFrom(start), stop - start))
+        block, position = self.locate(self.normalize(index))
+        if block is None:
+            return self.tail[position]
+        return self.blocks[block][position]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            values = self.tolist()
+            values[index] = value
+            self.clear()
+            self.push_many(values)
+            return
+        block, position = self.locate(self.normalize(index))
+        if isVector(value):
+            self.makeObjectBlock(block)
+        if block is None:
+            self.tail[position] = value
+        else:
+            self.blocks[block][position] = value
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and stop == len(self):
+                # The usual case, removing the top of the stack
+                self.pop_many(max(stop - start, 0))
+            else:
+                values = self.tolist()
+                del values[index]
+                self.clear()
+                self.push_many(values)
+            return
+        self.pop(index)
+
+    def iterFrom(self, start):
+        """ Iterate over the values from index start (counting from the bottom) """
+        block, position = self.locate(start)
+        if block is None:
+            return iter(self.tail[position:])
+        return chain(islice(self.blocks[block], position, None),
+                     chain.from_iterable(self.blocks[block + 1:]),
+                     self.tail)
+
+    def __iter__(self):
+        return chain(chain.from_iterable(self.blocks), self.tail)
+
+    def __reversed__(self):
+        return chain(reversed(self.tail),
+                     chain.from_iterable(reversed(block) for block in reversed(self.blocks)))
+
+    def __eq__(self, other):
+        if isinstance(other, (Stack, list)):
+            return len(self) == len(other) and all(valuesEqual(x, y) for x, y in zip(self, other))
+        return NotImplemented
+
+    def __add__(self, other):
+        """ Like list + list, so the result is a list """
+        return self.tolist() + list(other)
+
+    def __repr__(self):
+        return "Stack({})".format(self.tolist())
+
+    def append(self, value):
+        if isVector(value):
+            self.makeObjectBlock(None)
+        self.tail.append(value)
+        if len(self.tail) >= 2 * self.blockSize:
+            self.splitTail()
+
+    def extend(self, values):
+        self.push_many(values)
+
+    def insert(self, index, value):
+        """ Insert like list.insert, value will be at index """
+        length = len(self)
+        if index < 0:
+            index = max(index + length, 0)
+        index = min(index, length)
+        if len(self.tail) >= 2 * self.blockSize:
+            # The tail grew large, for example by view()
+            self.splitTail()
+
+        if index >= self.bodyLength:
+            if isVector(value):
+                self.makeObjectBlock(None)
+            self.tail.insert(index - self.bodyLength, value)
+            if len(self.tail) >= 2 * self.blockSize:
+                self.splitTail()
+            return
+
+        block, position = self.locate(index)
+        if isVector(value):
+            self.makeObjectBlock(block)
+        self.blocks[block].insert(position, value)
+        self.bodyLength += 1
+        if len(self.blocks[block]) >= 2 * self.blockSize:
+            self.splitBlock(block)
+        else:
+            self.treeAdd(block, 1)
+
+    def pop(self, index=-1):
+        if len(self) == 0:
+            raise IndexError("pop from empty stack")
+        if len(self.tail) >= 2 * self.blockSize:
+            self.splitTail()
+        block, position = self.locate(self.normalize(index))
+        if block is None:
+            value = self.tail.pop(position)
+            if len(self.tail) == 0 and len(self.blocks) > 0:
+                # Keep the top of the stack in the tail
+                self.tail = self.popBlock()
+            return value
+
+        value = self.blocks[block].pop(position)
+        self.bodyLength -= 1
+        if len(self.blocks[block]) == 0:
+            del self.blocks[block]
+            self.rebuildTree()
+        else:
+            self.treeAdd(block, -1)
+        return value
+
+    def clear(self):
+        self.blocks = []
+        self.tree = [0]
+        self.bodyLength = 0
+        self.tail = array('d')
+
+    def copy(self):
+        return Stack(self)
+
+    def tolist(self):
+        return list(self)
+
+    def toarray(self):
+        """ A copy of all values as a numpy array, without making a float
+        object per value. Raises TypeError if there are vectors on the stack """
+        parts = []
+        for block in chain(self.blocks, [self.tail]):
+            block = packBlock(block)
+            if not isinstance(block, array):
+                raise TypeError("Can't make an array of vectors")
+            parts.append(numpy.frombuffer(block, dtype=float))
+        return numpy.concatenate(parts)
+
+    def push_many(self, values):
+        """ Add all values to the top of the stack. Arrays of doubles (an
+        array('d'), a numpy float64 array, a view of a Stack) are copied in
+        one go, without making a float object per value. A numpy array is
+        pushed as separate numbers, not as a vector """
+        if isinstance(values, Stack):
+            for block in values.blocks:
+                self.push_many(block)
+            values = values.tail
+        try:
+            buffer = memoryview(values)
+        except TypeError:
+            values = list(values)
+            if hasVector(values):
+                self.makeObjectBlock(None)
+                self.tail.extend(value if isVector(value) else float(value) for value in values)
+            else:
+                self.tail.extend(float(value) for value in values)
+        else:
+            if not isinstance(self.tail, array):
+                self.tail.extend(float(value) for value in buffer.tolist())
+            elif buffer.format == 'd' and buffer.ndim == 1 and buffer.c_contiguous:
+                self.tail.frombytes(buffer.cast('B'))
+            else:
+                self.tail.extend(float(value) for value in buffer.tolist())
+        if len(self.tail) >= 2 * self.blockSize:
+            self.splitTail()
+
+    def pop_many(self, n):
+        """ Remove the top n values, returned as an array('d') with the top of
+        the stack last (a list if one of them is a vector) """
+        if n > len(self) or n < 0:
+            raise IndexError("pop_many of {} values from a stack of {}".format(n, len(self)))
+        parts = []
+        while n > len(self.tail):
+            n -= len(self.tail)
+            parts.append(self.tail)
+            self.tail = self.popBlock()
+        if n > 0:
+            parts.append(self.tail[-n:])
+            del self.tail[-n:]
+            if len(self.tail) == 0 and len(self.blocks) > 0:
+                self.tail = self.popBlock()
+        if all(isinstance(part, array) for part in parts):
+            removed = array('d')
+        else:
+            removed = []
+        for part in reversed(parts):
+            removed.extend(part)
+        return packBlock(removed)
+
+    def view(self, n=None):
+        """ A read-only memoryview of the top n values (all values if n is
+        None), without copying them. If the values are spread over more than
+        one block they are joined first.
+        The stack can't grow or shrink while a view exists (that raises a
+        BufferError), so release it when done, for example by using it in a
+        with statement.
+        Raises TypeError if there are vectors in the top n values """
+        if n is None:
+            n = len(self)
+        if n > len(self) or n < 0:
+            raise IndexError("view of {} values on a stack of {}".format(n, len(self)))
+        if n == 0:
+            return memoryview(array('d')).toreadonly()
+        # Find the blocks we need, they should all be arrays
+        self.tail = packBlock(self.tail)
+        if not isinstance(self.tail, array):
+            last = max(i for i, value in enumerate(self.tail) if isVector(value))
+            if n > len(self.tail) - last - 1:
+                raise TypeError("Can't make a view of vectors")
+            # Only the values above the last vector are needed, move the rest
+            # to a block of its own
+            self.appendBlock(self.tail[:last + 1])
+            self.tail = array('d', self.tail[last + 1:])
+        length = len(self.tail)
+        count = 0
+        while length < n:
+            count += 1
+            self.blocks[-count] = packBlock(self.blocks[-count])
+            if not isinstance(self.blocks[-count], array):
+                raise TypeError("Can't make a view of vectors")
+            length += len(self.blocks[-count])
+        if n > len(self.tail):
+            parts = [self.popBlock() for _ in range(count)]
+            tail = array('d')
+            for part in reversed(parts):
+                tail.extend(part)
+            tail.extend(self.tail)
+            self.tail = tail
+        buffer = memoryview(self.tail).toreadonly()
+        return buffer[len(self.tail) - n:]
@@ -2,7 +2,67 @@
 # Copyright (C) 2017 Bart de Waal
 # This program is licenced under the GPLv3, see Licence file for details
 
-from math import log10, floor, isclose
+from functools import lru_cache
+from math import log10, floor, isclose, copysign
+
+from .stack import Stack
+from .vectors import isVector, numpy
+
+# The number of formatted values to remember. The interface formats every
+# visible value after each key, but most of them haven't changed.
+cacheSize = 4096
+
+
+@lru_cache(maxsize=cacheSize)
+def cachedDisplay(formatterClass, digits_after_decimal, exponent_grouping, value, sign):
+    """ Format a value, remembering the result. The settings are part of the
+    key, so changing the precision or format doesn't need to clear anything.
+    sign is needed because 0.0 == -0.0, but they are displayed differently """
+    return formatterClass(digits_after_decimal, exponent_grouping).display(value)
+
+
+def cacheInfo():
+    """ The hits, misses and size of the formatting cache """
+    return cachedDisplay.cache_info()
+
+
+def clearCache():
+    cachedDisplay.cache_clear()
+
+
+def formatText(template, *columns):
+    """ Apply template to every row of the columns (lists of equal length) in
+    a single call, returns the results as one string with a newline after
+    every row. Formatted numbers never contain a newline """
+    count = len(columns[0])
+    if len(columns) == 1:
+        arguments = columns[0]
+    else:
+        arguments = [None] * (count * len(columns))
+        for i, column in enumerate(columns):
+            arguments[i::len(columns)] = column
+    return (template + "\n") * count % tuple(arguments)
+
+
+def formatEach(template, *columns):
+    """ Like [template % row for row in zip(*columns)] """
+    return formatText(template, *columns).split("\n")[:-1]
+
+
+# Shorter lists are formatted one value at a time, using the cache
+smallestBatch = 32
+
+# Python computes 10**exponent differently for positive and negative
+# exponents, so keep the exact values to get the same results
+smallestExponent = -300
+powersOfTen = None
+
+
+def getPowersOfTen():
+    global powersOfTen
+    if powersOfTen is None:
+        powersOfTen = numpy.array([float(10**exponent) for exponent in range(smallestExponent, 309)])
+    return powersOfTen
 
 
 class ValueFormatter:
@@ -24,14 +84,86 @@ class ValueFormatter:
         print(a(value)) """
         if isinstance(value, str):
             return value
+        elif isVector(value):
+            # Too many values to show, so show a summary
+            return "[{}] {} .. {}".format(len(value),
+                                          self.display(float(value.min())),
+                                          self.display(float(value.max())))
+        elif type(value) is float:
+            return cachedDisplay(type(self), self.digits_after_decimal, self.exponent_grouping,
+                                 value, copysign(1.0, value))
         else:
             return self.display(value)
 
+    def display_many(self, values):
+        """ Format a sequence of values, gives the same result as
+        [self(value) for value in values]. Numbers (a list of floats, an
+        array or a Stack without vectors) are formatted all at once, which
+        is a lot faster for long lists """
+        if numpy is None or len(values) < smallestBatch:
+            return [self(value) for value in values]
+        if isinstance(values, numpy.ndarray):
+            if values.ndim != 1:
+                return [self(value) for value in values]
+            numbers = values.astype(float)
+        elif isinstance(values, Stack):
+            try:
+                numbers = values.toarray()
+            except TypeError:
+                return [self(value) for value in values]
+        else:
+            values = list(values)
+            if not all(type(value) is float or type(value) is int for value in values):
+                return [self(value) for value in values]
+            numbers = numpy.array(values, dtype=float)
+        if not numpy.isfinite(numbers).all():
+            # These can't be on the stack, but give the same result (or error)
+            return [self.display(value) for value in numbers.tolist()]
+        return self.display_array(numbers)
+
+    def display_array(self, values):
+        """ Format an array of finite floats, returns a list of strings.
+        Subclasses should do this without a Python call per value """
+        return [self.display(value) for value in values.tolist()]
+
+    def display_many_using_exponent(self, values):
+        """ display_using_exponent for an array of finite floats """
+        grouping = self.exponent_grouping
+        magnitudes = numpy.abs(values)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            scaled = numpy.log10(magnitudes) / grouping
+            nearWhole = numpy.abs(scaled - numpy.rint(scaled)) < 1e-9
+        exponents = numpy.floor(scaled)
+        # numpy's log10 can differ a bit from math.log10, that matters if the
+        # result is close to a whole number
+        for i in numpy.flatnonzero(nearWhole).tolist():
+            exponents[i] = floor(log10(float(magnitudes[i])) / grouping)
+        exponents[magnitudes == 0.0] = 0
+        exponents = exponents.astype(numpy.int64) * grouping
+
+        # Very small numbers are rare, let display_using_exponent handle them
+        small = exponents < smallestExponent
+        exponents[small] = 0
+        mantissas = values / getPowersOfTen()[exponents - smallestExponent]
+        result = formatEach("%.{}fe%d".format(self.digits_after_decimal),
+                            mantissas.tolist(), exponents.tolist())
+        for i in numpy.flatnonzero(small).tolist():
+            result[i] = self.display_using_exponent(float(values[i]))
+        return result
+
     def display_using_exponent(self, value):
         """ Display using an exponent, using self.exponent_grouping to
         determine valid values of the exponent """
-        exponent = floor(log10(abs(value))/self.exponent_grouping) * self.exponent_grouping
-        mantissa = value/(10**exponent)
+        if value == 0:
+            # There is no good exponent for 0, so don't use one
+            exponent = 0
+        else:
+            exponent = floor(log10(abs(value))/self.exponent_grouping) * self.exponent_grouping
+        if exponent < smallestExponent:
+            # 10**exponent would be rounded to 0 for the smallest numbers
+            mantissa = value * 1e100 / (10**(exponent + 100))
+        else:
+            mantissa = value/(10**exponent)
         return "{:.{precision}f}e{exponent}".format(mantissa,
                                                     precision=self.digits_after_decimal,
                                                     exponent=exponent)
@@ -53,6 +185,9 @@ class NoExponent(ValueFormatter):
     def display(self, value):
         return "{:.{precision}f}".format(value, precision=self.digits_after_decimal)
 
+    def display_array(self, values):
+        return formatEach("%.{}f".format(self.digits_after_decimal), values.tolist())
+
 
 class OptionalExponent(ValueFormatter):
     """ format  a number, only use an exponent if required """
@@ -72,8 +207,65 @@ class OptionalExponent(ValueFormatter):
         else:
             return self.display_using_exponent(value)
 
+    def display_array(self, values):
+        # Everything display() does, but for all values at once
+        text = formatText("%.{}f".format(self.digits_after_decimal), values.tolist())
+        if len(text) == 0:
+            return []
+        rounded = numpy.fromstring(text, sep="\n")
+        lineEnds = numpy.flatnonzero(numpy.frombuffer(text.encode(), dtype=numpy.uint8) == ord("\n"))
+        lengths = numpy.diff(lineEnds, prepend=-1) - 1
+        result = text.split("\n")[:-1]
+        difference = numpy.abs(rounded - values)
+        close = ((values == rounded) |
+                 (difference <= numpy.abs(self.precision * rounded)) |
+                 (difference <= numpy.abs(self.precision * values)))
+        useExponent = numpy.flatnonzero(~((values == 0.0) | (close & (lengths < self.max_digits))))
+        if len(useExponent) > 0:
+            withExponent = self.display_many_using_exponent(values[useExponent])
+            for i, text in zip(useExponent.tolist(), withExponent):
+                result[i] = text
+        return result
+
 
 class UseExponent(ValueFormatter):
     """ Format a number using an exponent to display """
     def display(self, value):
         return self.display_using_exponent(value)
+
+    def display_array(self, values):
+        return self.display_many_using_exponent(values)
+
+
+class ExactExponent(ValueFormatter):
+    """ Format a number using an exponent, showing all digits of the shortest
+    decimal number that converts back to the same value (what repr() shows).
+    The digits and the exponent are read from that text, so there is no
+    rounding error in the exponent, for example near 1e23.
+    digits_after_decimal only adds zeros at the end, the value is never
+    rounded """
+    def display(self, value):
+        text = repr(float(value))
+        if text in ('inf', '-inf', 'nan'):
+            return text
+        sign = ''
+        if text[0] == '-':
+            sign = '-'
+            text = text[1:]
+        mantissa, _, exponent = text.partition('e')
+        whole, _, fraction = mantissa.partition('.')
+        allDigits = whole + fraction
+        digits = allDigits.lstrip('0')
+        # The exponent of the first digit that isn't 0
+        exponent = int(exponent or 0) + len(whole) - 1 - (len(allDigits) - len(digits))
+        digits = digits.rstrip('0')
+        if digits == '':
+            digits, exponent = '0', 0
+
+        grouped = exponent // self.exponent_grouping * self.exponent_grouping
+        beforeDecimal = exponent - grouped + 1
+        wholeDigits = digits[:beforeDecimal].ljust(beforeDecimal, '0')
+        fractionDigits = digits[beforeDecimal:].ljust(self.digits_after_decimal, '0')
+        if fractionDigits == '':
+            return "{}{}e{}".format(sign, wholeDigits, grouped)
+        return "{}{}.{}e{}".format(sign, wholeDigits, fractionDigits, grouped)
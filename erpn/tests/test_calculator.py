@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version three, see Licence file for details
+
+import unittest
+import erpn.stackFormat as stackFormat
+import erpn.functions as f
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+
+
+class CalculatorTest(unittest.TestCase):
+    def setUp(self):
+        self.calculator = Calculator()
+        loadMappings(self.calculator)
+
+    def test_push_and_apply(self):
+        c = self.calculator
+        c.push(2.0)
+        c.push("3")
+        c.apply('+')
+        self.assertEqual(c.stack, [5.0])
+        c.apply(f.square)
+        self.assertEqual(c.stack, [25.0])
+        self.assertIsNone(c.error)
+
+    def test_push_many(self):
+        c = self.calculator
+        c.push_many([1, 2, 3])
+        self.assertEqual(c.stack, [1.0, 2.0, 3.0])
+        c.undo()
+        self.assertEqual(c.stack, [])
+        c.redo()
+        self.assertEqual(c.stack, [1.0, 2.0, 3.0])
+
+    def test_push_invalid(self):
+        c = self.calculator
+        c.push("1e")
+        self.assertEqual(c.error, "Could not decode value")
+        c.push_many([1, float("inf")])
+        self.assertEqual(c.stack, [])
+
+    def test_errors(self):
+        c = self.calculator
+        c.apply('+')
+        self.assertIsNone(c.error)
+        c.apply('-')
+        self.assertEqual(c.error, "Stack too small")
+        c.push(0)
+        c.apply('I')
+        self.assertEqual(c.error, "'1/x' is not defined at 0.0")
+        self.assertEqual(c.stack, [0.0, 0.0])
+        with self.assertRaises(KeyError):
+            c.apply('not a key')
+
+    def test_undo_redo(self):
+        c = self.calculator
+        c.push(4)
+        c.apply('S')
+        c.apply('u')
+        self.assertEqual(c.stack, [4.0])
+        c.apply('ctrl r')
+        self.assertEqual(c.stack, [2.0])
+        c.redo()
+        self.assertEqual(c.error, "Nothing to Redo")
+        c.reset()
+        c.undo()
+        self.assertEqual(c.error, "Nothing to undo")
+
+    def test_redo_error(self):
+        """ Redo after undo and the arrow works. An error while redoing is
+        shown, not raised, and the action can still be redone """
+        c = self.calculator
+        c.push('99')
+        c.push('1')
+        c.apply('d')
+        c.apply('u')
+        c.apply('up')
+        c.apply('ctrl r')
+        # Redo dups n=1 item again, after dropping x (the copy of 99)
+        self.assertIsNone(c.error)
+        self.assertEqual(c.stack, [99.0, 1.0, 1.0])
+
+        c.reset()
+        roll = f.Roll(count=3)
+        c.redostack.append(roll)
+        c.redo()
+        self.assertEqual(c.error, "Stack too small")
+        self.assertEqual(c.redostack, [roll])
+
+    def test_arrow(self):
+        c = self.calculator
+        c.push_many([1, 2, 3])
+        c.apply('up')
+        c.apply('up')
+        self.assertEqual(c.arrowLocation, 2)
+        c.apply('x')
+        self.assertEqual(c.stack, [2.0, 3.0])
+        self.assertEqual(c.arrowLocation, 0)
+
+    def test_roll_undo_redo(self):
+        c = self.calculator
+        c.push_many([1, 2, 3, 4, 3])
+        c.apply('r')
+        self.assertEqual(c.stack, [1.0, 3.0, 4.0, 2.0])
+        c.undo()
+        self.assertEqual(c.stack, [1.0, 2.0, 3.0, 4.0, 3.0])
+        c.redo()
+        self.assertEqual(c.stack, [1.0, 3.0, 4.0, 2.0])
+        c.apply('up')
+        c.apply('up')
+        c.apply('r')
+        self.assertEqual(c.stack, [1.0, 4.0, 2.0, 3.0])
+        c.undo()
+        c.redo()
+        self.assertEqual(c.stack, [1.0, 4.0, 2.0, 3.0])
+
+    def test_quit(self):
+        """ Commands the calculator can't handle are returned """
+        self.assertEqual(self.calculator.apply('Q'), f.Command('quit'))
+        self.assertEqual(self.calculator.apply(':'), f.Command('palette'))
+        self.assertIsNone(self.calculator.apply('u'))
+
+    def test_display_menu(self):
+        c = self.calculator
+        c.apply('D')
+        self.assertIs(c.currentFunctions(), c.functions['display'])
+        c.apply('e')
+        c.apply('+')
+        c.apply('D')
+        self.assertIs(c.currentFunctions(), c.functions['main'])
+        self.assertEqual(c.displayFormat(12345.0), "12.3450e3")
+        c.apply(f.back)
+        self.assertEqual(c.error, "No menu to go back to")
+
+    def test_independent_sessions(self):
+        """ Calculators sharing keybindings should not share anything else """
+        first = self.calculator
+        second = Calculator(first.functions)
+        first.push(1)
+        first.apply('D')
+        first.apply('s')
+        first.apply('+')
+        second.push(2)
+        self.assertEqual(first.stack, [1.0])
+        self.assertEqual(second.stack, [2.0])
+        self.assertEqual(len(second.undostack), 1)
+        self.assertIs(second.currentFunctions(), second.functions['main'])
+        self.assertEqual(second.displayFormat(1.0), "1.000")
+        self.assertEqual(first.displayFormat(1.0), "1.0000e0")
+
+
+class InterfaceTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            from erpn.urwidInterface import Interface
+        except ImportError:
+            self.skipTest("urwid is not installed")
+        self.first = Interface()
+        loadMappings(self.first)
+        self.second = Interface(Calculator(self.first.calculator.functions))
+
+    def test_interfaces_are_independent(self):
+        for key in "12.5":
+            self.first.takeKey(key)
+        self.first.takeKey('enter')
+        self.first.takeKey('s')
+        self.second.takeKey('9')
+        self.second.takeKey('enter')
+        self.assertEqual(self.first.calculator.stack, [156.25])
+        self.assertEqual(self.second.calculator.stack, [9.0])
+
+    def render(self, interface, size=(40, 6)):
+        """ The lines of the stack column (without the help) """
+        canvas = interface.root.render(size)
+        return [line.decode()[:size[0] - 23].rstrip() for line in canvas.text]
+
+    def test_render(self):
+        interface = self.first
+        self.render(interface)
+        for key in ["1", "enter", "2", "enter", "3"]:
+            interface.takeKey(key)
+        self.assertEqual(self.render(interface), ["",
+                                                  "",
+                                                  "     z: 1.000",
+                                                  "     y: 2.000",
+                                                  "     x: 3",
+                                                  ""])
+        for key in ["/", "/", "/"]:
+            interface.takeKey(key)
+        self.assertEqual(self.render(interface), ["",
+                                                  "",
+                                                  "",
+                                                  "",
+                                                  "     x: 1.500",
+                                                  "Stack too small"])
+
+    def test_arrow(self):
+        interface = self.first
+        interface.calculator.push_many(range(10))
+        self.render(interface)
+        interface.takeKey("up")
+        interface.takeKey("up")
+        self.assertEqual(self.render(interface)[2:4], [" ->  z: 7.000", "     y: 8.000"])
+        interface.takeKey("down")
+        self.assertEqual(self.render(interface)[2:4], ["     z: 7.000", " ->  y: 8.000"])
+
+    def test_long_values(self):
+        """ Values that don't fit on a line use more lines, the top of the
+        stack is always visible """
+        interface = self.first
+        interface.calculator.push_many([1e100, 2.0])
+        interface.takeKey("D")
+        interface.takeKey("p")
+        lines = self.render(interface, (60, 8))
+        self.assertEqual(lines[-2:], ["     x: 2.000", ""])
+        self.assertTrue(lines[2].startswith("     y: 1000"))
+        self.assertTrue(lines[5].startswith("        ") and lines[5].endswith(".000"))
+        # It doesn't fit anymore
+        self.assertEqual(self.render(interface, (60, 5)), ["", "", "", "     x: 2.000", ""])
+
+    def test_deep_stack(self):
+        """ Only the visible rows are formatted, and after a push only the new
+        row is """
+        interface = self.first
+        interface.calculator.push_many(range(100000))
+        interface.takeKey("up")
+        self.render(interface, (40, 6))
+        stackFormat.clearCache()
+        rows = interface.rows.contents
+        interface.takeKey("5")
+        interface.takeKey("enter")
+        self.assertEqual(self.render(interface, (40, 6))[-2:], ["     x: 5.000", ""])
+        self.assertEqual(stackFormat.cacheInfo().misses, 1)
+        self.assertIs(interface.rows.contents[0][1], rows[1][1])
+
+    def test_number_entry(self):
+        interface = self.first
+        interface.takeKey("1")
+        entry = interface.rows.contents[-1][1]
+        for key in "2e_5":
+            interface.takeKey(key)
+        self.assertIs(interface.rows.contents[-1][1], entry)
+        self.assertEqual(self.render(interface)[-2], "     x: 12e-5")
+
+    def test_help_cache(self):
+        interface = self.first
+        interface.displayHelp()
+        help = interface.helpBox.text
+        self.assertIn("S: sqrt x", help)
+        interface.takeKey("D")
+        self.assertIn("Increase precision", interface.helpBox.text)
+        interface.takeKey("D")
+        self.assertEqual(interface.helpBox.text, help)
+        self.assertEqual(len(interface.helpCache), 2)
+        # Adding a function makes it again
+        interface.add('F', f.RPNfunction(1, "frobnicate", lambda x: x))
+        interface.displayHelp()
+        self.assertIn("F: frobnicate", interface.helpBox.text)
+
+    def test_palette(self):
+        interface = self.first
+        interface.calculator.push_many([9.0, 4.0])
+        interface.takeKey(":")
+        self.assertEqual(interface.paletteQuery, "")
+        for key in "sqtr":
+            interface.takeKey(key)
+        self.assertIn("> sqrt x", interface.helpBox.text)
+        interface.takeKey("enter")
+        self.assertIsNone(interface.paletteQuery)
+        self.assertIn("S: sqrt x", interface.helpBox.text)
+        self.assertEqual(interface.calculator.stack, [9.0, 2.0])
+
+    def test_palette_arrow(self):
+        """ The chosen function is applied with the arrow """
+        interface = self.first
+        interface.calculator.push_many([9.0, 4.0])
+        interface.takeKey("up")
+        interface.takeKey(":")
+        for key in "sqrt":
+            interface.takeKey(key)
+        interface.takeKey("enter")
+        self.assertEqual(interface.calculator.stack, [9.0, 4.0, 3.0])
+
+    def test_palette_keys(self):
+        interface = self.first
+        interface.takeKey(":")
+        for key in "arc":
+            interface.takeKey(key)
+        interface.takeKey("down")
+        interface.takeKey("backspace")
+        self.assertEqual(interface.paletteQuery, "ar")
+        self.assertEqual(interface.paletteSelection, 0)
+        interface.takeKey("esc")
+        self.assertIsNone(interface.paletteQuery)
+        interface.takeKey("1")
+        interface.takeKey("enter")
+        self.assertEqual(interface.calculator.stack, [1.0])
+
+    def history(self, calculator):
+        """ The stack after undoing each step, until there is nothing to undo """
+        stacks = [list(calculator.stack)]
+        while len(calculator.undostack) > 0:
+            calculator.undo()
+            stacks.append(list(calculator.stack))
+        return stacks
+
+    def test_paste(self):
+        """ A paste gives the same result as typing the keys one by one, but
+        the stack is only displayed once """
+        keys = list("12.5 3e_2*4.5.5 _1+2 ") + ["enter", "tab", "up", "up", "s", "x", "D", "p", "D", "r"]
+        keys = keys * 50
+        for key in keys:
+            self.second.takeKey(key)
+
+        interface = self.first
+        displays = []
+        displayStack = interface.displayStack
+        interface.displayStack = lambda: displays.append(displayStack())
+        interface.filterInput(keys, [])
+        self.assertEqual(len(displays), 1)
+        self.assertEqual(interface.calculator.stack, self.second.calculator.stack)
+        self.assertEqual(interface.calculator.arrowLocation, self.second.calculator.arrowLocation)
+        self.assertEqual(self.render(interface), self.render(self.second))
+        self.assertEqual(self.history(interface.calculator), self.history(self.second.calculator))
+
+    def test_undo_status(self):
+        interface = self.first
+        for key in ["1", "enter", "2", "enter", "+"]:
+            interface.takeKey(key)
+        self.assertTrue(interface.statusBox.text.startswith("undo: 3 ("))
+        interface.takeKey("u")
+        self.assertTrue(interface.statusBox.text.startswith("undo: 2 ("))
+
+    def test_resize(self):
+        """ Resizes are left to urwid """
+        self.assertEqual(self.first.filterInput(['1', 'window resize', '2'], []), ['window resize'])
+        self.assertEqual(self.first.numberEntry, "12")
+
+
+if __name__ == '__main__':
+    unittest.main()
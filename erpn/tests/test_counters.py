@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import json
+import os
+import tempfile
+import unittest
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.counters import Counters, Histogram
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentile(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(0.5), 0)
+        for nanoseconds in [1000] * 98 + [5000, 10**6]:
+            histogram.add(nanoseconds)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile(0.5), 1024)
+        self.assertEqual(histogram.percentile(0.99), 8192)
+        self.assertEqual(histogram.percentile(1.0), 2**20)
+        self.assertEqual(histogram.toDict()['buckets'], {'1024': 98, '8192': 1, str(2**20): 1})
+
+
+class CountersTest(unittest.TestCase):
+    def setUp(self):
+        self.calculator = Calculator()
+        loadMappings(self.calculator)
+        self.calculator.counters = Counters()
+
+    def test_counts(self):
+        c = self.calculator
+        for value in [1, 2, 3]:
+            c.push(value)
+        c.push_many([4, 5])
+        c.apply('+')
+        c.apply('+')
+        c.apply(c.functions['main']['s'])
+        counters = c.counters
+        self.assertEqual(counters.keys['number'].count, 3)
+        self.assertEqual(counters.functions['push'].count, 3)
+        self.assertEqual(counters.functions['push many'].count, 1)
+        self.assertEqual(counters.keys['+'].count, 2)
+        self.assertEqual(counters.functions['x+y'].count, 2)
+        # Not applied with a key
+        self.assertNotIn('s', counters.keys)
+        self.assertEqual(counters.functions['x^2'].count, 1)
+        self.assertEqual((counters.stackDepth, counters.maxStackDepth), (3, 5))
+        self.assertEqual((counters.undoSize, counters.maxUndoSize), (7, 7))
+
+    def test_errors(self):
+        c = self.calculator
+        c.apply('+')
+        c.apply('-')
+        c.push(0)
+        c.apply('I')
+        c.push(1e300)
+        c.apply('E')
+        self.assertEqual(c.counters.errors, {'StackToSmallError': 1, 'DomainError': 1, 'OverflowError': 1})
+        self.assertEqual(c.error, "Value too large")
+        self.assertEqual(c.counters.functions['y-x'].count, 1)
+
+    def test_dump(self):
+        self.calculator.apply('+')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stats.json')
+            self.calculator.counters.dump(path)
+            with open(path) as file:
+                saved = json.load(file)
+        self.assertEqual(saved['keys']['+']['count'], 1)
+        self.assertEqual(saved['errors'], {})
+
+    def test_disabled(self):
+        c = Calculator(self.calculator.functions)
+        c.apply('+')
+        self.assertIsNone(c.counters)
+
+
+class StatisticsPanelTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            from erpn.urwidInterface import Interface
+        except ImportError:
+            self.skipTest("urwid is not installed")
+        self.interface = Interface()
+        loadMappings(self.interface)
+
+    def text(self):
+        return '\n'.join(row.decode() for row in self.interface.root.render((120, 30)).text)
+
+    def test_panel(self):
+        interface = self.interface
+        interface.calculator.counters = Counters()
+        for key in ["1", "enter", "2", "+", "ctrl t"]:
+            interface.takeKey(key)
+        self.assertIn("x+y", self.text())
+        self.assertEqual(interface.calculator.counters.frames.count, 5)
+        interface.takeKey("ctrl t")
+        self.assertNotIn("x+y", self.text())
+
+    def test_disabled(self):
+        self.interface.takeKey("ctrl t")
+        self.assertIn("--stats", self.interface.calculator.error)
+        self.assertEqual(len(self.interface.root.contents), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,10 @@
 # Copyright (C) 2016 Bart de Waal
 # This program is licenced under the GPL version three, see Licence file for details
 
+import random
 import unittest
 from erpn.domain import Reals, Integers
+from erpn.vectors import numpy
 import erpn.domain as domain
 
 
@@ -79,5 +81,96 @@ class TestDomain(unittest.TestCase):
         self.assertFalse(0 in ((Reals < 0) + (Reals > 0)))
 
 
+class TestCompile(unittest.TestCase):
+    special = [float('inf'), float('-inf'), float('nan'), 0.0, -0.0]
+
+    def randomDomain(self, rng, depth):
+        if depth == 0 or rng.random() < 0.3:
+            choice = rng.randrange(4)
+            if choice == 0:
+                return Reals
+            if choice == 1:
+                return Integers
+            if choice == 2:
+                return domain.SingleValue(rng.choice([-1, 0, 0.5, 1, 2]))
+            return domain.SetDomain([rng.randint(-3, 3) for _ in range(3)])
+        left = self.randomDomain(rng, depth - 1)
+        choice = rng.randrange(5)
+        if choice == 0:
+            return left + self.randomDomain(rng, depth - 1)
+        if choice == 1:
+            return left - {rng.randint(-3, 3)}
+        value = rng.choice([-2, -1, -0.5, 0, 0.5, 1, 2.5])
+        operator = rng.choice(['__lt__', '__le__', '__gt__', '__ge__'])
+        return getattr(left, operator)(value)
+
+    def values(self, rng):
+        # Stack values are always floats. Comparison doesn't work for an int
+        # compared to a float (int.__lt__ returns NotImplemented)
+        values = [rng.choice([-3.0, -2.5, -2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0])
+                  for _ in range(50)]
+        values += [rng.uniform(-4, 4) for _ in range(50)]
+        return values
+
+    def test_random_domains(self):
+        """ The compiled domain contains the same values as the original """
+        rng = random.Random(8)
+        for _ in range(500):
+            dom = self.randomDomain(rng, 3)
+            compiled = dom.compile()
+            for value in self.values(rng) + self.special:
+                self.assertEqual(value in compiled, value in dom, (dom, compiled, value))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_contains_many(self):
+        rng = random.Random(9)
+        for _ in range(200):
+            dom = self.randomDomain(rng, 3)
+            compiled = dom.compile()
+            values = numpy.array(self.values(rng) + self.special[:3])
+            expected = [value in dom for value in values]
+            self.assertEqual(list(compiled.contains_many(values)), expected, (dom, compiled))
+            self.assertEqual(list(dom.contains_many(values)), expected)
+
+    def test_simplify(self):
+        self.assertEqual(repr(((Reals <= 1) >= -1).simplify()), "IntervalSet([-1.0, 1.0])")
+        self.assertEqual(repr((Reals - {0}).simplify()), "IntervalSet((-inf, 0.0) + (0.0, inf))")
+        self.assertEqual(repr((Integers >= 0).simplify()), "IntervalSet(Integers[0.0, inf))")
+        self.assertEqual(repr(((Integers >= 0) - {3}).simplify()),
+                         "IntervalSet(Integers[0.0, 3.0) + Integers(3.0, inf))")
+        self.assertEqual(repr((domain.SingleValue(1) + (Reals < 0)).simplify()),
+                         "IntervalSet((-inf, 0.0) + {1.0} + {-inf})")
+        # Different ways to write the same domain give the same result
+        self.assertEqual(((Reals > 0) + (Reals > 1)).simplify(), (Reals > 0).simplify())
+        self.assertEqual(((Reals - {0}) + domain.SingleValue(0)).simplify(), Reals.simplify())
+        self.assertEqual(((Integers >= 0) + (Integers < 0)).simplify(), Integers.simplify())
+        self.assertNotEqual((Reals >= 0).simplify(), (Reals > 0).simplify())
+
+    def test_not_compilable(self):
+        # Every non-integer, that can't be written as a list of intervals
+        dom = Reals - Integers
+        self.assertIs(dom.compile(), dom)
+        self.assertTrue(0.5 in dom.compile())
+        self.assertFalse(1 in dom.compile())
+
+    def test_not_a_number(self):
+        self.assertFalse("text" in Reals.compile())
+        # The comparison itself would accept it (str.__gt__ returns NotImplemented)
+        self.assertFalse("text" in ((Reals < 1) + Reals).compile())
+
+    def test_large_int(self):
+        # Too large for a float, checked like infinity
+        self.assertFalse(10**400 in Reals.compile())
+        self.assertTrue(10**400 in (Reals > 0).compile())
+
+    def test_many_intervals(self):
+        dom = Reals - set(range(1000))
+        compiled = dom.compile()
+        self.assertEqual(len(compiled.intervals), 1001)
+        self.assertTrue(500.5 in compiled)
+        self.assertFalse(500 in compiled)
+        self.assertTrue(-1 in compiled)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,6 +6,7 @@
 import unittest
 import math
 import erpn.functions as f
+from erpn.stack import Stack
 from pyperclip import copy, paste
 
 
@@ -14,7 +15,14 @@ class FunctionTest(unittest.TestCase):
     def compare_input_result(self, initial_stack, result_stack,
                              undo_length=1, arrow_location=0,
                              delta=None):
-        stack = initial_stack.copy()
+        # The functions should work the same on a list and on a Stack
+        for stack_type in (list, Stack):
+            self.compare_input_result_on(stack_type, initial_stack, result_stack,
+                                         undo_length, arrow_location, delta)
+
+    def compare_input_result_on(self, stack_type, initial_stack, result_stack,
+                                undo_length, arrow_location, delta):
+        stack = stack_type(initial_stack)
         undo_stack = []
         self.function.run(stack, undo_stack, arrow_location)
         if delta is None:
@@ -85,6 +93,101 @@ class DeleteTest(FunctionTest):
                                   arrow_location=2)
 
 
+class RollTest(FunctionTest):
+    function = f.Roll()
+
+    def test_roll(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0, 4.0, 3.0],
+                                  result_stack=[1.0, 3.0, 4.0, 2.0])
+        self.compare_input_result(initial_stack=[1.0, 2.0, 1.0],
+                                  result_stack=[1.0, 2.0])
+
+    def test_roll_arrow(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0, 4.0],
+                                  result_stack=[1.0, 3.0, 4.0, 2.0],
+                                  arrow_location=2)
+
+    def test_roll_errors(self):
+        self.expect_error(initial_stack=[1.0, 2.0, 3.0], expected_error=f.StackToSmallError)
+        self.expect_error(initial_stack=[1.0, 2.0, 0.0], expected_error=f.DomainError)
+        self.expect_error(initial_stack=[1.0, 2.0, 1.5], expected_error=f.DomainError)
+        self.expect_error(initial_stack=[], expected_error=f.StackToSmallError)
+
+    def test_roll_deep(self):
+        stack = Stack(range(100000))
+        undo_stack = []
+        f.Roll().run(stack, undo_stack, 50000)
+        self.assertEqual(stack[-1], 49999.0)
+        self.assertEqual(stack[49999], 50000.0)
+        undo_stack.pop().apply(stack)
+        self.assertEqual(stack, list(range(100000)))
+
+
+class PickTest(FunctionTest):
+    function = f.Pick()
+
+    def test_pick(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0, 3.0],
+                                  result_stack=[1.0, 2.0, 3.0, 1.0])
+
+    def test_pick_arrow(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0],
+                                  result_stack=[1.0, 2.0, 3.0, 2.0],
+                                  arrow_location=1)
+
+    def test_pick_too_deep(self):
+        self.expect_error(initial_stack=[1.0, 2.0], expected_error=f.StackToSmallError)
+
+
+class DropNTest(FunctionTest):
+    function = f.DropN()
+
+    def test_drop_n(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0, 2.0],
+                                  result_stack=[1.0])
+        self.compare_input_result(initial_stack=[1.0, 0.0],
+                                  result_stack=[1.0])
+
+    def test_drop_n_arrow(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0],
+                                  result_stack=[1.0],
+                                  arrow_location=1)
+
+    def test_drop_n_negative(self):
+        self.expect_error(initial_stack=[1.0, -1.0], expected_error=f.DomainError)
+
+
+class DupNTest(FunctionTest):
+    function = f.DupN()
+
+    def test_dup_n(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0, 2.0],
+                                  result_stack=[1.0, 2.0, 3.0, 2.0, 3.0])
+
+    def test_dup_n_arrow(self):
+        self.compare_input_result(initial_stack=[1.0, 2.0, 3.0],
+                                  result_stack=[1.0, 2.0, 3.0, 2.0, 3.0],
+                                  arrow_location=1)
+
+
+class StackCountRedoTest(unittest.TestCase):
+    def test_redo_after_change(self):
+        """ Redo uses the n of the action, and drops x, even if x was changed
+        after the undo """
+        for function in [f.Roll(), f.Pick(), f.DropN(), f.DupN()]:
+            stack = [1.0, 2.0, 3.0, 4.0, 2.0]
+            undo_stack = []
+            function.run(stack, undo_stack, 0)
+            done = list(stack)
+            undo = undo_stack.pop()
+            undo.apply(stack)
+            stack[-1] = 3.0
+            undo.redo.run(stack, undo_stack, 0)
+            self.assertEqual(stack, done, function.description)
+            undo_stack.pop().apply(stack)
+            self.assertEqual(stack, [1.0, 2.0, 3.0, 4.0, 3.0])
+
+
 class SubtractTest(FunctionTest):
     function = f.subtract
 
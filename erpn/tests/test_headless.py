@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version three, see Licence file for details
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import erpn.headless as h
+from erpn.stackFormat import NoExponent
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(h.tokenize("1 2 +\n"), ['1', '2', '+'])
+
+    def test_tokenize_meta(self):
+        self.assertEqual(h.tokenize("meta p ctrl r"), ['meta p', 'ctrl r'])
+
+    def test_parse_number(self):
+        self.assertEqual(h.parseNumber("_1.5"), -1.5)
+        self.assertEqual(h.parseNumber("1e_2"), 0.01)
+        self.assertEqual(h.parseNumber("1e-2"), 0.01)
+
+
+class EvaluatorTest(unittest.TestCase):
+    evaluator = h.Evaluator(displayFormat=NoExponent(2))
+
+    def check(self, line, output):
+        self.assertEqual(self.evaluator.evaluateLine(line), output)
+
+    def test_arithmetic(self):
+        self.check("1 2 +", "3.00")
+        self.check("3 4 5 * -", "-17.00")
+        self.check("_2 S", "error: 'sqrt x' is not defined at -2.0 (token 2: 'S')")
+
+    def test_records_are_independent(self):
+        self.check("1 2", "1.00 2.00")
+        self.check("3", "3.00")
+
+    def test_errors(self):
+        self.check("1 -", "error: Stack too small (token 2: '-')")
+        self.check("1 0 /", "error: 'y/x' is not defined at 0.0 (token 3: '/')")
+        self.check("1 ?", "error: Unknown key (token 2: '?')")
+        self.check("1..2", "error: Could not decode value (token 1: '1..2')")
+        self.check("1 :", "error: Only available in the interface (token 2: ':')")
+
+    def test_undo_redo(self):
+        self.check("1 2 + u", "1.00 2.00")
+        self.check("1 2 + u ctrl r", "3.00")
+        self.check("u", "error: Nothing to undo (token 1: 'u')")
+
+    def test_arrow(self):
+        self.check("1 2 3 k k x", "2.00 3.00")
+        self.check("1 2 3 k tab", "1.00 3.00 2.00")
+
+    def test_keys_with_prefix(self):
+        self.check("meta p", "3.14")
+
+    def test_display_menu(self):
+        self.check("1000 D s enter", "1.00e3")
+        self.check("1 D + + D", "1.0000")
+
+    def test_quit(self):
+        self.check("1 Q 2", "1.00")
+
+    def test_empty_line(self):
+        self.check("", "")
+
+    def test_evaluate_lines(self):
+        results = h.evaluateLines(iter(["1 2 +\n", "2 s\n"]), self.evaluator)
+        self.assertEqual(list(results), ["3.00", "4.00"])
+
+
+class ParallelTest(unittest.TestCase):
+    def test_parallel_same_as_serial(self):
+        lines = ["{} {} /\n".format(i, i % 7) for i in range(2500)]
+        serial = ''.join(line + '\n' for line in h.evaluateLines(lines))
+        parallel = ''.join(h.evaluateParallel(lines, 2, chunksize=100))
+        self.assertEqual(parallel, serial)
+        self.assertIn("error: 'y/x' is not defined at 0.0 (token 3: '/')", parallel)
+
+    def test_run_jobs(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.rpn', delete=False) as inputFile:
+            inputFile.write("1 2 +\n-\n2 S\n")
+        try:
+            output = io.StringIO()
+            h.run([inputFile.name], NoExponent(1), output, jobs=2, chunksize=1)
+            self.assertEqual(output.getvalue(),
+                             "3.0\nerror: Stack too small (token 1: '-')\n1.4\n")
+        finally:
+            os.remove(inputFile.name)
+
+
+class RunTest(unittest.TestCase):
+    def test_run_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.rpn', delete=False) as inputFile:
+            inputFile.write("1 2 +\n2 S\n")
+        try:
+            output = io.StringIO()
+            h.run([inputFile.name], NoExponent(1), output)
+            self.assertEqual(output.getvalue(), "3.0\n1.4\n")
+        finally:
+            os.remove(inputFile.name)
+
+    def test_no_urwid(self):
+        """ The evaluation mode should work without importing urwid """
+        script = ("import sys, io\n"
+                  "sys.stdin = io.StringIO('1 2 +\\n')\n"
+                  "sys.argv = ['erpn', '--eval']\n"
+                  "from erpn.main import main\n"
+                  "main()\n"
+                  "assert 'urwid' not in sys.modules\n")
+        result = subprocess.run([sys.executable, '-c', script],
+                                stdout=subprocess.PIPE, check=True)
+        self.assertEqual(result.stdout, b"3.000\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import random
+import unittest
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn import functions
+from erpn.history import UndoHistory, PUSHES
+
+
+class HistoryTest(unittest.TestCase):
+    keys = ["enter", "+", "-", "*", "s", "x", "r", "i", "up", "down", "u", "u", "ctrl r"]
+
+    def calculators(self, **options):
+        """ A calculator with an UndoHistory and one that uses a list, like
+        before there was a limit """
+        calculator = Calculator(**options)
+        loadMappings(calculator)
+        reference = Calculator(calculator.functions)
+        reference.undostack = []
+        return calculator, reference
+
+    def apply(self, calculators, action):
+        for calculator in calculators:
+            if isinstance(action, float):
+                calculator.push(action)
+            else:
+                calculator.apply(action)
+
+    def randomActions(self, count, seed):
+        rng = random.Random(seed)
+        actions = []
+        for _ in range(count):
+            if rng.random() < 0.4:
+                actions.append(float(rng.randint(-9, 9)))
+            else:
+                actions.append(rng.choice(self.keys))
+        return actions
+
+    def test_same_as_list(self):
+        """ Without reaching the limits, undo and redo work exactly like they
+        did with a list """
+        for seed in range(20):
+            calculators = self.calculators()
+            for action in self.randomActions(300, seed):
+                self.apply(calculators, action)
+                calculator, reference = calculators
+                self.assertEqual(calculator.stack, reference.stack, (seed, action))
+                self.assertEqual(calculator.error, reference.error)
+                self.assertEqual(len(calculator.undostack), len(reference.undostack))
+                self.assertEqual(len(calculator.redostack), len(reference.redostack))
+
+    def test_depth(self):
+        """ Only the last steps can be undone, and those the same as before """
+        calculator, reference = calculators = self.calculators(undoDepth=5)
+        for action in [1.0, 2.0, 3.0, "+", 4.0, 5.0, "*", 6.0, "enter", "-"]:
+            self.apply(calculators, action)
+        self.assertEqual(len(calculator.undostack), 5)
+        for _ in range(5):
+            self.apply(calculators, "u")
+            self.assertEqual(calculator.stack, reference.stack)
+        calculator.apply("u")
+        self.assertEqual(calculator.error, "Nothing to undo")
+        for _ in range(5):
+            self.apply(calculators, "ctrl r")
+            self.assertEqual(calculator.stack, reference.stack)
+
+    def test_bytes(self):
+        calculator, reference = self.calculators(undoBytes=2000)
+        for action in self.randomActions(500, 1):
+            self.apply([calculator], action)
+            self.assertLessEqual(calculator.undostack.bytes, 2000)
+        self.assertGreater(len(calculator.undostack), 0)
+
+    def test_pushes(self):
+        """ A run of pushes is one record, but undone one push at a time """
+        calculator, reference = self.calculators()
+        calculator.push(1.0)
+        calculator.apply("+")
+        for value in range(10000):
+            calculator.push(float(value))
+        history = calculator.undostack
+        self.assertEqual(history.count, 3)
+        self.assertEqual(len(history), 10002)
+        self.assertLess(history.bytes, 10000 * 10)
+        for value in reversed(range(9998, 10000)):
+            calculator.undo()
+            self.assertEqual(calculator.stack[-1], value - 1)
+        calculator.redo()
+        self.assertEqual(calculator.stack[-1], 9998)
+        self.assertEqual(len(history), 10001)
+
+    def test_described_push(self):
+        """ A push with its own description is redone with that function """
+        calculator, reference = self.calculators()
+        calculator.push(1.0)
+        calculator.apply("meta p")
+        calculator.push(2.0)
+        calculator.undo()
+        calculator.undo()
+        self.assertEqual(calculator.redostack[-1].description, "Push pi=3.14..")
+        calculator.redo()
+        self.assertEqual(calculator.undostack.pop().redo.description, "Push pi=3.14..")
+
+    def test_ring(self):
+        """ The oldest steps are forgotten first, also inside a run of pushes """
+        history = UndoHistory(maxDepth=4)
+        calculator, reference = self.calculators()
+        calculator.undostack = history
+        for action in [1.0, 2.0, "+", 3.0, 4.0, 5.0, "*", 6.0, 7.0]:
+            self.apply([calculator], action)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history.count, 3)
+        self.assertEqual(len(history.opcodes), 4)
+        self.assertEqual(history.opcodes[history.start], PUSHES)
+        self.assertEqual(history.lengths[history.start], 1)
+        self.assertEqual(history.values[history.firstValue], 5.0)
+        for _ in range(4):
+            history.pop()
+        self.assertEqual(len(history), 0)
+        with self.assertRaises(IndexError):
+            history.pop()
+
+    def test_journal(self):
+        """ Every kind of undo item comes back the same as it went in """
+        redo = functions.AddItem(2.0)
+        functional = functions.FunctionalUndoItem(lambda stack: None, redo)
+        items = [functions.UndoItem(1, [], functions.AddItem(1.0)),
+                 functions.UndoItem(1, [], functions.AddItem(3.0, description="Push three")),
+                 functions.UndoItem(2, [], functions.AddItems([1.0, 2.0])),
+                 functions.UndoItem(2, [], functions.AddItems([1.0, 2.0], description="push a pair")),
+                 functions.UndoItem(1, [4.0, 5.0], redo),
+                 functions.UndoItem(1, [6.0], redo),
+                 functions.UndoItem(1, [8], redo),  # Not a float, kept as an object
+                 functions.UndoDelete(3, 7.0),
+                 functions.UndoRoll(2, None),
+                 functions.UndoRoll(4, 4.0),
+                 functions.UndoSwitch(1),
+                 functional]
+        history = UndoHistory()
+        for item in items:
+            history.append(item)
+        self.assertEqual(len(history.table), 5)  # redo is in it once
+        for item in reversed(items):
+            popped = history.pop()
+            self.assertIs(type(popped), type(item))
+            for name in item.__slots__:
+                if name != 'redo':
+                    self.assertEqual(getattr(popped, name), getattr(item, name))
+            self.assertEqual(popped.redo.description, item.redo.description)
+        self.assertEqual(history.bytes, 0)
+        self.assertEqual(history.tablePositions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import random
+import unittest
+from erpn import functions
+from erpn.calculator import Calculator
+from erpn.buttonMappings import loadMappings
+from erpn.palette import FunctionIndex
+
+
+def manyFunctions(count, seed=1):
+    """ Keybindings with count functions with made up descriptions """
+    rng = random.Random(seed)
+    words = ["sine", "cosine", "matrix", "vector", "sum", "mean", "root",
+             "power", "log", "stack", "rotate", "swap", "round", "inverse"]
+    bindings = {}
+    for n in range(count):
+        description = "{} {} {}".format(rng.choice(words), rng.choice(words), n)
+        bindings["key {}".format(n)] = functions.RPNfunction(1, description, lambda x: x)
+    return {'main': bindings}
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        calculator = Calculator()
+        loadMappings(calculator)
+        self.index = FunctionIndex(calculator.functions)
+
+    def descriptions(self, query):
+        return [description for description, keys, function in self.index.search(query)]
+
+    def test_exact(self):
+        self.assertEqual(self.descriptions("sqrt")[0], "sqrt x")
+        self.assertEqual(self.descriptions("SQRT")[0], "sqrt x")
+
+    def test_typo(self):
+        self.assertEqual(self.descriptions("sqtr")[0], "sqrt x")
+        self.assertEqual(self.descriptions("swp")[0], "Swap")
+        self.assertIn("Increase precision", self.descriptions("precison"))
+
+    def test_substring_first(self):
+        self.assertEqual(self.descriptions("arc")[:3],
+                         ["arccos x (rad)", "arcsin x (rad)", "arctan x (rad)"])
+
+    def test_empty(self):
+        """ Without a search all functions are shown, sorted """
+        descriptions = self.descriptions("")
+        self.assertEqual(len(descriptions), FunctionIndex.limit)
+        self.assertEqual(descriptions, sorted(descriptions, key=str.lower))
+
+    def test_no_match(self):
+        self.assertEqual(self.descriptions("zzzzzz"), [])
+
+    def test_keys(self):
+        """ Functions bound to more keys or in more menus are found once """
+        results = [entry for entry in self.index.search("quit") if entry[0] == "quit"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][1], ['Q'])
+        self.assertIs(results[0][2], functions.quit)
+
+    def test_many_functions(self):
+        index = FunctionIndex(manyFunctions(5000))
+        self.assertEqual(len(index.entries), 5000)
+        function = index.entries[1234][2]
+        results = index.search(function.description)
+        self.assertLessEqual(len(results), FunctionIndex.limit)
+        self.assertIs(results[0][2], function)
+        # With the first two letters swapped
+        typo = function.description[1] + function.description[0] + function.description[2:]
+        self.assertIs(index.search(typo)[0][2], function)
+        for description, keys, function in index.search("rotate"):
+            self.assertIn("rotate", description)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import random
+import unittest
+from erpn.persistent import PersistentStack, commonLength
+from erpn.stack import Stack
+from erpn.vectors import numpy
+
+
+class SmallChunkStack(PersistentStack):
+    """ Use tiny chunks so the tests cross chunk boundaries all the time """
+    __slots__ = ()
+    chunkSize = 4
+    copyLimit = 2
+
+
+class PersistentStackTest(unittest.TestCase):
+    def test_operations(self):
+        stack = PersistentStack([1, 2, 3])
+        self.assertEqual(stack, [1.0, 2.0, 3.0])
+        self.assertEqual(len(stack), 3)
+        self.assertEqual(stack[-1], 3.0)
+        self.assertEqual(stack[0], 1.0)
+        self.assertEqual(stack.top(2), [2.0, 3.0])
+        self.assertEqual(stack.push(4.0), [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(stack.drop(2), [1.0])
+        self.assertEqual(stack.drop(3), [])
+        self.assertEqual(stack.pushMany([5.0, 6.0]), [1.0, 2.0, 3.0, 5.0, 6.0])
+        self.assertEqual(stack.toStack(), Stack([1.0, 2.0, 3.0]))
+        self.assertEqual(PersistentStack.fromStack(Stack([1.0, 2.0, 3.0])), stack)
+        with self.assertRaises(IndexError):
+            stack.drop(4)
+        with self.assertRaises(IndexError):
+            stack[3]
+
+    def test_unchanged(self):
+        """ Stacks stay the same when new stacks are made from them """
+        for stackClass in (PersistentStack, SmallChunkStack):
+            rng = random.Random(1)
+            states = [(stackClass(), [])]
+            for _ in range(2000):
+                stack, values = rng.choice(states)
+                choice = rng.random()
+                if choice < 0.4:
+                    value = float(rng.randint(0, 99))
+                    stack, values = stack.push(value), values + [value]
+                elif choice < 0.6:
+                    new = [float(rng.randint(0, 99)) for _ in range(rng.randint(0, 9))]
+                    stack, values = stack.pushMany(new), values + new
+                else:
+                    n = rng.randint(0, len(values))
+                    stack, values = stack.drop(n), values[:len(values) - n]
+                states.append((stack, values))
+                self.assertEqual(stack.top(3), values[-3:])
+            for stack, values in states:
+                self.assertEqual(list(stack), values)
+                self.assertEqual(stack.toStack(), values)
+            for _ in range(500):
+                (first, firstValues), (second, secondValues) = rng.sample(states, 2)
+                common = commonLength(first, second)
+                self.assertEqual(firstValues[:common], secondValues[:common])
+                n = rng.randint(0, len(firstValues))
+                self.assertEqual(commonLength(first, first.drop(n)), len(firstValues) - n)
+
+    def test_sharing(self):
+        """ A new stack only adds the values that changed """
+        stack = PersistentStack(range(100000))
+        pushed = stack.push(1.0)
+        self.assertIs(pushed.chunk, stack.chunk)
+        # A node on top of the part of the chunk that is left
+        changed = pushed.drop(2).push(3.0)
+        self.assertEqual(len(changed.chunk), 1)
+        self.assertIs(changed.below.chunk, stack.chunk)
+        self.assertIs(changed.below.below, stack.below)
+        self.assertEqual(len(list(stack.nodes())), 98)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_vectors(self):
+        vector = numpy.array([1.0, 2.0])
+        stack = PersistentStack([1.0, 2.0])
+        withVector = stack.push(vector)
+        self.assertIs(withVector[-1], vector)
+        self.assertEqual(stack.push(3.0), [1.0, 2.0, 3.0])
+        self.assertEqual(withVector.pushMany([4.0, vector]), [1.0, 2.0, vector, 4.0, vector])
+        self.assertEqual(withVector.toStack(), [1.0, 2.0, vector])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import json
+import os
+import tempfile
+import unittest
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.recording import Recorder, Replay, stateDigest
+from erpn.session import Session
+
+
+class RecordingTest(unittest.TestCase):
+    keys = list("12.5") + ["enter", "+", "S", "x", "x", "x", "x", "x", "u", "ctrl r", "up", "*",
+                           "D", "s", "D", ":", "s", "q", "enter"]
+
+    def setUp(self):
+        try:
+            from erpn.urwidInterface import Interface
+        except ImportError:
+            self.skipTest("urwid is not installed")
+        self.Interface = Interface
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'keys.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, batches, close=True, **options):
+        calculator = Calculator(**options)
+        calculator.push_many([1.0, 2.0, -0.0])
+        interface = self.Interface(calculator)
+        loadMappings(interface)
+        interface.recorder = Recorder(self.path, calculator)
+        for batch in batches:
+            interface.takeKeys(batch)
+        if close:
+            interface.recorder.close()
+        return calculator
+
+    def replay(self):
+        recording = Replay(self.path)
+        interface = recording.newInterface()
+        errors = recording.run(interface)
+        return recording, interface.calculator, errors
+
+    def test_replay(self):
+        for options in [{}, {'useUndoTree': True}]:
+            calculator = self.record([[key] for key in self.keys] + [list("3 4 5 +")], **options)
+            recording, replayed, errors = self.replay()
+            self.assertEqual(recording.keyCount, len(self.keys) + 7)
+            self.assertEqual(list(replayed.stack), list(calculator.stack))
+            self.assertEqual(replayed.error, calculator.error)
+            self.assertIn("Stack too small", errors)
+            self.assertEqual(stateDigest(replayed, errors), recording.recordedDigest)
+
+    def test_history_before(self):
+        """ The undo history from before the recording isn't replayed, but
+        the digest only counts what was added to it """
+        calculator = Calculator()
+        calculator.push(1.0)
+        interface = self.Interface(calculator)
+        loadMappings(interface)
+        interface.recorder = Recorder(self.path, calculator)
+        interface.takeKeys(["enter", "+"])
+        interface.recorder.close()
+        recording, replayed, errors = self.replay()
+        self.assertEqual(recording.unrecorded, (1, 0))
+        self.assertEqual(list(replayed.stack), [2.0])
+        self.assertEqual(stateDigest(replayed, errors), recording.recordedDigest)
+
+    def test_session_history(self):
+        """ The undo history of a restored session is recorded, so undoing
+        further than the start of the recording is replayed too """
+        sessionDirectory = os.path.join(self.directory.name, 'session')
+        for options in [{}, {'undoDepth': 2}]:
+            session = Session(sessionDirectory)
+            calculator = Calculator(**options)
+            loadMappings(calculator)
+            session.attach(calculator)
+            calculator.push_many([1.0, 2.0])
+            calculator.apply("+")
+            calculator.push(4.0)
+            calculator.undo()
+            session.close()
+
+            session = Session(sessionDirectory)
+            calculator = Calculator(**options)
+            session.attach(calculator)
+            interface = self.Interface(calculator)
+            loadMappings(interface)
+            interface.recorder = Recorder(self.path, calculator)
+            interface.takeKeys(["u", "u", "ctrl r", "5"])
+            interface.recorder.close()
+            session.close()
+
+            recording, replayed, errors = self.replay()
+            self.assertEqual(recording.unrecorded, (0, 0))
+            self.assertEqual(list(replayed.stack), list(calculator.stack))
+            self.assertEqual(stateDigest(replayed, errors), recording.recordedDigest)
+
+    def test_not_closed(self):
+        calculator = self.record([["1"], ["enter"]], close=False)
+        recording, replayed, errors = self.replay()
+        self.assertIsNone(recording.recordedDigest)
+        self.assertEqual(list(replayed.stack), list(calculator.stack))
+        self.assertEqual(list(replayed.stack), [1.0, 2.0, -0.0, 1.0])
+
+    def test_clipboard(self):
+        """ The recorded clipboard text is pasted again """
+        self.record([])
+        with open(self.path) as log:
+            header = log.readline()
+        with open(self.path, 'w') as log:
+            log.write(header)
+            log.write(json.dumps("7") + "\n")
+            log.write(json.dumps([0, "v"]) + "\n")
+        recording, replayed, errors = self.replay()
+        self.assertEqual(list(replayed.stack), [1.0, 2.0, -0.0, 7.0])
+
+    def test_not_a_recording(self):
+        with open(self.path, 'w') as log:
+            log.write('[0, "1"]\n')
+        with self.assertRaises(ValueError):
+            Replay(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version three, see Licence file for details
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import unittest
+from erpn.server import Server, serve
+from erpn.stackFormat import NoExponent
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'erpn.sock')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_clients(self, clients, maxSessions=4):
+        """ Start a server and run the client coroutines against it """
+        async def run():
+            server = await Server(maxSessions, NoExponent(1)).start(self.path)
+            async with server:
+                return await asyncio.wait_for(asyncio.gather(*clients), 10)
+        return asyncio.run(run())
+
+    async def connect(self):
+        return await asyncio.open_unix_connection(self.path)
+
+    async def call(self, reader, writer, message):
+        writer.write(json.dumps(message).encode() + b"\n")
+        return json.loads(await reader.readline())
+
+    def test_eval(self):
+        async def client():
+            reader, writer = await self.connect()
+            first = await self.call(reader, writer, {'jsonrpc': "2.0", 'id': 1, 'method': "eval",
+                                                     'params': ["1", "2", "+"]})
+            second = await self.call(reader, writer, {'jsonrpc': "2.0", 'id': 2, 'method': "eval",
+                                                      'params': {'tokens': ["S", "-"]}})
+            writer.close()
+            return first, second
+
+        first, second = self.run_clients([client()])[0]
+        self.assertEqual(first, {'jsonrpc': "2.0", 'id': 1,
+                                 'result': {'stack': ["3.0"], 'values': [3.0], 'error': None}})
+        self.assertEqual(second['result'], {'stack': ["1.7"], 'values': [3.0 ** 0.5],
+                                            'error': "Stack too small (token 2: '-')"})
+
+    def test_batch(self):
+        async def client():
+            reader, writer = await self.connect()
+            response = await self.call(reader, writer, [
+                {'jsonrpc': "2.0", 'id': 1, 'method': "eval", 'params': ["2", "meta p"]},
+                {'jsonrpc': "2.0", 'method': "eval", 'params': ["*"]},
+                {'jsonrpc': "2.0", 'id': 2, 'method': "stack"},
+                {'jsonrpc': "2.0", 'id': 3, 'method': "unknown"},
+                {'jsonrpc': "2.0", 'id': 4, 'method': "eval", 'params': "1 2 +"},
+                {'id': 5}])
+            writer.close()
+            return response
+
+        response = self.run_clients([client()])[0]
+        self.assertEqual([r['id'] for r in response], [1, 2, 3, 4, None])
+        self.assertEqual(response[1]['result']['stack'], ["6.3"])
+        self.assertEqual(response[2]['error']['code'], -32601)
+        self.assertEqual(response[3]['error']['code'], -32602)
+        self.assertEqual(response[4]['error']['code'], -32600)
+
+    def test_parse_error(self):
+        async def client():
+            reader, writer = await self.connect()
+            writer.write(b"{not json\n")
+            response = json.loads(await reader.readline())
+            writer.close()
+            return response
+
+        response = self.run_clients([client()])[0]
+        self.assertEqual(response['error']['code'], -32700)
+
+    def test_sessions_are_separate(self):
+        async def client(value):
+            reader, writer = await self.connect()
+            await self.call(reader, writer, {'jsonrpc': "2.0", 'id': 1, 'method': "eval",
+                                             'params': [value]})
+            await asyncio.sleep(0.01)
+            response = await self.call(reader, writer, {'jsonrpc': "2.0", 'id': 2, 'method': "stack"})
+            writer.close()
+            return response['result']['values']
+
+        results = self.run_clients([client(str(i)) for i in range(10)])
+        self.assertEqual(results, [[float(i)] for i in range(10)])
+
+    def test_session_limit(self):
+        """ With one session allowed the second client has to wait for the first """
+        events = []
+
+        async def client(name):
+            reader, writer = await self.connect()
+            await self.call(reader, writer, {'jsonrpc': "2.0", 'id': 1, 'method': "stack"})
+            events.append(name + " started")
+            await asyncio.sleep(0.05)
+            events.append(name + " done")
+            writer.close()
+
+        async def delayed():
+            await asyncio.sleep(0.01)
+            await client("second")
+
+        self.run_clients([client("first"), delayed()], maxSessions=1)
+        self.assertEqual(events, ["first started", "first done",
+                                  "second started", "second done"])
+
+
+class SocketFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'erpn.sock')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_regular_file(self):
+        """ A file that isn't a socket is left alone """
+        with open(self.path, 'w') as file:
+            file.write("important")
+        with self.assertRaises(OSError):
+            serve(self.path)
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "important")
+
+    def test_running_server(self):
+        """ The socket of a running server isn't taken over """
+        async def run():
+            first = Server()
+            async with await first.start(self.path):
+                with self.assertRaises(OSError):
+                    await Server().start(self.path)
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                writer.write(b'{"jsonrpc": "2.0", "id": 1, "method": "stack"}\n')
+                response = json.loads(await reader.readline())
+                writer.close()
+            first.removeSocket()
+            return response
+        self.assertEqual(asyncio.run(run())['id'], 1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_socket(self):
+        """ A socket nobody listens on is replaced """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as old:
+            old.bind(self.path)
+
+        async def run():
+            server = Server()
+            async with await server.start(self.path):
+                pass
+            server.removeSocket()
+        asyncio.run(run())
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import os
+import random
+import tempfile
+import unittest
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.session import Session
+from erpn.vectors import numpy
+
+
+class SessionTest(unittest.TestCase):
+    keys = ["enter", "+", "-", "*", "s", "x", "r", "P", "d", "X", "i", "up", "down", "u", "u", "ctrl r"]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.keybindings = Calculator().functions
+        loadMappings(Calculator(self.keybindings))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def calculator(self, **options):
+        """ A calculator that uses the session in the temporary directory """
+        calculator = Calculator(self.keybindings, **options)
+        session = Session(self.directory.name)
+        session.attach(calculator)
+        return calculator, session
+
+    def play(self, calculator, count, seed):
+        rng = random.Random(seed)
+        for _ in range(count):
+            if rng.random() < 0.4:
+                calculator.push(float(rng.randint(-9, 9)))
+            else:
+                calculator.apply(rng.choice(self.keys))
+
+    def assertSameHistory(self, calculator, restored):
+        """ Undo and redo everything on both calculators, the stacks should
+        stay the same """
+        self.assertEqual(restored.stack, calculator.stack)
+        self.assertEqual(len(restored.undostack), len(calculator.undostack))
+        self.assertEqual(len(restored.redostack), len(calculator.redostack))
+        for _ in range(len(calculator.undostack)):
+            calculator.undo()
+            restored.undo()
+            self.assertEqual(restored.stack, calculator.stack)
+        for _ in range(len(calculator.redostack)):
+            calculator.redo()
+            restored.redo()
+            self.assertEqual(restored.stack, calculator.stack)
+
+    def test_restore(self):
+        for seed in range(5):
+            calculator, session = self.calculator()
+            self.play(calculator, 300, seed)
+            session.close()
+            restored, session = self.calculator()
+            self.assertSameHistory(calculator, restored)
+            session.close()
+
+    def test_snapshots(self):
+        """ Also with a snapshot and a new log now and then """
+        calculator, session = Calculator(self.keybindings), Session(self.directory.name, snapshotBytes=500)
+        session.attach(calculator)
+        calculator.push_many(range(5000))
+        self.play(calculator, 1000, 1)
+        self.assertGreater(session.generation, 10)
+        session.close()
+        self.assertLess(os.path.getsize(session.logPath), 600)
+        restored, session = self.calculator()
+        self.assertSameHistory(calculator, restored)
+        session.close()
+
+    def test_continue(self):
+        """ A restored session is saved again """
+        calculator, session = self.calculator()
+        self.play(calculator, 100, 1)
+        session.close()
+        calculator, session = self.calculator()
+        self.play(calculator, 100, 2)
+        session.close()
+        restored, session = self.calculator()
+        self.assertSameHistory(calculator, restored)
+        session.close()
+
+    def test_broken_record(self):
+        """ A record that was only half written is ignored """
+        calculator, session = self.calculator()
+        for value in [1.0, 2.0, 3.0]:
+            calculator.push(value)
+        session.close()
+        with open(session.logPath, 'ab') as log:
+            log.write(b'\x00\x00\x02\x00\x00\x00\x01')
+        restored, session = self.calculator()
+        self.assertEqual(restored.stack, [1.0, 2.0, 3.0])
+        restored.push(4.0)
+        session.close()
+        restored, session = self.calculator()
+        self.assertEqual(restored.stack, [1.0, 2.0, 3.0, 4.0])
+        session.close()
+
+    def test_negative_zero(self):
+        calculator, session = self.calculator()
+        calculator.push(0.0)
+        calculator.apply("i")
+        session.close()
+        restored, session = self.calculator()
+        self.assertEqual(str(restored.stack[-1]), "-0.0")
+        session.close()
+
+    def test_undo_tree(self):
+        calculator, session = self.calculator(useUndoTree=True)
+        self.play(calculator, 300, 1)
+        calculator.jump(10)
+        session.close()
+        restored, session = self.calculator(useUndoTree=True)
+        self.assertEqual(restored.stack, calculator.stack)
+        self.assertEqual(restored.undoTree.current.state, restored.stack)
+        session.close()
+
+    def test_locked(self):
+        calculator, session = self.calculator()
+        with self.assertRaises(OSError):
+            self.calculator()
+        session.close()
+
+    def test_snapshot_during_action(self):
+        """ An arrow copy and an operator are two records, a new log is only
+        started after both of them """
+        actions = [2.0, -2.0, 2.0, 0.5, "enter", 2.0, 2.0, "x", "meta p", "u", 0.5, 0.5, "k", "+"]
+        for snapshotBytes in range(100, 400, 10):
+            with tempfile.TemporaryDirectory() as directory:
+                calculator = Calculator(self.keybindings)
+                session = Session(directory, snapshotBytes=snapshotBytes)
+                session.attach(calculator)
+                for action in actions:
+                    calculator.apply(action) if isinstance(action, str) else calculator.push(action)
+                session.close()
+                restored = Calculator(self.keybindings)
+                session = Session(directory)
+                session.attach(restored)
+                self.assertSameHistory(calculator, restored)
+                session.close()
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_vectors(self):
+        calculator, session = self.calculator()
+        for action in [1.0, 2.0, 3.0, 2.0, "V", 4.0, "+"]:
+            calculator.apply(action) if isinstance(action, str) else calculator.push(action)
+        session.close()
+        restored, session = self.calculator()
+        self.assertSameHistory(calculator, restored)
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version three, see Licence file for details
+
+import random
+import unittest
+from array import array
+from erpn.stack import Stack
+
+
+class SmallBlockStack(Stack):
+    """ Use tiny blocks so the tests cross block boundaries all the time """
+    blockSize = 4
+
+
+class StackTest(unittest.TestCase):
+    def test_list_operations(self):
+        stack = Stack([1, 2, 3])
+        self.assertEqual(stack, [1.0, 2.0, 3.0])
+        self.assertEqual(len(stack), 3)
+        self.assertEqual(stack[-1], 3.0)
+        self.assertEqual(stack[-2:], [2.0, 3.0])
+        self.assertIsInstance(stack[-2:], list)
+
+        stack.append(4)
+        stack.insert(-1, 5)
+        self.assertEqual(stack, [1.0, 2.0, 3.0, 5.0, 4.0])
+        self.assertEqual(stack.pop(1), 2.0)
+        self.assertEqual(stack.pop(), 4.0)
+        del stack[-2:]
+        stack.extend([6.0])
+        self.assertEqual(stack, [1.0, 6.0])
+        self.assertEqual(stack + ["7"], [1.0, 6.0, "7"])
+        self.assertEqual(list(reversed(stack)), [6.0, 1.0])
+        self.assertEqual(stack, Stack([1.0, 6.0]))
+        self.assertNotEqual(stack, [1.0])
+
+        copy = stack.copy()
+        copy.clear()
+        self.assertEqual(copy, [])
+        self.assertEqual(stack, [1.0, 6.0])
+
+    def test_push_many(self):
+        stack = Stack()
+        stack.push_many(array('d', [1.0, 2.0]))
+        stack.push_many(Stack([3.0]))
+        stack.push_many(range(4, 6))
+        stack.push_many(array('i', [6]))
+        self.assertEqual(stack, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+
+    def test_pop_many(self):
+        stack = Stack([1.0, 2.0, 3.0])
+        self.assertEqual(stack.pop_many(2), array('d', [2.0, 3.0]))
+        self.assertEqual(stack.pop_many(0), array('d'))
+        with self.assertRaises(IndexError):
+            stack.pop_many(2)
+        self.assertEqual(stack, [1.0])
+
+    def test_view(self):
+        stack = Stack([1.0, 2.0, 3.0])
+        with stack.view(2) as view:
+            self.assertEqual(view.tolist(), [2.0, 3.0])
+            self.assertTrue(view.readonly)
+            with self.assertRaises(BufferError):
+                stack.append(4.0)
+        stack.append(4.0)
+        with stack.view() as view:
+            self.assertEqual(len(view), 4)
+        with self.assertRaises(IndexError):
+            stack.view(5)
+        stack.append(5.0)
+
+
+class BlockTest(unittest.TestCase):
+    def check(self, stack, values):
+        self.assertEqual(stack, values)
+        self.assertEqual(len(stack), len(values))
+        self.assertEqual(list(reversed(stack)), values[::-1])
+        self.assertEqual(stack.treePrefix(len(stack.blocks)), stack.bodyLength)
+        self.assertTrue(all(len(block) > 0 for block in stack.blocks))
+
+    def test_random_operations(self):
+        """ Compare a stack with small blocks to a list """
+        generator = random.Random(1)
+        for _ in range(50):
+            stack = SmallBlockStack()
+            values = []
+            for _ in range(200):
+                operation = generator.randrange(8)
+                length = len(values)
+                if operation <= 1:
+                    value = float(generator.randrange(1000))
+                    stack.append(value)
+                    values.append(value)
+                elif operation == 2 and length > 0:
+                    index = generator.randrange(-length, length)
+                    self.assertEqual(stack.pop(index), values.pop(index))
+                elif operation == 3:
+                    index = generator.randrange(-length - 2, length + 3)
+                    stack.insert(index, 7.0)
+                    values.insert(index, 7.0)
+                elif operation == 4:
+                    new = [float(i) for i in range(generator.randrange(10))]
+                    stack.extend(new)
+                    values.extend(new)
+                elif operation == 5:
+                    n = generator.randrange(length + 1)
+                    self.assertEqual(stack.pop_many(n).tolist(), values[length - n:])
+                    del values[length - n:]
+                elif operation == 6:
+                    n = generator.randrange(length + 1)
+                    with stack.view(n) as view:
+                        self.assertEqual(view.tolist(), values[length - n:])
+                elif operation == 7 and length > 0:
+                    start = generator.randrange(-length - 2, length + 2)
+                    stop = generator.randrange(-length - 2, length + 2)
+                    self.assertEqual(stack[start:stop], values[start:stop])
+                    index = generator.randrange(-length, length)
+                    self.assertEqual(stack[index], values[index])
+                    stack[index] = 3.0
+                    values[index] = 3.0
+                self.check(stack, values)
+
+    def test_deep_operations(self):
+        stack = Stack(range(100000))
+        stack.insert(10, -1.0)
+        self.assertEqual(stack[10], -1.0)
+        self.assertEqual(stack.pop(10), -1.0)
+        self.assertEqual(stack.pop(-50001), 49999.0)
+        self.assertEqual(stack[-50000:-49998], [50000.0, 50001.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import math
+import random
+import unittest
+import erpn.stackFormat as stackFormat
+from erpn.stackFormat import NoExponent, OptionalExponent, UseExponent, ExactExponent
+from erpn.calculator import Calculator
+from erpn.buttonMappings import loadMappings
+from erpn.stack import Stack
+from erpn.vectors import numpy
+
+
+class CacheTest(unittest.TestCase):
+    values = [0.0, -0.0, 1.0, -2.5, 1234.5678, 1e-7, -3.3e12, 0.001]
+
+    def setUp(self):
+        stackFormat.clearCache()
+
+    def test_same_result(self):
+        for formatter in (NoExponent(3), OptionalExponent(2), UseExponent(4, 3)):
+            for value in self.values[2:]:
+                self.assertEqual(formatter(value), formatter.display(value))
+                # Again, now from the cache
+                self.assertEqual(formatter(value), formatter.display(value))
+
+    def test_negative_zero(self):
+        formatter = NoExponent(1)
+        self.assertEqual(formatter(0.0), "0.0")
+        self.assertEqual(formatter(-0.0), "-0.0")
+
+    def test_static_stack(self):
+        """ Formatting the same values again doesn't format anything """
+        formatter = OptionalExponent(3)
+        first = [formatter(value) for value in self.values]
+        misses = stackFormat.cacheInfo().misses
+        self.assertEqual([formatter(value) for value in self.values], first)
+        self.assertEqual(stackFormat.cacheInfo().misses, misses)
+        self.assertEqual(stackFormat.cacheInfo().hits, len(self.values))
+
+    def test_precision_change(self):
+        formatter = NoExponent(1)
+        self.assertEqual(formatter(1.25), "1.2")
+        formatter.add_precision()
+        self.assertEqual(formatter(1.25), "1.25")
+        formatter.remove_precision()
+        self.assertEqual(formatter(1.25), "1.2")
+
+    def test_format_change(self):
+        c = Calculator()
+        loadMappings(c)
+        c.push("1234.5")
+        self.assertEqual(c.displayFormat(c.stack[-1]), "1234.500")
+        for key in ("D", "s"):
+            c.apply(key)
+        self.assertEqual(c.displayFormat(c.stack[-1]), "1.234e3")
+        c.apply("e")
+        c.apply("+")
+        self.assertEqual(c.displayFormat(c.stack[-1]), "1.2345e3")
+        c.apply("s")
+        self.assertEqual(c.displayFormat(c.stack[-1]), "1.2345e3")
+        c.push("12345")
+        self.assertEqual(c.displayFormat(c.stack[-1]), "1.2345e4")
+        c.apply("e")
+        self.assertEqual(c.displayFormat(c.stack[-1]), "12.3450e3")
+
+
+class ExactTest(unittest.TestCase):
+    def test_scientific(self):
+        formatter = ExactExponent(0)
+        self.assertEqual(formatter(1234.5), "1.2345e3")
+        self.assertEqual(formatter(0.1), "1e-1")
+        self.assertEqual(formatter(1e23), "1e23")
+        self.assertEqual(formatter(-1.5e-7), "-1.5e-7")
+        self.assertEqual(formatter(100.0), "1e2")
+        self.assertEqual(formatter(0.0), "0e0")
+        self.assertEqual(formatter(-0.0), "-0e0")
+        self.assertEqual(formatter(5e-324), "5e-324")
+
+    def test_engineering(self):
+        formatter = ExactExponent(0, 3)
+        self.assertEqual(formatter(1234.5), "1.2345e3")
+        self.assertEqual(formatter(0.1), "100e-3")
+        self.assertEqual(formatter(1e23), "100e21")
+        self.assertEqual(formatter(-1.5e-7), "-150e-9")
+        self.assertEqual(formatter(1e16), "10e15")
+
+    def test_precision(self):
+        # Adds zeros, but doesn't round
+        formatter = ExactExponent(3)
+        self.assertEqual(formatter(1.0), "1.000e0")
+        self.assertEqual(formatter(0.1 + 0.2), "3.0000000000000004e-1")
+        self.assertEqual(ExactExponent(3, 3)(0.1), "100.000e-3")
+
+    def test_round_trip(self):
+        rng = random.Random(11)
+        for grouping in (1, 3):
+            formatter = ExactExponent(0, grouping)
+            for _ in range(1000):
+                value = rng.gauss(0, 1) * 10.0 ** rng.randint(-300, 300)
+                self.assertEqual(float(formatter(value)), value)
+
+    def test_display_many(self):
+        values = [1.5 * 10.0 ** i for i in range(-40, 40)]
+        formatter = ExactExponent(2, 3)
+        self.assertEqual(formatter.display_many(values), [formatter(value) for value in values])
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class DisplayManyTest(unittest.TestCase):
+    def formatters(self):
+        for digits in range(stackFormat.ValueFormatter.max_digits - 1):
+            yield NoExponent(digits)
+            yield OptionalExponent(digits)
+            yield UseExponent(digits)
+            yield UseExponent(digits, 3)
+            yield ExactExponent(digits, 3)
+
+    def randomValues(self, rng, count):
+        values = []
+        for _ in range(count):
+            kind = rng.randrange(4)
+            if kind == 0:
+                value = rng.uniform(-1000, 1000)
+            elif kind == 1:
+                value = rng.gauss(0, 1) * 10.0 ** rng.randint(-320, 307)
+            elif kind == 2:
+                # Close to a power of 10, where the exponent changes
+                value = math.nextafter(10.0 ** rng.randint(-20, 20), rng.choice([0, math.inf]))
+            else:
+                # Close to where rounding changes the display
+                value = round(rng.uniform(-10, 10), rng.randint(0, 14)) + rng.choice([-1, 1]) * 5e-15
+            values.append(value)
+        return values + [0.0, -0.0, 5e-324, -5e-324, 1.7e308, 1e-300, 999.9999999999999, 0.0005]
+
+    def test_same_as_display(self):
+        """ display_many gives exactly the same strings as display """
+        rng = random.Random(10)
+        values = numpy.array(self.randomValues(rng, 300))
+        for formatter in self.formatters():
+            expected = [formatter.display(value) for value in values.tolist()]
+            self.assertEqual(formatter.display_many(values), expected,
+                             (type(formatter), formatter.digits_after_decimal))
+
+    def test_inputs(self):
+        formatter = OptionalExponent(2)
+        values = [float(i) ** 3 for i in range(-50, 50)]
+        expected = [formatter(value) for value in values]
+        self.assertEqual(formatter.display_many(values), expected)
+        self.assertEqual(formatter.display_many(Stack(values)), expected)
+        self.assertEqual(formatter.display_many(numpy.array(values)), expected)
+        self.assertEqual(formatter.display_many([]), [])
+        # Vectors and text are displayed like __call__ does
+        mixed = values + [numpy.array([1.0, 2.0]), "1.5e"]
+        self.assertEqual(formatter.display_many(mixed), [formatter(value) for value in mixed])
+
+    def test_zero(self):
+        self.assertEqual(UseExponent(2)(0.0), "0.00e0")
+        self.assertEqual(UseExponent(2).display_many(numpy.zeros(40))[0], "0.00e0")
+
+    def test_large(self):
+        values = numpy.random.default_rng(1).standard_normal(10**5) * 1000
+        for formatter in (NoExponent(3), OptionalExponent(3), UseExponent(3)):
+            self.assertEqual(formatter.display_many(values),
+                             [formatter.display(value) for value in values.tolist()])
+
+
+if __name__ == '__main__':
+    unittest.main()
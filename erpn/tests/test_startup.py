@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import subprocess
+import sys
+import unittest
+
+
+def importedModules(arguments, input=""):
+    """ The names of all modules erpn imports when started with arguments,
+    like the erpn script does """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'from erpn.main import main; main()'] + arguments,
+                            input=input, capture_output=True, text=True, check=True)
+    return {line.split('|')[-1].strip() for line in result.stderr.splitlines()
+            if line.startswith('import time:')}
+
+
+class StartupTest(unittest.TestCase):
+    """ Modes without the interface shouldn't import the slow dependencies """
+    slow = {'urwid', 'numpy', 'pyperclip', 'multiprocessing'}
+
+    def test_version(self):
+        modules = importedModules(['--version'])
+        self.assertEqual(modules & (self.slow | {'argparse', 'erpn.functions'}), set())
+
+    def test_eval(self):
+        modules = importedModules(['--eval'], "2 S 3 *\n")
+        self.assertIn('erpn.functions', modules)
+        self.assertEqual(modules & self.slow, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
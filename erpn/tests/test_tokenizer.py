@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import itertools
+import unittest
+from erpn import tokenizer
+from erpn.tokenizer import NumberEntry, parseNumber, parseNumbers
+
+
+def referenceEnterNumber(numberEntry, key):
+    """ How number entry worked before the tokenizer. Returns the new entry,
+    or None if key ends the number """
+    allowedKeys = list("1234567890")
+    if numberEntry == "" and key == '_':
+        allowedKeys += ['-']
+        key = '-'
+    if len(numberEntry) > 0 and numberEntry[-1] == 'e':
+        allowedKeys += ['-']
+        if key == '_':
+            key = '-'
+    if 'e' not in numberEntry and '.' not in numberEntry:
+        allowedKeys += ['.']
+    if 'e' not in numberEntry and any(c.isdigit() for c in numberEntry):
+        allowedKeys += ['e']
+    if len(numberEntry) > 0:
+        allowedKeys += ['backspace']
+
+    if key not in allowedKeys:
+        return None
+    if key == 'backspace':
+        return numberEntry[:-1]
+    return numberEntry + key
+
+
+def referenceParseNumber(token):
+    """ How the non-interactive mode read numbers before the tokenizer """
+    if token.startswith('_'):
+        token = '-' + token[1:]
+    return float(token.replace('e_', 'e-'))
+
+
+def decodes(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+class NumberEntryTest(unittest.TestCase):
+    # All digits work the same, '+' and 'E' are keys that end a number
+    keys = ['0', '7', '.', 'e', '_', '-', 'backspace', '+', 'E']
+    length = 8
+
+    def test_same_as_before(self):
+        """ Every sequence of up to self.length keys gives the same entry as
+        before, and ends it at the same key """
+        checked = 0
+        # entries that are still going: (keys, old entry, tokenizer)
+        todo = [((), "", NumberEntry())]
+        while len(todo) > 0:
+            keys, old, entry = todo.pop()
+            checked += 1
+            for key in self.keys:
+                if len(keys) == 0 and key not in tokenizer.numberStart:
+                    # The interface only starts an entry with these keys
+                    continue
+                expected = referenceEnterNumber(old, key)
+                new = NumberEntry()
+                new.states = list(entry.states)
+                new.text = entry.text
+                self.assertEqual(new.feed(key), expected is not None, keys + (key,))
+                if expected is None:
+                    # The entry ends here, and is pushed if it isn't empty
+                    self.assertEqual(entry.isComplete(), old != "" and decodes(old), keys + (key,))
+                    continue
+                self.assertEqual(new.text, expected, keys + (key,))
+                if len(keys) + 1 < self.length:
+                    todo.append((keys + (key,), expected, new))
+        self.assertGreater(checked, 20000)
+
+    def test_backspace(self):
+        entry = NumberEntry()
+        for key in "_1.5e-":
+            self.assertTrue(entry.feed(key))
+        self.assertEqual(entry.text, "-1.5e-")
+        self.assertFalse(entry.isComplete())
+        for _ in range(4):
+            self.assertTrue(entry.feed('backspace'))
+        self.assertEqual(entry.text, "-1")
+        # The '.' can be typed again
+        self.assertTrue(entry.feed('.'))
+        entry.feed('backspace')
+        entry.feed('backspace')
+        entry.feed('backspace')
+        self.assertFalse(entry.feed('backspace'))
+        self.assertEqual(entry.text, "")
+
+
+class ParseTest(unittest.TestCase):
+    characters = "5.eE_-+x ,"
+    length = 5
+
+    def test_state_machine(self):
+        """ Text is read exactly like the state machine reads it """
+        for length in range(self.length + 1):
+            for text in map(''.join, itertools.product(self.characters, repeat=length)):
+                words = text.replace(',', ' ').split()
+                if all(tokenizer.textState(word) in tokenizer.complete for word in words):
+                    self.assertEqual(parseNumbers(text), [float(word.replace('_', '-')) for word in words], text)
+                else:
+                    with self.assertRaises(ValueError, msg=text):
+                        parseNumbers(text)
+
+                if tokenizer.textState(text) in tokenizer.complete:
+                    self.assertEqual(parseNumber(text), float(text.replace('_', '-')), text)
+                else:
+                    with self.assertRaises(ValueError, msg=text):
+                        parseNumber(text)
+
+    def test_parse_number(self):
+        self.assertEqual(parseNumber("_1.5e_3"), -0.0015)
+        for text in ["", "1 2", " 1", "1,", "1e", "_"]:
+            with self.assertRaises(ValueError, msg=text):
+                parseNumber(text)
+
+    def test_same_as_before(self):
+        """ Everything that can be typed in reads the same as before """
+        for length in range(1, self.length + 2):
+            for text in map(''.join, itertools.product("05.e_-", repeat=length)):
+                entry = NumberEntry()
+                if all(entry.feed(key) for key in text) and entry.isComplete():
+                    self.assertEqual(parseNumber(entry.text), referenceParseNumber(text), text)
+                    self.assertEqual(parseNumber(text), referenceParseNumber(text), text)
+
+    def test_parse_numbers(self):
+        self.assertEqual(parseNumbers("1e+100, -3 +2.5E-3 _4\n.5"), [1e100, -3.0, 0.0025, -4.0, 0.5])
+        self.assertEqual(parseNumbers("  "), [])
+        for text in ["1 2 x", "1e", "1,2-3", "inf", "1_000", "\u0661"]:
+            with self.assertRaises(ValueError):
+                parseNumbers(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
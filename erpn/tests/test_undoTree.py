@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+import random
+import tracemalloc
+import unittest
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+
+
+class UndoTreeTest(unittest.TestCase):
+    # Not the arrow, with the normal undo an action on the item the arrow
+    # points at takes two steps to undo
+    keys = ["enter", "+", "-", "*", "s", "x", "r", "P", "d", "X", "i", "u", "u", "ctrl r"]
+
+    def calculators(self):
+        """ A calculator with an undo tree and one with the normal undo """
+        calculator = Calculator(useUndoTree=True)
+        loadMappings(calculator)
+        return calculator, Calculator(calculator.functions)
+
+    def apply(self, calculators, action):
+        for calculator in calculators:
+            if isinstance(action, float):
+                calculator.push(action)
+            else:
+                calculator.apply(action)
+
+    def test_same_as_linear(self):
+        """ As long as nothing is done after an undo, the undo tree works like
+        the normal undo, and the state in the tree is the stack """
+        for seed in range(20):
+            rng = random.Random(seed)
+            calculators = self.calculators()
+            calculator, reference = calculators
+            for _ in range(300):
+                if rng.random() < 0.4:
+                    action = float(rng.randint(1, 4))
+                else:
+                    action = rng.choice(self.keys)
+                self.apply(calculators, action)
+                self.assertEqual(calculator.stack, reference.stack, (seed, action))
+                self.assertEqual(calculator.undoTree.current.state, calculator.stack)
+                self.assertEqual(calculator.error, reference.error)
+                self.assertEqual(len(calculator.undoTree), len(reference.undostack))
+
+    def test_branches(self):
+        calculator, reference = self.calculators()
+        for action in [1.0, 2.0, "+", "u", 5.0]:
+            calculator.apply(action) if isinstance(action, str) else calculator.push(action)
+        self.assertEqual(calculator.stack, [1.0, 2.0, 5.0])
+        calculator.apply("u")
+        calculator.apply("ctrl r")
+        self.assertEqual(calculator.stack, [1.0, 2.0, 5.0])
+        calculator.apply("u")
+        calculator.apply("ctrl b")
+        calculator.apply("ctrl r")
+        self.assertEqual(calculator.stack, [3.0])
+        self.assertEqual(len(calculator.undoTree.nodes), 5)
+
+        calculator.jump(4)
+        self.assertEqual(calculator.stack, [1.0, 2.0, 5.0])
+        self.assertEqual(len(calculator.undoTree), 3)
+        calculator.jump(0)
+        self.assertEqual(calculator.stack, [])
+        calculator.apply("u")
+        self.assertEqual(calculator.error, "Nothing to undo")
+        calculator.apply("ctrl b")
+        self.assertIsNone(calculator.error)
+        calculator.jump(4)
+        calculator.apply("ctrl b")
+        self.assertEqual(calculator.error, "No branch to redo")
+
+        reference.jump(0)
+        self.assertEqual(reference.error, "Needs the undo tree")
+
+    def test_jump_key(self):
+        """ ctrl g goes to the state with number x """
+        calculator, reference = self.calculators()
+        for action in [1.0, 2.0, "+", 1.0]:
+            calculator.apply(action) if isinstance(action, str) else calculator.push(action)
+        self.assertEqual(calculator.stack, [3.0, 1.0])
+        calculator.apply("ctrl g")
+        self.assertIsNone(calculator.error)
+        self.assertEqual(calculator.stack, [1.0])
+        calculator.push(9.0)
+        calculator.apply("ctrl g")
+        self.assertEqual(calculator.error, "No undo state 9")
+        self.assertEqual(calculator.stack, [1.0, 9.0])
+        calculator.push(0.5)
+        calculator.apply("ctrl g")
+        self.assertIn("not defined", calculator.error)
+
+        reference.push(0.0)
+        reference.apply("ctrl g")
+        self.assertEqual(reference.error, "Needs the undo tree")
+
+    def test_jump(self):
+        """ After moving anywhere in the tree the stack is the state """
+        for seed in range(10):
+            rng = random.Random(seed)
+            calculator, reference = self.calculators()
+            calculator.push_many(range(200))
+            for _ in range(200):
+                if rng.random() < 0.2:
+                    calculator.jump(rng.randrange(len(calculator.undoTree.nodes)))
+                elif rng.random() < 0.4:
+                    calculator.push(float(rng.randint(1, 4)))
+                else:
+                    calculator.apply(rng.choice(self.keys))
+                self.assertEqual(calculator.undoTree.current.state, calculator.stack)
+
+    def test_arrow(self):
+        """ An action on the item the arrow points at is a single state """
+        calculator, reference = self.calculators()
+        for action in [1.0, 2.0, 3.0, "up", "up", "+"]:
+            calculator.apply(action) if isinstance(action, str) else calculator.push(action)
+        self.assertEqual(calculator.stack, [1.0, 2.0, 4.0])
+        calculator.apply("u")
+        self.assertEqual(calculator.stack, [1.0, 2.0, 3.0])
+
+    def test_memory(self):
+        """ The states share the values that didn't change """
+        calculator, reference = self.calculators()
+        calculator.push_many(range(100000))
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(1000):
+            for action in ["enter", "-", "tab", "x"]:
+                calculator.apply(action)
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        self.assertEqual(len(calculator.undoTree.nodes), 4002)
+        self.assertLess(used / 4000, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
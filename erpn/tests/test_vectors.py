@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version three, see Licence file for details
+
+import math
+import unittest
+import erpn.functions as f
+from erpn.buttonMappings import loadMappings
+from erpn.calculator import Calculator
+from erpn.domain import Reals, Integers
+from erpn.stack import Stack
+from erpn.stackFormat import NoExponent
+from erpn.vectors import numpy
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class VectorFunctionTest(unittest.TestCase):
+    def run_function(self, function, stack, arrow_location=0):
+        """ Run the function, check undo and return the resulting stack """
+        stack = Stack(stack)
+        before = stack.copy()
+        undo_stack = []
+        function.run(stack, undo_stack, arrow_location)
+        result = stack.copy()
+        while len(undo_stack) > 0:
+            undo_stack.pop().apply(stack)
+        self.assertEqual(stack, before)
+        return result
+
+    def assertVector(self, value, expected):
+        self.assertIsInstance(value, numpy.ndarray)
+        numpy.testing.assert_allclose(value, expected, rtol=1e-12, atol=1e-15)
+
+    def test_unary_functions(self):
+        values = numpy.array([0.25, 0.5, 1.0])
+        for function, scalar in [(f.sqrt, math.sqrt), (f.ln, math.log), (f.log10, math.log10),
+                                 (f.power_e, math.exp), (f.sin, math.sin), (f.cos, math.cos),
+                                 (f.tan, math.tan), (f.arcsin, math.asin), (f.arccos, math.acos),
+                                 (f.arctan, math.atan), (f.floor, math.floor), (f.ceil, math.ceil),
+                                 (f.square, lambda x: x * x), (f.add_inverse, lambda x: -x),
+                                 (f.mult_inverse, lambda x: 1 / x), (f.power_10, lambda x: 10 ** x)]:
+            result = self.run_function(function, [values])
+            self.assertEqual(len(result), 1)
+            self.assertVector(result[0], [scalar(value) for value in values])
+
+    def test_broadcasting(self):
+        values = numpy.array([1.0, 2.0, 3.0])
+        self.assertVector(self.run_function(f.addition, [values, 1.0])[0], [2.0, 3.0, 4.0])
+        self.assertVector(self.run_function(f.subtract, [10.0, values])[0], [9.0, 8.0, 7.0])
+        self.assertVector(self.run_function(f.multiply, [values, values])[0], [1.0, 4.0, 9.0])
+        self.assertVector(self.run_function(f.divide, [values, 2.0])[0], [0.5, 1.0, 1.5])
+        self.assertVector(self.run_function(f.exponent, [values, 2.0])[0], [1.0, 4.0, 9.0])
+        self.assertVector(self.run_function(f.modulo, [-values, 2.0])[0], [1.0, 0.0, 1.0])
+        self.assertVector(self.run_function(f.gcd, [values * 4, 6.0])[0], [2.0, 2.0, 6.0])
+        self.assertVector(self.run_function(f.factorial, [values])[0], [1.0, 2.0, 6.0])
+        self.assertVector(self.run_function(f.addition, [values])[0], [1.0, 2.0, 3.0])
+
+    def test_domain_errors(self):
+        with self.assertRaisesRegex(f.DomainError, "'sqrt x' is not defined at -2.0"):
+            self.run_function(f.sqrt, [numpy.array([1.0, -2.0, -3.0])])
+        with self.assertRaisesRegex(f.DomainError, "'y/x' is not defined at 0.0"):
+            self.run_function(f.divide, [1.0, numpy.array([1.0, 0.0])])
+        with self.assertRaisesRegex(f.DomainError, "arcsin"):
+            self.run_function(f.arcsin, [numpy.array([0.5, 1.5])])
+        with self.assertRaises(f.DomainError):
+            self.run_function(f.exponent, [numpy.array([1.0, -1.0]), 0.5])
+        with self.assertRaises(f.DomainError):
+            self.run_function(f.exponent, [0.0, numpy.array([1.0, -1.0])])
+        with self.assertRaises(f.DomainError):
+            self.run_function(f.tan, [numpy.array([0.0, math.pi / 2])])
+        with self.assertRaisesRegex(f.DomainError, "same length"):
+            self.run_function(f.addition, [numpy.array([1.0, 2.0]), numpy.array([1.0, 2.0, 3.0])])
+        with self.assertRaisesRegex(f.DomainError, "Result is not a valid value"):
+            self.run_function(f.power_e, [numpy.array([1.0, 1000.0])])
+
+    def test_to_vector(self):
+        result = self.run_function(f.ToVector(), [1.0, 2.0, 3.0, 2.0])
+        self.assertEqual(len(result), 2)
+        self.assertVector(result[1], [2.0, 3.0])
+        result = self.run_function(f.ToVector(), [numpy.array([1.0, 2.0]), 3.0], arrow_location=1)
+        self.assertVector(result[0], [1.0, 2.0, 3.0])
+        with self.assertRaises(f.DomainError):
+            self.run_function(f.ToVector(), [1.0, 0.0])
+
+    def test_vector_count(self):
+        """ The stack operations can't take n from a vector """
+        vector = numpy.array([1.0, 2.0])
+        for function in [f.Roll(), f.Pick(), f.DropN(), f.DupN(), f.ToVector()]:
+            with self.assertRaises(f.DomainError):
+                self.run_function(function, [1.0, 2.0, 3.0, vector])
+
+    def test_vector_count_keys(self):
+        c = Calculator()
+        loadMappings(c)
+        for keys in [["V", "X"], ["V", "r"], ["V", "P"], ["V", "d"], ["V", "V"]]:
+            c.reset()
+            c.push_many([1.0, 2.0, 3.0, 2.0])
+            for key in keys:
+                c.apply(key)
+            self.assertIn("not a vector", c.error)
+
+    def test_arrow(self):
+        values = numpy.array([1.0, 4.0])
+        result = self.run_function(f.sqrt, [values, 9.0], arrow_location=1)
+        self.assertEqual(len(result), 3)
+        self.assertVector(result[2], [1.0, 2.0])
+
+    def test_add_item(self):
+        item = f.AddItem(numpy.array([1, 2]))
+        self.assertVector(item.valueToAdd, [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            f.AddItem(numpy.array([1.0, float('nan')]))
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class VectorDomainTest(unittest.TestCase):
+    def test_masks(self):
+        values = numpy.array([-2.0, -1.0, 0.0, 0.5, 1.0, float('inf'), float('nan')])
+        self.assertEqual(Reals.mask(values).tolist(),
+                         [True, True, True, True, True, False, False])
+        self.assertEqual((Reals > 0).mask(values).tolist(),
+                         [False, False, False, True, True, True, False])
+        self.assertEqual((Reals - {0}).mask(values).tolist(),
+                         [True, True, False, True, True, False, False])
+        self.assertEqual(((Reals <= 1) >= -1).mask(values).tolist(),
+                         [False, True, True, True, True, False, False])
+        self.assertEqual((Integers >= 0).mask(values).tolist(),
+                         [False, False, True, False, True, False, False])
+        self.assertEqual(((Reals < -1) + (Reals > 0.5)).mask(values).tolist(),
+                         [True, False, False, False, True, True, False])
+
+    def test_contains(self):
+        self.assertIn(numpy.array([1.0, 2.0]), Reals > 0)
+        self.assertNotIn(numpy.array([1.0, -2.0]), Reals > 0)
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class VectorStackTest(unittest.TestCase):
+    def test_stack_with_vectors(self):
+        class SmallBlockStack(Stack):
+            blockSize = 4
+        vector = numpy.array([1.0, 2.0])
+        stack = SmallBlockStack(range(10))
+        stack.insert(2, vector)
+        stack.append(vector)
+        stack.push_many([3.0, vector])
+        self.assertEqual(len(stack), 14)
+        self.assertIs(stack[2], vector)
+        self.assertIs(stack[-1], vector)
+        self.assertEqual(stack, list(range(2)) + [vector] + list(range(2, 10)) + [vector, 3.0, vector])
+        with self.assertRaises(TypeError):
+            stack.view(2)
+        self.assertIs(stack.pop(), vector)
+        with stack.view(1) as view:
+            self.assertEqual(view.tolist(), [3.0])
+        removed = stack.pop_many(2)
+        self.assertIs(removed[0], vector)
+        self.assertEqual(removed[1], 3.0)
+        self.assertIs(stack.pop(2), vector)
+        self.assertEqual(stack, list(range(10)))
+        with stack.view(10) as view:
+            self.assertEqual(view.tolist(), list(range(10)))
+
+    def test_toarray(self):
+        class SmallBlockStack(Stack):
+            blockSize = 4
+        stack = SmallBlockStack(range(20))
+        self.assertEqual(stack.toarray().tolist(), list(range(20)))
+        stack.insert(3, numpy.array([1.0, 2.0]))
+        with self.assertRaises(TypeError):
+            stack.toarray()
+        stack.pop(3)
+        self.assertEqual(stack.toarray().tolist(), list(range(20)))
+        self.assertEqual(Stack().toarray().tolist(), [])
+
+    def test_format_summary(self):
+        self.assertEqual(NoExponent(1)(numpy.array([3.0, -1.0, 2.0])), "[3] -1.0 .. 3.0")
+
+    def test_calculator(self):
+        calculator = Calculator()
+        loadMappings(calculator)
+        calculator.push(numpy.arange(1.0, 1000001.0))
+        calculator.apply('L')
+        self.assertIsNone(calculator.error)
+        self.assertAlmostEqual(calculator.stack[-1][-1], math.log(1000000.0))
+        calculator.undo()
+        calculator.push(-1)
+        calculator.apply('*')
+        calculator.apply('L')
+        self.assertEqual(calculator.error, "'ln' is not defined at -1.0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Reading numbers as they are typed in the interface, and in text (the
+# clipboard, files, stdin).
+#
+# Numbers are written like 12, .5, 1.5e3 or 2e-3. '_' is a minus sign, at the
+# start or after the e. In the interface '-' is the subtract key, so it can
+# only be used after the e. In text '-' and '+' can be used at the start too,
+# and 'E' for the e, so the numbers other programs write can be read.
+
+import re
+
+# A key or character starting with one of these starts a number
+numberStart = '1234567890._'
+
+# The states of the tokenizer, named after what was read last
+START = 0  # Nothing yet
+SIGN = 1  # '-' (or '+' in text)
+POINT = 2  # '.' or '-.', there is no digit yet
+INTEGER = 3  # Digits, maybe with a sign
+FRACTION = 4  # Digits and a '.'
+EXPONENT = 5  # A number followed by the 'e'
+EXPONENT_SIGN = 6  # The sign after the 'e'
+EXPONENT_DIGITS = 7  # Digits after the 'e'
+
+# The states in which a whole number has been read
+complete = {INTEGER, FRACTION, EXPONENT_DIGITS}
+
+# The kinds of characters
+DIGIT, DOT, E, MINUS, DASH, PLUS = range(6)
+
+# transitions[state][kind] is the next state. A kind that is missing can't be
+# used in that state, so it ends the number.
+transitions = [
+    {DIGIT: INTEGER, DOT: POINT, MINUS: SIGN, PLUS: SIGN},  # START
+    {DIGIT: INTEGER, DOT: POINT},  # SIGN
+    {DIGIT: FRACTION},  # POINT
+    {DIGIT: INTEGER, DOT: FRACTION, E: EXPONENT},  # INTEGER
+    {DIGIT: FRACTION, E: EXPONENT},  # FRACTION
+    {DIGIT: EXPONENT_DIGITS, MINUS: EXPONENT_SIGN, DASH: EXPONENT_SIGN, PLUS: EXPONENT_SIGN},  # EXPONENT
+    {DIGIT: EXPONENT_DIGITS},  # EXPONENT_SIGN
+    {DIGIT: EXPONENT_DIGITS},  # EXPONENT_DIGITS
+]
+
+# The kind of each key in the interface, and of each character in text
+keyKinds = dict([(digit, DIGIT) for digit in "0123456789"] +
+                [('.', DOT), ('e', E), ('_', MINUS), ('-', DASH)])
+textKinds = dict(keyKinds, E=E)
+textKinds.update({'-': MINUS, '+': PLUS})
+
+
+def makeTable(kinds):
+    """ The transitions per state from characters instead of kinds, so a
+    single lookup gives the next state """
+    return [{character: transition[kind] for character, kind in kinds.items() if kind in transition}
+            for transition in transitions]
+
+
+keyTable = makeTable(keyKinds)
+textTable = makeTable(textKinds)
+
+# The text that is shown for each character
+shownAs = {'_': '-'}
+
+
+class NumberEntry:
+    """ A number that is being typed in, one key at a time """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.text = ""
+        # The state after each key, so backspace can go back
+        self.states = [START]
+
+    def feed(self, key):
+        """ Add a key to the number. Returns False if the key can't be part of
+        it (so it ends the number), True if it was used """
+        if key == 'backspace':
+            if len(self.states) == 1:
+                return False
+            self.states.pop()
+            self.text = self.text[:-1]
+            return True
+
+        state = keyTable[self.states[-1]].get(key)
+        if state is None:
+            return False
+        self.states.append(state)
+        self.text += shownAs.get(key, key)
+        return True
+
+    def isComplete(self):
+        """ Is the text a whole number (not something like '1e-')? """
+        return self.states[-1] in complete
+
+
+def textState(text):
+    """ The state after reading text one character at a time, None if one of
+    the characters can't be used """
+    state = START
+    for character in text:
+        state = textTable[state].get(character)
+        if state is None:
+            return None
+    return state
+
+
+# Text that contains only these characters can be read by float(), which
+# accepts exactly the same numbers as textTable once '_' is replaced by '-'
+# (it only reads 'inf', 'nan' and digits of other languages if they are in the
+# text). This is a lot faster than following textTable for each character, the
+# tests check that it gives the same result.
+numberCharacters = "-+_.eE0-9"
+otherCharacter = re.compile(r"[^{}]".format(numberCharacters))
+notSeparatorOrNumber = re.compile(r"[^{}\s,]".format(numberCharacters))
+
+
+def parseNumber(text):
+    """ The value of a number written as in the interface, like '_1.5e_3'. A
+    ValueError is raised if it isn't a number """
+    if otherCharacter.search(text) is not None:
+        raise ValueError("Could not decode {!r}".format(text))
+    return float(text.replace('_', '-'))
+
+
+def parseNumbers(text):
+    """ The values of all numbers in text, separated by whitespace or commas.
+    A ValueError is raised if something isn't a number """
+    if notSeparatorOrNumber.search(text) is not None:
+        raise ValueError("Could not decode {!r}".format(text))
+    return list(map(float, text.replace(',', ' ').replace('_', '-').split()))
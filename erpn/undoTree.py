@@ -0,0 +1,131 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Undo as a tree of stack states. Each state is a PersistentStack, so keeping
+# all of them only costs the values that changed. Undoing and then doing
+# something else starts a new branch, the old one can still be reached.
+
+from .functions import UndoItem, UndoDelete, UndoRoll, UndoSwitch
+from .persistent import PersistentStack
+
+
+class UndoNode:
+    """ A state of the stack in the undo tree """
+    __slots__ = ('number', 'state', 'parent', 'depth', 'children', 'description', 'redoChild')
+
+    def __init__(self, number, state, parent, description):
+        self.number = number  # Position in UndoTree.nodes
+        self.state = state  # The stack, a PersistentStack
+        self.parent = parent  # The state before, None for the first state
+        self.depth = 0 if parent is None else parent.depth + 1  # Steps from the first state
+        self.children = ()  # The states reached from this one, oldest first
+        self.description = description  # The action that led to this state
+        self.redoChild = None  # The child redo goes to
+
+
+def changedItems(step):
+    """ How many items the action an undo item undoes took off the top of the
+    stack, and how many it put on top after that. An action deeper in the
+    stack counts as taking all items above it off and putting them back.
+    Returns None if this is unknown (like for a FunctionalUndoItem) """
+    kind = type(step)
+    if kind is UndoItem:
+        return len(step.add), step.remove
+    if kind is UndoDelete:
+        return step.position + 1, step.position
+    if kind is UndoSwitch:
+        return step.position + 1, step.position + 1
+    if kind is UndoRoll:
+        return step.count + (step.countValue is not None), step.count
+    return None
+
+
+def changedRegion(steps):
+    """ The part of the stack an action changed, from the undo items it made.
+    Returns (removed, changed): the action took the top removed items off the
+    stack it started with, and the top changed items of the stack after it
+    are new. Returns None if this is unknown """
+    changed = 0
+    removed = 0
+    for step in steps:
+        items = changedItems(step)
+        if items is None:
+            return None
+        taken, added = items
+        if taken > changed:
+            removed += taken - changed
+            changed = 0
+        else:
+            changed -= taken
+        changed += added
+    return removed, changed
+
+
+def nextState(state, steps, stack):
+    """ The state after an action. state is the PersistentStack before it,
+    steps the undo items the action made and stack the Stack after it. Only
+    the items that changed are taken from stack """
+    region = changedRegion(steps)
+    if region is None:
+        return PersistentStack.fromStack(stack)
+    removed, changed = region
+    return state.drop(removed).pushMany(stack[len(stack) - changed:])
+
+
+class UndoTree:
+    """ All states the stack has been in. The current state can move to any
+    of them, and undo and redo move to the state before and after it """
+    def __init__(self, state=None):
+        if state is None:
+            state = PersistentStack()
+        self.nodes = [UndoNode(0, state, None, "start")]
+        self.current = self.nodes[0]
+
+    def __len__(self):
+        """ The number of actions that can be undone """
+        return self.current.depth
+
+    def add(self, state, description):
+        """ Add the state after an action as a new branch of the current
+        state, and move to it """
+        node = UndoNode(len(self.nodes), state, self.current, description)
+        self.nodes.append(node)
+        self.current.children += (node,)
+        self.current.redoChild = node
+        self.current = node
+        return node
+
+    def undo(self):
+        """ Move to the state before the current one, returns it. Returns None
+        if there is none """
+        node = self.current.parent
+        if node is None:
+            return None
+        node.redoChild = self.current
+        self.current = node
+        return node
+
+    def redo(self):
+        """ Move to the state after the current one that was visited last,
+        returns it. Returns None if there is none """
+        node = self.current.redoChild
+        if node is None:
+            return None
+        self.current = node
+        return node
+
+    def nextBranch(self):
+        """ Make redo go to the next child of the current state, returns it.
+        Returns None if there are no children """
+        children = self.current.children
+        if len(children) == 0:
+            return None
+        position = children.index(self.current.redoChild)
+        self.current.redoChild = children[(position + 1) % len(children)]
+        return self.current.redoChild
+
+    def jump(self, number):
+        """ Move to the state with number, returns it """
+        self.current = self.nodes[number]
+        return self.current
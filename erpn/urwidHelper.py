@@ -7,10 +7,85 @@ import urwid
 
 class FillerWithMemory(urwid.Filler):
     """ Like a urwid filler, but remember the last heigth and width you had.
-    This allows you to adjust for the height and width """
+    This allows you to adjust for the height and width.
+    onResize is called (before rendering) when the size changes """
     lastWidth = None
     lastHeight = None
 
+    def __init__(self, body, valign='middle', onResize=None):
+        super().__init__(body, valign)
+        self.onResize = onResize
+
     def render(self, size, focus=False):
+        resized = size != (self.lastWidth, self.lastHeight)
         (self.lastWidth, self.lastHeight) = size
+        if resized and self.onResize is not None:
+            self.onResize()
         return super().render(size, focus)
+
+
+class LabeledRows(urwid.Widget):
+    """ A flow widget showing rows of a label and a value, both urwid.Text
+    widgets. The labels are in a column of labelWidth. The footer is a flow
+    widget shown below the rows, using the full width.
+    urwid remembers how every widget was rendered, so when the rows change
+    only the rows that weren't shown before are rendered. This is also a lot
+    cheaper than a Pile of Columns """
+    _sizing = frozenset([urwid.FLOW])
+
+    def __init__(self, labelWidth, footer):
+        super().__init__()
+        self.labelWidth = labelWidth
+        self.footer = footer
+        self.contents = []  # (label, value) pairs, from top to bottom
+        # urwid only keeps a rendered canvas while something uses it, so keep
+        # the canvases we used last time. The label column usually stays the
+        # same, so keep that too: (label canvases, heights, column canvas)
+        self.canvases = []
+        self.labelColumn = None
+
+    def setRows(self, rows):
+        if rows != self.contents:
+            self.contents = rows
+            self._invalidate()
+
+    def widths(self, maxcol):
+        labelWidth = min(self.labelWidth, maxcol - 1)
+        return labelWidth, maxcol - labelWidth
+
+    def rows(self, size, focus=False):
+        labelWidth, valueWidth = self.widths(size[0])
+        return (sum(value.rows((valueWidth,)) for label, value in self.contents) +
+                self.footer.rows(size))
+
+    def render(self, size, focus=False):
+        (maxcol,) = size
+        labelWidth, valueWidth = self.widths(maxcol)
+        footer = self.footer.render(size)
+        if len(self.contents) == 0:
+            return footer
+
+        labelCanvases = [label.render((labelWidth,)) for label, value in self.contents]
+        valueCanvases = [value.render((valueWidth,)) for label, value in self.contents]
+        self.canvases = labelCanvases + valueCanvases
+        heights = [canvas.rows() for canvas in valueCanvases]
+
+        cached = self.labelColumn
+        if (cached is not None and cached[1] == heights and len(cached[0]) == len(labelCanvases) and
+                all(old is new for old, new in zip(cached[0], labelCanvases))):
+            labelColumn = cached[2]
+        else:
+            padded = []
+            for canvas, height in zip(labelCanvases, heights):
+                if height > canvas.rows():
+                    # A long value can take more than one line
+                    canvas = urwid.CompositeCanvas(canvas)
+                    canvas.pad_trim_top_bottom(0, height - canvas.rows())
+                padded.append((canvas, None, False))
+            labelColumn = urwid.CanvasCombine(padded)
+            self.labelColumn = (labelCanvases, heights, labelColumn)
+
+        valueColumn = urwid.CanvasCombine([(canvas, None, False) for canvas in valueCanvases])
+        rows = urwid.CanvasJoin([(labelColumn, None, False, labelWidth),
+                                 (valueColumn, None, False, valueWidth)])
+        return urwid.CanvasCombine([(rows, None, False), (footer, None, False)])
@@ -4,268 +4,362 @@
 
 import urwid
 from collections import defaultdict
+from math import copysign
+from time import perf_counter_ns
 
 from . import functions
+from . import palette
+from . import tokenizer
 from . import urwidHelper
-from . import stackFormat
+from .calculator import Calculator
+from .vectors import isVector
 
-stack = []  # The stack as displayed to the unit
-undostack = []  # The stack of undo actions
-redostack = []
+# The number of stack rows to show before we know the size of the window
+defaultHeight = 50
+labelWidth = 8
+statisticsWidth = 40
 
 
-class Interface:
-    """ Container for all the interface (keybindings, display etc.) for the calulator """
-    # functions holds all the keybindings.  We support having multiple
-    # different menus with different items, so they all need to be stored
-    # seperataly. 'main' is the one loaded at startup.
-    functions = {'main': {}, 'display': {}}
+def sameValue(x, y):
+    """ Are x and y stack items that are displayed the same? """
+    if isVector(x) or isVector(y):
+        return x is y
+    # 0.0 == -0.0, but they are displayed differently
+    return x == y and (x != 0 or copysign(1.0, x) == copysign(1.0, y))
+
+
+def lineLabel(n):
+    """ return how item n (numbered with 0 the top of the stack) should be
+    labeled """
+    if n == 0:
+        return 'x'
+    if n == 1:
+        return 'y'
+    if n == 2:
+        return 'z'
+    return "{}".format(n-2)
 
-    # To make it easy to keep track of the current menu, we keep the latest set
-    # of button mappings in functions_stack[-1]. If we go back, we can just pop
-    # the top part.
-    functions_stack = [functions['main']]
 
-    arrowLocation = 0  # The location of the arrow selector
-    numberEntry = ""  # If we are currently entering a number, this will contain the entry up to now
-    error = None  # The currently displayed error
+def formatBytes(size):
+    """ size in bytes as a short text, like '1.5 MB' """
+    if size < 1000:
+        return "{} B".format(size)
+    if size < 1000000:
+        return "{:.1f} kB".format(size / 1000)
+    return "{:.1f} MB".format(size / 1000000)
 
-    displayFormat = stackFormat.OptionalExponent(3)  # default display mode
 
-    def __init__(self):
+class Interface:
+    """ Container for all the interface (keybindings, display etc.) for the calulator """
+    paletteSelection = 0
+
+    def __init__(self, calculator=None):
+        """ calculator holds the stack, history and keybindings, a new one is
+        made if it isn't given """
+        if calculator is None:
+            calculator = Calculator()
+        self.calculator = calculator
+        self.entry = tokenizer.NumberEntry()  # The number being entered
+        self.helpCache = {}  # id(menu): (menu, help text)
+        self.functionIndex = None  # Made when the palette is first opened
+        self.paletteQuery = None  # The search in the command palette, if it is open
+        self.recorder = None  # The Recorder that saves the keys, if any
         self.setupWindows()
 
     def add(self, key, function, category='main'):
         """ Add a entry to link a keyboard shortcut to a function """
-        if key in self.functions[category]:
-            # You probably don't want to overwrite everything
-            raise Exception("Already defined key {} for category {}".format(key, category))
-        self.functions[category][key] = function
+        self.calculator.add(key, function, category)
+        # The help and the palette need to show the new function
+        self.helpCache = {}
+        self.functionIndex = None
+
+    @property
+    def numberEntry(self):
+        """ The number that is being entered, "" if there is none """
+        return self.entry.text
 
     def enterNumber(self, key):
         """ Enter an entry
             It handles key (a string) as the start of the entry
             Returns None if the number entry isn't done, or a key if it is """
-        global redostack
-
-        # find out all the keys it's allowed to have
-        allowedKeys = list("1234567890")
-
-        # '_' means '-' in this context if it is the first character, to allow
-        # users to enter negative numbers
-        if self.numberEntry == "" and key == '_':
-            allowedKeys += ['-']  # we need to allow the first character
-            key = '-'
-
-        # We also allow a - after an e
-        if len(self.numberEntry) > 0 and self.numberEntry[-1] == 'e':
-            allowedKeys += ['-']
-            # For consistency the user should be able to enter _ after an e too
-            if key == '_':
-                key = '-'
-
-        # allow decimalpoints if we don't have one yet, and it's not after the
-        # e in an engineering number
-        if 'e' not in self.numberEntry and '.' not in self.numberEntry:
-            allowedKeys += ['.']
-
-        # allow e, unless:
-        # - there is already an e, don't allow 1e5e2
-        # - there is no digit yet, so don't allow -e4 or .e5
-        if 'e' not in self.numberEntry and any(c.isdigit() for c in self.numberEntry):
-            allowedKeys += ['e']
-
-        # if there is more than one character already, we can backspace
-        if len(self.numberEntry) > 0:
-            allowedKeys += ['backspace']
-
-        if key in allowedKeys:
-            if key == 'backspace':
-                self.numberEntry = self.numberEntry[:-1]
-            else:
-                self.numberEntry += key
+        if self.entry.feed(key):
             return None
-        else:
-            if len(self.numberEntry) > 0:
-                # Decode what the user typed in and add it to the stack
-                try:
-                    functions.AddItem(self.numberEntry).run(stack, undostack,
-                                                            self.arrowLocation)
-                    self.clearError()
-                    redostack = []
-                except ValueError:
-                    self.setError("Could not decode value")
-
-            self.numberEntry = ""
-            return key
+
+        if self.entry.text != "":
+            # Decode what the user typed in and add it to the stack
+            self.calculator.push(self.entry.text)
+        self.entry.clear()
+        return key
 
     def takeKey(self, key):
         """ React to a pressed key """
-        global redostack
+        self.takeKeys([key])
+
+    def takeKeys(self, keys):
+        """ React to a list of pressed keys. When text is pasted many keys
+        arrive at the same time, the display is only updated once for all of
+        them """
+        calculator = self.calculator
+        counters = calculator.counters
+        if counters is not None:
+            start = perf_counter_ns()
+        menu = calculator.currentFunctions()
+        palette = (self.paletteQuery, self.paletteSelection)
+
+        try:
+            for key in keys:
+                self.handleKey(key)
+        finally:
+            if self.recorder is not None:
+                self.recorder.add(keys)
+
+        if calculator.currentFunctions() is not menu or (self.paletteQuery, self.paletteSelection) != palette:
+            self.displayHelp()
+        self.displayStack()
+        if counters is not None:
+            counters.frames.add(perf_counter_ns() - start)
+            if self.statisticsShown:
+                self.statisticsBox.set_text(counters.summary())
+
+    def filterInput(self, keys, raw):
+        """ Input filter for the urwid MainLoop, which gets all keys that are
+        waiting at the same time. Only the resizes are passed on to urwid """
+        self.takeKeys([key for key in keys if key != 'window resize'])
+        return [key for key in keys if key == 'window resize']
+
+    def handleKey(self, key):
+        """ Apply a pressed key to the calculator, without updating the display """
+        calculator = self.calculator
+
+        if self.paletteQuery is not None:
+            self.paletteKey(key)
+            return
 
-        if len(self.numberEntry) > 0 or key in '1234567890._':
+        if len(self.numberEntry) > 0:
             key = self.enterNumber(key)
-            self.displayStack()
             # if the entry is done enterNumber will return the next key, which
             # we need to apply to the stack
             # The only exception we make is for the "copy numbers" buttons,
             # sometimes I just press enter to finish entering a number
-            if (key is not None and
-                (key not in self.functions_stack[-1] or
-                 not isinstance(self.functions_stack[-1][key], functions.CopyCurrent))):
-                        self.takeKey(key)
-            return
-
-        if key in self.functions_stack[-1]:
-            try:
-                # This function uses exceptions to communicate if something is
-                # not a simple function on the stack
-                self.checkArrowLocation()
-                self.functions_stack[-1][key].run(stack, undostack, self.arrowLocation)
-                self.arrowLocation = 0
-
-            except functions.StackToSmallError:
-                self.setError("Stack too small")
-
-            except functions.DomainError as e:
-                self.setError(str(e))
-
-            except OverflowError:
-                self.setError("Value too large")
-
-            except functions.IsUndo:
-                # Take the top action from the undostack and apply it to the
-                # stack
-                if len(undostack) > 0:
-                    undo = undostack.pop()
-                    undo.apply(stack)
-                    redostack.append(undo.redo)
-                    self.clearError()
-                else:
-                    self.setError("Nothing to undo")
-
-            except functions.IsRedo:
-                if len(redostack) > 0:
-                    redo = redostack.pop()
-                    redo.run(stack, undostack, 0)
-                else:
-                    self.setError("Nothing to Redo")
-
-            except functions.IsArrow as e:
-                if e.direction == "up":
-                    self.arrowLocation += 1
-                else:
-                    self.arrowLocation -= 1
-                self.checkArrowLocation()
-
-            except functions.IsQuit:
-                raise urwid.ExitMainLoop()
-
-            except functions.EnterDisplayMenu:
-                self.functions_stack.append(self.functions['display'])
-                self.displayHelp()
-
-            except functions.IsBack:
-                if len(self.functions_stack) > 0:
-                    self.functions_stack.pop()
-                    self.displayHelp()
-                else:
-                    self.setError("No menu to go back to")
-
-            except functions.ChangeDisplayFormat as e:
-                if e.adj_format == '+':
-                    self.displayFormat.add_precision()
-                elif e.adj_format == '-':
-                    self.displayFormat.remove_precision()
-                elif isinstance(e.adj_format, stackFormat.ValueFormatter):
-                    # We want to use the format given by the exception, but we
-                    # want to keep the precision the user has already set.
-                    digits_after_decimal = self.displayFormat.digits_after_decimal
-                    self.displayFormat = e.adj_format
-                    self.displayFormat.digits_after_decimal = digits_after_decimal
-                else:
-                    self.setError("Unparsable format")
-
+            if (key is None or
+                (key in calculator.currentFunctions() and
+                 isinstance(calculator.currentFunctions()[key], functions.CopyCurrent))):
+                return
+
+        if key in tokenizer.numberStart:
+            self.enterNumber(key)
+        elif key in calculator.currentFunctions():
+            self.apply(calculator.currentFunctions()[key], key)
+
+    def apply(self, function, key=None):
+        """ Apply function to the calculator, and handle the commands the
+        calculator leaves to the interface. key is the key it is bound to, if
+        it was pressed """
+        command = self.calculator.apply(function, key)
+        if command is not None:
+            self.commands[command.name](self, *command.arguments)
+
+    def quit(self):
+        raise urwid.ExitMainLoop()
+
+    def openPalette(self):
+        """ Start searching for a function by its description """
+        if self.functionIndex is None:
+            self.functionIndex = palette.FunctionIndex(self.calculator.functions)
+        self.paletteQuery = ""
+        self.paletteResults = self.functionIndex.search("")
+        self.paletteSelection = 0
+
+    def paletteKey(self, key):
+        """ React to a key pressed while the command palette is open. Enter
+        applies the selected function, with the arrow where it was """
+        if key == 'esc':
+            self.paletteQuery = None
+        elif key == 'enter':
+            self.paletteQuery = None
+            if len(self.paletteResults) > 0:
+                self.apply(self.paletteResults[self.paletteSelection][2])
+        elif key == 'up':
+            self.paletteSelection = max(self.paletteSelection - 1, 0)
+        elif key == 'down':
+            self.paletteSelection = min(self.paletteSelection + 1,
+                                        max(len(self.paletteResults) - 1, 0))
+        elif key == 'backspace' or (len(key) == 1 and key.isprintable()):
+            if key == 'backspace':
+                self.paletteQuery = self.paletteQuery[:-1]
             else:
-                # If the function applied and no new errors appeared we can clear the error
-                self.clearError()
-                redostack = []
-
-        self.displayStack()
+                self.paletteQuery += key
+            self.paletteResults = self.functionIndex.search(self.paletteQuery)
+            self.paletteSelection = 0
+
+    def toggleStatistics(self):
+        """ Show or hide the statistics next to the help """
+        if self.calculator.counters is None:
+            self.setError("Start erpn with --stats to keep statistics")
+            return
+        if self.statisticsShown:
+            del self.root.contents[-1]
+        else:
+            self.statisticsBox.set_text(self.calculator.counters.summary())
+            self.root.contents.append((self.statisticsColumn,
+                                       self.root.options('given', statisticsWidth)))
+        self.statisticsShown = not self.statisticsShown
+
+    # The method that handles each Command the calculator can't handle itself
+    commands = {
+        'quit': quit,
+        'palette': openPalette,
+        'statistics': toggleStatistics,
+    }
 
     def setError(self, error_text):
         """ Display an error """
-        self.error = error_text
+        self.calculator.error = error_text
 
     def clearError(self):
         """ Clear the error display """
-        self.error = None
+        self.calculator.error = None
 
     def setupWindows(self):
         """ Setup the different parts of the screen layout """
         self.helpBox = urwid.Text('')
         self.displayHelp()
-        helpfill = urwid.Filler(self.helpBox, 'top')
+        self.statusBox = urwid.Text('')  # How much the undo history uses
+        helpfill = urwid.Frame(urwid.Filler(self.helpBox, 'top'), footer=self.statusBox)
 
         self.stackBox = self.getStackBox()
-        self.stackfill = urwidHelper.FillerWithMemory(self.stackBox, 'bottom')
+        self.stackfill = urwidHelper.FillerWithMemory(self.stackBox, 'bottom',
+                                                      onResize=self.displayStack)
         self.displayStack()
 
         self.root = urwid.Columns([self.stackfill, (23, helpfill)])
 
+        # Shown as an extra column by toggleStatistics
+        self.statisticsBox = urwid.Text('', wrap='clip')
+        self.statisticsColumn = urwid.Filler(self.statisticsBox, 'top')
+        self.statisticsShown = False
+
     def getStackBox(self):
-        """ Display the stack in window. Supply the stack to display """
-        return urwid.Text("")
+        """ The widgets that show the stack. Only the rows that fit in the
+        window exist, each with a label and a value, and a line for the
+        error """
+        self.entryBox = urwid.Text("")  # The number being entered
+        self.errorBox = urwid.Text("")
+        self.rows = urwidHelper.LabeledRows(labelWidth, self.errorBox)
+
+        self.labels = []  # The label widgets, labels[0] is 'x'
+        self.shownArrow = 0
+        self.rowCache = {}  # stack index: (value, displayFormat, widget)
+        return self.rows
+
+    def label(self, n):
+        """ The label widget of item n (numbered with 0 the top of the stack) """
+        while len(self.labels) <= n:
+            self.labels.append(urwid.Text(self.labelMarkup(len(self.labels)), wrap='clip'))
+        return self.labels[n]
+
+    def labelMarkup(self, n):
+        arrow = "   "
+        if(n != 0 and n == self.calculator.arrowLocation):
+            arrow = ('arrow', " ->")
+        return [arrow, ('lineLabel', "{:>3}: ".format(lineLabel(n)))]
+
+    def valueWidget(self, index, value):
+        """ The widget showing the value at index (counting from the bottom of
+        the stack). It is only made again if the value or the display format
+        changed, so unchanged rows don't have to be formatted or rendered again """
+        displayFormat = self.calculator.displayFormat
+        cached = self.rowCache.get(index)
+        if cached is not None and cached[1] is displayFormat and sameValue(cached[0], value):
+            return cached[2]
+        widget = urwid.Text(displayFormat(value))
+        self.rowCache[index] = (value, displayFormat, widget)
+        return widget
 
     def displayStack(self):
-        lines = [""]
+        """ Update the stack display. This only looks at the rows that fit in
+        the window, so it doesn't depend on the size of the stack """
+        calculator = self.calculator
+        stack = calculator.stack
+
+        height = self.stackfill.lastHeight
+        if height is None:
+            height = defaultHeight
+        linesLeft = height - 1  # Keep a line for the error
+        valueWidth = None
+        if self.stackfill.lastWidth is not None:
+            valueWidth = self.rows.widths(self.stackfill.lastWidth)[1]
+
+        def fits(widget):
+            """ Is there space left for widget? A long value can take more
+            than one line """
+            nonlocal linesLeft
+            linesLeft -= 1 if valueWidth is None else widget.rows((valueWidth,))
+            return linesLeft >= 0
+
+        # Move the arrow
+        if calculator.arrowLocation != self.shownArrow:
+            for n in (self.shownArrow, calculator.arrowLocation):
+                if n < len(self.labels):
+                    self.labels[n].set_text(self.labelMarkup(n))
+            self.shownArrow = calculator.arrowLocation
 
         # Display the current entry at the bottom of the stack.
-        displayStack = stack
+        values = []
         if self.numberEntry != "":
-            displayStack = displayStack + [self.numberEntry]
-
-        # If possible, limit the lines shown so you only see the bottom of the stack.
-        if self.stackfill.lastHeight is not None:
-            displayStack = displayStack[-self.stackfill.lastHeight+1:]
-
-        # function is not used anywhere else, so I might as well include it here
-        def lineLabel(n):
-            """ return how item n (numbered with 0 the top of the stack) should be
-            labeled """
-            if n == 0:
-                return 'x'
-            if n == 1:
-                return 'y'
-            if n == 2:
-                return 'z'
-            return "{}".format(n-2)
-
-        for i in range(len(displayStack)):
-            n = len(displayStack) - i - 1
-            arrow = "   "
-            if(n != 0 and n == self.arrowLocation):
-                arrow = ('arrow', " ->")
-            label = ('lineLabel', "{:>3}: ".format(lineLabel(n)))
-            number = self.displayFormat(displayStack[i])
-            lines.extend([arrow, label, number, "\n"])
-
-        if self.error is not None:
-            lines.append(('error', self.error))
-
-        self.stackBox.set_text(lines)
+            self.entryBox.set_text(self.numberEntry)
+            if fits(self.entryBox):
+                values.append(self.entryBox)
+        start = len(stack)
+        while start > 0 and linesLeft > 0:
+            widget = self.valueWidget(start - 1, stack[start - 1])
+            if not fits(widget):
+                break
+            values.append(widget)
+            start -= 1
+        for index in list(self.rowCache):
+            if index < start or index >= len(stack):
+                del self.rowCache[index]
+
+        self.rows.setRows([(self.label(n), values[n]) for n in reversed(range(len(values)))])
+
+        error = calculator.error if calculator.error is not None else ""
+        if error != self.errorBox.text:
+            self.errorBox.set_text(('error', error))
+
+        if calculator.undoTree is not None:
+            tree = calculator.undoTree
+            status = "undo: {}, state {} (last {})".format(len(tree), tree.current.number, len(tree.nodes) - 1)
+        else:
+            undo = calculator.undostack
+            status = "undo: {} ({})".format(len(undo), formatBytes(undo.bytes))
+        if status != self.statusBox.text:
+            self.statusBox.set_text(status)
 
     def displayHelp(self):
         """ Update the text in the self.helpBox """
-        # First generate the strings
+        if self.paletteQuery is not None:
+            self.helpBox.set_text(self.paletteMarkup())
+            return
 
+        # The help only changes if a function is added, so only generate it
+        # once for each menu
+        menu = self.calculator.currentFunctions()
+        cached = self.helpCache.get(id(menu))
+        if cached is None or cached[0] is not menu:
+            cached = (menu, self.helpText(menu))
+            self.helpCache[id(menu)] = cached
+        self.helpBox.set_text(cached[1])
+
+    def helpText(self, currentFunctions):
+        """ The help text for the menu currentFunctions """
         # All items in the dicts are [] by default, so we can append to them
         # without checking if they exist
         items = defaultdict(lambda: [])
         # The keys in this dict will be the functions they are linked to.
 
-        for item in self.functions_stack[-1]:
-            items[self.functions_stack[-1][item]].append(item)
+        for item in currentFunctions:
+            items[currentFunctions[item]].append(item)
 
         helpStrings = []
         for item in items:
@@ -275,9 +369,16 @@ class Interface:
                 helpStrings.append(newitem)
 
         helpStrings.sort()  # this will do until I figure out a better way to sort the displayed strings
-        self.helpBox.set_text('\n'.join(helpStrings))
-
-    def checkArrowLocation(self):
-        """ Ensure that the arrow is actually pointing at the stack """
-        if self.arrowLocation < 0 or self.arrowLocation >= len(stack):
-            self.arrowLocation = 0
+        return '\n'.join(helpStrings)
+
+    def paletteMarkup(self):
+        """ The search and the results of the command palette """
+        markup = [": {}\n".format(self.paletteQuery)]
+        for n, (description, keys, function) in enumerate(self.paletteResults):
+            if n == self.paletteSelection:
+                markup.append(('arrow', "> {}\n".format(description)))
+            else:
+                markup.append("  {}\n".format(description))
+        if len(self.paletteResults) == 0:
+            markup.append(('error', "  No matches"))
+        return markup
@@ -0,0 +1,64 @@
+# ERPN, an RPN calculator
+# Copyright (C) 2017 Bart de Waal
+# This program is licenced under the GPL version 3, see Licence file for details
+
+# Stack items can be 1-D numpy arrays (vectors), all functions are applied to
+# every element. numpy is optional, without it there are only numbers.
+#
+# Importing numpy takes longer than starting the rest of erpn, so it is only
+# imported when it is first used. Until then there can't be any vectors.
+
+import importlib
+import sys
+from importlib.util import find_spec
+
+
+class LazyModule:
+    """ Stands in for a module, which is imported when one of its attributes
+    is used for the first time """
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(importlib.import_module(self.name), attribute)
+        setattr(self, attribute, value)
+        return value
+
+
+numpy = LazyModule('numpy') if find_spec('numpy') is not None else None
+
+
+def isVector(value):
+    # If numpy wasn't imported yet, value can't be an array
+    module = sys.modules.get('numpy')
+    return module is not None and isinstance(value, module.ndarray)
+
+
+def hasVector(values):
+    """ Is one of the values a vector? """
+    module = sys.modules.get('numpy')
+    if module is None:
+        return False
+    for value in values:
+        if isinstance(value, module.ndarray):
+            return True
+    return False
+
+
+def asVector(values):
+    """ Convert values to a vector we can put on the stack, a 1-D array of
+    doubles with at least one element. Raises ValueError if that's not
+    possible """
+    if numpy is None:
+        raise ValueError("Vectors need numpy to be installed")
+    vector = numpy.array(values, dtype=float)
+    if vector.ndim != 1 or len(vector) == 0:
+        raise ValueError("A vector should be a non-empty list of numbers")
+    return vector
+
+
+def valuesEqual(x, y):
+    """ Compare two stack items, which can be numbers or vectors """
+    if isVector(x) or isVector(y):
+        return bool(numpy.array_equal(x, y))
+    return x == y
@@ -9,6 +9,7 @@ setup(name='erpn',
       license='GPLv3',
       packages=['erpn'],
       install_requires=['pyperclip', 'urwid'],
+      extras_require={'vectors': ['numpy']},
       entry_points={
           'console_scripts': [
               'erpn = erpn.main:main'